@@ -1,27 +1,72 @@
 from django.contrib import admin
 from . import models
+from .db import write_atomic
 
 # Register your models here so you can see them in the /admin/ panel
 
+
+class DeleteOneByOneMixin:
+    """
+    "Delete selected" goes through each object's own delete(), which keeps
+    Product.on_hand, the daily sales rollup and the stock ledger in step;
+    the bulk queryset.delete() the action uses by default skips it.
+    """
+
+    def delete_queryset(self, request, queryset):
+        with write_atomic():
+            for obj in queryset:
+                self.delete_model(request, obj)
+
 @admin.register(models.Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('product_name', 'barcode', 'selling_price', 'cost_price')
-    search_fields = ('product_name', 'barcode')
+    list_display = ('product_name', 'barcode', 'selling_price', 'cost_price', 'on_hand', 'reorder_level', 'supplier_info')
+    search_fields = ('product_name', 'barcode', 'supplier_info')
 
 @admin.register(models.StockBatch)
-class StockBatchAdmin(admin.ModelAdmin):
-    list_display = ('product', 'quantity', 'received_date', 'expiry_date')
+class StockBatchAdmin(DeleteOneByOneMixin, admin.ModelAdmin):
+    list_display = ('product', 'quantity', 'received_date', 'expiry_date', 'unit_cost')
     list_filter = ('expiry_date', 'received_date')
 
+@admin.register(models.StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'product', 'kind', 'quantity', 'batch', 'sale')
+    list_filter = ('kind', 'created_at')
+
+    # the ledger is written by stock changes only and never edited
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(models.StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('taken_at', 'units', 'value', 'last_movement_id')
+
 @admin.register(models.Sale)
-class SaleAdmin(admin.ModelAdmin):
+class SaleAdmin(DeleteOneByOneMixin, admin.ModelAdmin):
     list_display = ('id', 'sale_timestamp', 'total_amount', 'total_profit', 'user')
     list_filter = ('sale_timestamp', 'user')
 
+    # the cascade to the items would skip SaleItem.delete(), so delete them first
+    def delete_model(self, request, obj):
+        with write_atomic():
+            for item in obj.items.all():
+                item.delete()
+            obj.delete()
+
 @admin.register(models.SaleItem)
-class SaleItemAdmin(admin.ModelAdmin):
+class SaleItemAdmin(DeleteOneByOneMixin, admin.ModelAdmin):
     list_display = ('sale', 'product', 'quantity', 'price_at_sale')
 
+@admin.register(models.DailyProductSales)
+class DailyProductSalesAdmin(admin.ModelAdmin):
+    list_display = ('date', 'product', 'units', 'revenue', 'cogs', 'profit')
+    list_filter = ('date',)
+
 @admin.register(models.Alert)
 class AlertAdmin(admin.ModelAdmin):
     list_display = ('alert_type', 'product', 'message', 'created_at', 'is_viewed')
@@ -29,9 +74,15 @@ class AlertAdmin(admin.ModelAdmin):
 
 @admin.register(models.PurchaseOrder)
 class PurchaseOrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'status', 'created_at')
+    list_display = ('id', 'supplier_info', 'user', 'status', 'created_at')
     list_filter = ('status',)
 
 @admin.register(models.PurchaseOrderItem)
 class PurchaseOrderItemAdmin(admin.ModelAdmin):
-    list_display = ('purchase_order', 'product', 'quantity')
\ No newline at end of file
+    list_display = ('purchase_order', 'product', 'quantity', 'received_quantity')
+
+@admin.register(models.ProductLookup)
+class ProductLookupAdmin(admin.ModelAdmin):
+    list_display = ('barcode', 'found', 'source', 'fetched_at')
+    list_filter = ('found', 'source')
+    search_fields = ('barcode',)
@@ -0,0 +1,174 @@
+# APP/advisor.py
+"""
+Data behind the AI advisor page, served as JSON by advisor_data_api.
+
+Each alert type is paginated, so a request costs the same however many
+alerts there are: one COUNT, one page of unviewed alerts joined to their
+product (reorder rows show the live on_hand) and, for waste alerts, one
+aggregate over the page's expiring batches. Pages are cached; all of
+them are dropped together when stock, products or alerts change (see
+APP/signals.py) by moving the cache to a new generation. The generation
+is a counter in the CACHE_ALIAS cache, bumped with incr() as
+DjangoCache.clear() does, so a sale pays one cache round trip rather
+than a database write; with a shared alias (Redis, Memcached) changes
+made by other workers or by `generate_alerts` retire the pages every
+process holds. A request reads it once.
+
+Configured with settings.ADVISOR:
+
+    ADVISOR = {
+        'PAGE_SIZE': 20,
+        'MAX_PAGE_SIZE': 100,
+        'CACHE_BACKEND': 'local',   # in-process LRU ('local') or Django's cache framework ('django')
+        'CACHE_TTL': 300,           # seconds a page may be served
+        'CACHE_MAX_SIZE': 500,
+        'CACHE_ALIAS': 'default',
+    }
+"""
+import datetime
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.paginator import Paginator
+from django.core.signals import setting_changed
+from django.db.models import Min, Sum
+from django.db.models.fields.json import KT
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .alerts import ALERT_TYPES, WASTE_WINDOW_DAYS
+from .barcode_cache import MISSING, DjangoCache, LRUCache
+from .models import Alert, StockBatch
+
+
+DEFAULTS = {
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 100,
+    'CACHE_BACKEND': 'local',
+    'CACHE_TTL': 300,
+    'CACHE_MAX_SIZE': 500,
+    'CACHE_ALIAS': 'default',
+}
+
+GENERATION_KEY = 'APP:advisor:generation'
+
+
+def _alert_queryset(alert_type):
+    alerts = Alert.objects.filter(alert_type=alert_type, is_viewed=False).select_related('product')
+    if alert_type == 'waste':
+        return alerts.order_by(KT('payload__expiry_date'), 'id')
+    return alerts.order_by('created_at', 'id')
+
+
+def _waste_stock(product_ids, as_of=None):
+    """{product_id: (units, earliest expiry)} for batches of `product_ids` expiring within the waste window."""
+    cutoff = (as_of or timezone.localdate()) + datetime.timedelta(days=WASTE_WINDOW_DAYS)
+    rows = (
+        StockBatch.objects.filter(product_id__in=product_ids, expiry_date__lte=cutoff, quantity__gt=0)
+        .values('product_id')
+        .annotate(stock=Sum('quantity'), expiry_date=Min('expiry_date'))
+        .order_by()
+        .values_list('product_id', 'stock', 'expiry_date')
+    )
+    return {product_id: (stock, expiry_date) for product_id, stock, expiry_date in rows}
+
+
+def _items(alert_type, alerts):
+    """Alert payloads in the shape the advisor page and the AI summary use, with current product data."""
+    if alert_type == 'waste':
+        stock = _waste_stock([alert.product_id for alert in alerts if alert.product_id])
+    items = []
+    for alert in alerts:
+        item = dict(alert.payload, product_id=alert.product_id)
+        product = alert.product
+        if product is not None and alert_type == 'reorder':
+            item.update(name=product.product_name, current_stock=product.on_hand, reorder_level=product.reorder_level)
+        elif product is not None and alert_type == 'waste':
+            item['product'] = product.product_name
+            if alert.product_id in stock:
+                units, expiry_date = stock[alert.product_id]
+                item.update(stock=units, expiry_date=expiry_date.strftime('%Y-%m-%d'))
+        elif product is not None and alert_type == 'trend':
+            item['product_name'] = product.product_name
+        items.append(item)
+    return items
+
+
+def alert_page(alert_type, page=1, page_size=DEFAULTS['PAGE_SIZE']):
+    """One page of unviewed alerts of `alert_type`: {'items', 'page', 'page_size', 'total', 'has_next'}."""
+    paginator = Paginator(_alert_queryset(alert_type), page_size)
+    current = paginator.get_page(page)
+    return {
+        'items': _items(alert_type, list(current.object_list)),
+        'page': current.number,
+        'page_size': page_size,
+        'total': paginator.count,
+        'has_next': current.has_next(),
+    }
+
+
+class AdvisorCache:
+
+    def __init__(self, options):
+        self.options = options
+        self.generations = caches[options['CACHE_ALIAS']]
+        if options['CACHE_BACKEND'] == 'django':
+            self.store = DjangoCache(options['CACHE_ALIAS'], options['CACHE_TTL'], 'APP:advisor')
+        elif options['CACHE_BACKEND'] == 'local':
+            self.store = LRUCache(options['CACHE_MAX_SIZE'], options['CACHE_TTL'])
+        else:
+            raise ValueError(f"Unknown ADVISOR cache backend: {options['CACHE_BACKEND']!r}")
+
+    def _generation(self):
+        generation = self.generations.get(GENERATION_KEY)
+        if generation is None:
+            generation = self.invalidate()
+        return generation
+
+    def invalidate(self):
+        """Retires every cached page, in every process sharing CACHE_ALIAS, at once; returns the new generation."""
+        try:
+            return self.generations.incr(GENERATION_KEY)
+        except ValueError:
+            # no generation yet (or it was evicted): start from the clock, so
+            # the generations of pages cached before never come back
+            self.generations.add(GENERATION_KEY, time.time_ns(), None)
+            return self.generations.get(GENERATION_KEY)
+
+    def pages(self, alert_types, page=1, page_size=None):
+        """{alert_type: alert_page()} for each of `alert_types`, served from the cache while nothing has changed."""
+        for alert_type in alert_types:
+            if alert_type not in ALERT_TYPES:
+                raise ValueError(f"Unknown alert type: {alert_type!r}")
+        page_size = page_size or self.options['PAGE_SIZE']
+        if not 1 <= page_size <= self.options['MAX_PAGE_SIZE']:
+            raise ValueError(f"page_size must be between 1 and {self.options['MAX_PAGE_SIZE']}.")
+
+        generation = self._generation()
+        results = {}
+        for alert_type in alert_types:
+            key = f'APP:advisor:{generation}:{alert_type}:{page}:{page_size}'
+            result = self.store.get(key)
+            if result is MISSING:
+                result = alert_page(alert_type, page, page_size)
+                self.store.set(key, result)
+            results[alert_type] = result
+        return results
+
+    def page(self, alert_type, page=1, page_size=None):
+        """alert_page(), served from the cache while nothing has changed."""
+        return self.pages([alert_type], page, page_size)[alert_type]
+
+
+@lru_cache(maxsize=None)
+def get_advisor_cache():
+    options = {**DEFAULTS, **getattr(settings, 'ADVISOR', {})}
+    return AdvisorCache(options)
+
+
+@receiver(setting_changed)
+def reset_advisor_cache(setting, **kwargs):
+    if setting == 'ADVISOR':
+        get_advisor_cache.cache_clear()
@@ -0,0 +1,129 @@
+# APP/alerts.py
+"""
+Alert generation.
+
+Reorder, waste and trend conditions are computed in bulk and synced into
+the Alert table, so the advisor page only has to read unviewed alerts.
+Each (alert_type, product) pair has at most one alert, viewed or not:
+existing ones are updated in place, new ones are created and alerts whose
+condition no longer holds are removed. An alert marked viewed therefore
+stays quiet until its condition clears, rather than coming back as a new
+unviewed alert on the next run.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Min, Sum
+from django.utils import timezone
+
+from .models import Alert, StockBatch, alerts_changed
+from .stock import products_below_reorder_level
+from .trends import compute_trends, trend_message
+
+
+ALERT_TYPES = ('reorder', 'waste', 'trend')
+WASTE_WINDOW_DAYS = 7
+
+
+def reorder_alert_specs():
+    rows = products_below_reorder_level().values_list('id', 'product_name', 'on_hand', 'reorder_level')
+    return {
+        product_id: {
+            'message': f"Stock is {on_hand}, below the reorder level of {reorder_level}.",
+            'suggestion_details': f"Reorder at least {reorder_level - on_hand} unit(s).",
+            'payload': {'name': name, 'current_stock': on_hand, 'reorder_level': reorder_level},
+        }
+        for product_id, name, on_hand, reorder_level in rows
+    }
+
+
+def waste_alert_specs(as_of=None):
+    as_of = as_of or timezone.localdate()
+    cutoff = as_of + datetime.timedelta(days=WASTE_WINDOW_DAYS)
+    rows = (
+        StockBatch.objects.filter(expiry_date__lte=cutoff, quantity__gt=0)
+        .values('product_id', 'product__product_name')
+        .annotate(stock=Sum('quantity'), expiry_date=Min('expiry_date'))
+        .order_by()
+    )
+    return {
+        row['product_id']: {
+            'message': f"{row['stock']} unit(s) expire by {row['expiry_date']:%Y-%m-%d}.",
+            'suggestion_details': "Run a promotion or discount to clear this stock before it expires.",
+            'payload': {
+                'product': row['product__product_name'],
+                'stock': row['stock'],
+                'expiry_date': row['expiry_date'].strftime('%Y-%m-%d'),
+            },
+        }
+        for row in rows
+    }
+
+
+def trend_alert_specs(as_of=None, **trend_options):
+    specs = {}
+    for trend in compute_trends(as_of=as_of, **trend_options):
+        message = trend_message(trend)
+        specs[trend['product_id']] = {
+            'message': message,
+            'suggestion_details': f"{trend['short_rate']}/day recently vs {trend['long_rate']}/day on average.",
+            'payload': {'product_name': trend['product_name'], 'message': message},
+        }
+    return specs
+
+
+def sync_alerts(alert_type, specs):
+    """
+    Makes the alerts of `alert_type` match `specs`
+    ({product_id: {'message', 'suggestion_details', 'payload'}}).
+    Returns a (created, updated, removed) tuple.
+    """
+    with transaction.atomic():
+        existing = {}
+        duplicates = []
+        for alert in Alert.objects.filter(alert_type=alert_type).order_by('-created_at', '-id'):
+            if alert.product_id in existing:
+                duplicates.append(alert.pk)
+            else:
+                existing[alert.product_id] = alert
+
+        to_create = []
+        to_update = []
+        for product_id, spec in specs.items():
+            alert = existing.pop(product_id, None)
+            if alert is None:
+                to_create.append(Alert(alert_type=alert_type, product_id=product_id, **spec))
+            elif any(getattr(alert, field) != value for field, value in spec.items()):
+                for field, value in spec.items():
+                    setattr(alert, field, value)
+                to_update.append(alert)
+
+        stale = duplicates + [alert.pk for alert in existing.values()]
+        for start in range(0, len(stale), 500):
+            Alert.objects.filter(pk__in=stale[start:start + 500]).delete()
+        Alert.objects.bulk_create(to_create, batch_size=1000)
+        Alert.objects.bulk_update(to_update, ['message', 'suggestion_details', 'payload'], batch_size=1000)
+        if to_create or to_update or stale:
+            alerts_changed.send(sender=Alert, alert_type=alert_type)
+
+    return len(to_create), len(to_update), len(stale)
+
+
+def refresh_alerts(alert_types=ALERT_TYPES, as_of=None):
+    """Recomputes and syncs the requested alert types. Returns {alert_type: (created, updated, removed)}."""
+    builders = {
+        'reorder': reorder_alert_specs,
+        'waste': lambda: waste_alert_specs(as_of),
+        'trend': lambda: trend_alert_specs(as_of),
+    }
+    return {alert_type: sync_alerts(alert_type, builders[alert_type]()) for alert_type in alert_types}
+
+
+def unviewed_alert_payloads():
+    """The advisor page data: {alert_type: [payload, ...]} from unviewed alerts, in one query."""
+    grouped = {alert_type: [] for alert_type in ALERT_TYPES}
+    rows = Alert.objects.filter(is_viewed=False).order_by('alert_type', 'created_at', 'id')
+    for alert_type, payload in rows.values_list('alert_type', 'payload'):
+        grouped[alert_type].append(payload)
+    grouped['waste'].sort(key=lambda payload: payload.get('expiry_date', ''))
+    return grouped
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'APP'
+
+    def ready(self):
+        from . import db, signals  # noqa: F401  (connects the SQLite pragma and cache invalidation receivers)
@@ -0,0 +1,280 @@
+# APP/barcode_cache.py
+"""
+Barcode -> product summary cache for the scanner APIs.
+
+Scanners fire repeatedly on the same items, so the product and its first
+available batch are cached per barcode. Two backends are available via
+settings.BARCODE_CACHE:
+
+    BARCODE_CACHE = {
+        'BACKEND': 'local',     # in-process LRU ('local') or Django's cache framework ('django')
+        'MAX_SIZE': 5000,       # LRU entries kept per process ('local' only)
+        'TTL': 300,             # seconds an entry may be served
+        'ALIAS': 'default',     # cache alias ('django' only)
+    }
+
+Entries are invalidated when a Product is saved or deleted and whenever
+stock changes (see APP/signals.py); for a stock change the product's
+barcode is read from the database. `aget`/`aget_many` serve the async
+scanner views: hits never leave the event loop and misses are loaded
+with the async ORM.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db.models import F, OuterRef, Subquery
+from django.dispatch import receiver
+
+from .models import Product, StockBatch
+
+
+DEFAULTS = {
+    'BACKEND': 'local',
+    'MAX_SIZE': 5000,
+    'TTL': 300,
+    'ALIAS': 'default',
+}
+
+LOOKUP_CHUNK_SIZE = 500
+
+MISSING = object()
+NOT_FOUND = 'not_found'
+
+
+class LRUCache:
+    """A thread-safe, size-bounded LRU mapping whose entries expire after `ttl` seconds."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    # in-memory and only briefly locked, so safe to call straight from the event loop
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, value):
+        self.set(key, value)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DjangoCache:
+    """
+    Adapter exposing a Django cache alias with the LRUCache interface.
+    Entries are stored with the current version of `prefix`, which lives in
+    the alias too; clear() bumps it, retiring this cache's entries in every
+    process while leaving everything else in the alias alone. A get reads
+    the entry and the version in one round trip.
+    """
+
+    def __init__(self, alias, ttl, prefix):
+        self.cache = caches[alias]
+        self.ttl = ttl
+        self.version_key = f'{prefix}:version'
+
+    def _value(self, values, key):
+        entry = values.get(key)
+        if entry is None or entry[0] != values.get(self.version_key, 0):
+            return MISSING
+        return entry[1]
+
+    def get(self, key):
+        return self._value(self.cache.get_many([self.version_key, key]), key)
+
+    def set(self, key, value):
+        self.cache.set(key, (self.cache.get(self.version_key, 0), value), self.ttl)
+
+    async def aget(self, key):
+        return self._value(await self.cache.aget_many([self.version_key, key]), key)
+
+    async def aset(self, key, value):
+        await self.cache.aset(key, (await self.cache.aget(self.version_key, 0), value), self.ttl)
+
+    def delete_many(self, keys):
+        self.cache.delete_many(list(keys))
+
+    def clear(self):
+        try:
+            self.cache.incr(self.version_key)
+        except ValueError:
+            # no version yet (or it was evicted): start one that never expires
+            if not self.cache.add(self.version_key, 1, None):
+                self.cache.incr(self.version_key)
+
+
+def _summary_querysets(barcodes):
+    first_batch = (
+        StockBatch.objects.filter(product=OuterRef('pk'), quantity__gt=0)
+        .order_by(F('expiry_date').asc(nulls_last=True), 'id')
+    )
+    barcodes = list(barcodes)
+    # chunked to stay well inside the database's bound-parameter limit
+    for start in range(0, len(barcodes), LOOKUP_CHUNK_SIZE):
+        yield (
+            Product.objects.filter(barcode__in=barcodes[start:start + LOOKUP_CHUNK_SIZE])
+            .annotate(
+                batch_id=Subquery(first_batch.values('id')[:1]),
+                batch_quantity=Subquery(first_batch.values('quantity')[:1]),
+            )
+            .values('id', 'barcode', 'product_name', 'description', 'selling_price', 'batch_id', 'batch_quantity')
+        )
+
+
+def _summary(row):
+    return {
+        'product_id': row['id'],
+        'name': row['product_name'],
+        'description': row['description'],
+        'selling_price': row['selling_price'],
+        'batch_id': row['batch_id'],
+        'batch_quantity': row['batch_quantity'],
+    }
+
+
+def load_summaries(barcodes):
+    """
+    {barcode: summary} for the given barcodes, one query per LOOKUP_CHUNK_SIZE
+    barcodes; barcodes with no product are absent. A summary holds the product fields the scanner needs
+    and its first available batch (nearest expiry), or None for the batch.
+    """
+    return {row['barcode']: _summary(row) for queryset in _summary_querysets(barcodes) for row in queryset}
+
+
+async def aload_summaries(barcodes):
+    """load_summaries() with the async ORM."""
+    summaries = {}
+    for queryset in _summary_querysets(barcodes):
+        async for row in queryset:
+            summaries[row['barcode']] = _summary(row)
+    return summaries
+
+
+class BarcodeCache:
+
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def _key(barcode):
+        return f'APP:barcode:{barcode}'
+
+    def _split(self, barcodes, cached):
+        """Splits cached values into ({barcode: summary or None} hits, [missed barcode, ...])."""
+        results = {}
+        misses = []
+        for barcode, value in zip(barcodes, cached):
+            if value is MISSING:
+                misses.append(barcode)
+            else:
+                results[barcode] = None if value == NOT_FOUND else value
+        return results, misses
+
+    def _entries(self, misses, loaded):
+        """(key, value) pairs to store for freshly loaded barcodes."""
+        for barcode in misses:
+            summary = loaded.get(barcode)
+            yield self._key(barcode), summary if summary is not None else NOT_FOUND
+
+    def get_many(self, barcodes):
+        """{barcode: summary or None} for every barcode, loading all misses together."""
+        barcodes = list(barcodes)
+        results, misses = self._split(barcodes, [self.store.get(self._key(barcode)) for barcode in barcodes])
+        if misses:
+            loaded = load_summaries(misses)
+            for key, value in self._entries(misses, loaded):
+                self.store.set(key, value)
+            results.update((barcode, loaded.get(barcode)) for barcode in misses)
+        return results
+
+    def get(self, barcode):
+        """The product summary for `barcode`, or None if no product has it."""
+        return self.get_many([barcode])[barcode]
+
+    async def aget_many(self, barcodes):
+        """Async get_many()."""
+        barcodes = list(barcodes)
+        results, misses = self._split(barcodes, [await self.store.aget(self._key(barcode)) for barcode in barcodes])
+        if misses:
+            loaded = await aload_summaries(misses)
+            for key, value in self._entries(misses, loaded):
+                await self.store.aset(key, value)
+            results.update((barcode, loaded.get(barcode)) for barcode in misses)
+        return results
+
+    async def aget(self, barcode):
+        """Async get()."""
+        return (await self.aget_many([barcode]))[barcode]
+
+    def invalidate_barcodes(self, barcodes):
+        self.store.delete_many([self._key(barcode) for barcode in barcodes if barcode])
+
+    def invalidate_products(self, product_ids):
+        """
+        Drops the entries of `product_ids`. Their barcodes are read from the
+        database rather than kept in the cache, where the LRU could evict
+        them ahead of the hot barcode entries. Call it once the change has
+        committed.
+        """
+        product_ids = list(product_ids)
+        for start in range(0, len(product_ids), LOOKUP_CHUNK_SIZE):
+            barcodes = Product.objects.filter(
+                pk__in=product_ids[start:start + LOOKUP_CHUNK_SIZE], barcode__isnull=False,
+            ).values_list('barcode', flat=True)
+            self.invalidate_barcodes(barcodes)
+
+    def clear(self):
+        self.store.clear()
+
+
+@lru_cache(maxsize=None)
+def get_barcode_cache():
+    options = {**DEFAULTS, **getattr(settings, 'BARCODE_CACHE', {})}
+    if options['BACKEND'] == 'django':
+        store = DjangoCache(options['ALIAS'], options['TTL'], 'APP:barcode')
+    elif options['BACKEND'] == 'local':
+        store = LRUCache(options['MAX_SIZE'], options['TTL'])
+    else:
+        raise ValueError(f"Unknown BARCODE_CACHE backend: {options['BACKEND']!r}")
+    return BarcodeCache(store)
+
+
+@receiver(setting_changed)
+def reset_barcode_cache(setting, **kwargs):
+    if setting == 'BARCODE_CACHE':
+        get_barcode_cache.cache_clear()
@@ -0,0 +1,351 @@
+# APP/benchmarks.py
+"""
+Benchmarks for the hot views and APIs.
+
+`generate_data` fills the database with a synthetic shop (products,
+stock batches and sales spread over a number of days), and
+`run_benchmarks` requests each endpoint repeatedly, recording latency
+percentiles and query counts. Results are plain dicts so they can be
+written as JSON and compared between runs with `compare_results`.
+
+Run through the `run_benchmarks` management command, which uses a
+throwaway test database.
+
+`run_write_benchmark` measures sell_product write throughput with several
+processes selling into one SQLite file at once, under each of the
+DATABASE_PROFILES in settings.py (run through `benchmark_writes`).
+"""
+import datetime
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import close_old_connections, connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .alerts import refresh_alerts
+from .barcode_cache import get_barcode_cache
+from .models import Product, Sale, SaleItem, StockBatch
+from .rollups import rebuild_daily_sales
+from .stock import rebuild_on_hand
+
+
+SCALES = {
+    'small': {'products': 100, 'batches_per_product': 2, 'sales': 1000, 'days': 30},
+    'medium': {'products': 2000, 'batches_per_product': 2, 'sales': 20000, 'days': 90},
+    'large': {'products': 20000, 'batches_per_product': 3, 'sales': 200000, 'days': 365},
+}
+
+ENDPOINTS = ('finance_tracker', 'ai_advisor', 'advisor_data', 'sell_product', 'scan_product', 'scan_bulk', 'checkout')
+
+
+def generate_data(products, batches_per_product, sales, days, items_per_sale=3, seed=0, chunk_size=5000):
+    """
+    Creates a synthetic catalog with stock and `sales` sales spread evenly
+    over the last `days` days, then rebuilds the derived tables (on_hand,
+    daily rollup, alerts). Returns the list of product ids.
+    """
+    rng = random.Random(seed)
+    today = timezone.localdate()
+
+    Product.objects.bulk_create(
+        [
+            Product(
+                barcode=f'BENCH{i:08d}',
+                product_name=f'Product {i}',
+                cost_price=Decimal(rng.randint(100, 5000)) / 100,
+                selling_price=Decimal(rng.randint(5100, 9000)) / 100,
+                reorder_level=rng.randint(0, 50),
+            )
+            for i in range(products)
+        ],
+        batch_size=chunk_size,
+    )
+    products_by_id = {
+        product_id: (cost, price)
+        for product_id, cost, price in Product.objects.filter(barcode__startswith='BENCH')
+        .values_list('id', 'cost_price', 'selling_price')
+    }
+    product_ids = list(products_by_id)
+
+    StockBatch.objects.bulk_create(
+        [
+            StockBatch(
+                product_id=product_id,
+                quantity=rng.randint(0, 200),
+                received_date=today - datetime.timedelta(days=rng.randint(0, days)),
+                expiry_date=today + datetime.timedelta(days=rng.randint(-5, 120)),
+            )
+            for product_id in product_ids
+            for _ in range(batches_per_product)
+        ],
+        batch_size=chunk_size,
+    )
+
+    now = timezone.now()
+    for start in range(0, sales, chunk_size):
+        count = min(chunk_size, sales - start)
+        baskets = [rng.sample(product_ids, min(items_per_sale, len(product_ids))) for _ in range(count)]
+        # spread the sales evenly over the history, oldest first
+        new_sales = Sale.objects.bulk_create([
+            Sale(
+                sale_timestamp=now - datetime.timedelta(days=days - 1 - offset * days // max(sales, 1)),
+                total_amount=sum(products_by_id[product_id][1] for product_id in basket),
+                total_profit=sum(products_by_id[product_id][1] - products_by_id[product_id][0] for product_id in basket),
+            )
+            for offset, basket in enumerate(baskets, start=start)
+        ])
+        SaleItem.objects.bulk_create(
+            [
+                SaleItem(
+                    sale=sale,
+                    product_id=product_id,
+                    quantity=1,
+                    price_at_sale=products_by_id[product_id][1],
+                    cost_at_sale=products_by_id[product_id][0],
+                )
+                for sale, basket in zip(new_sales, baskets)
+                for product_id in basket
+            ],
+            batch_size=chunk_size,
+        )
+
+    rebuild_on_hand()
+    rebuild_daily_sales()
+    refresh_alerts()
+    return product_ids
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(name, call, repeat):
+    """Runs `call` `repeat` times; returns latency percentiles (ms) and the query count."""
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = call()
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{name} returned HTTP {response.status_code}")
+        queries = max(queries, len(captured.captured_queries))
+
+    timings.sort()
+    return {
+        'endpoint': name,
+        'runs': repeat,
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p90_ms': round(percentile(timings, 0.90), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'max_ms': round(timings[-1], 3),
+        'queries': queries,
+    }
+
+
+def endpoint_calls(client, product_ids, rng):
+    """{endpoint name: zero-argument callable making one request}."""
+    in_stock = list(
+        Product.objects.filter(pk__in=product_ids, on_hand__gt=0).values_list('id', 'barcode')[:500]
+    )
+    barcodes = [barcode for _, barcode in in_stock]
+
+    def sell_product():
+        product_id = rng.choice(in_stock)[0]
+        return client.post(reverse('sell-product-page', args=[product_id]), {'quantity_sold': 1})
+
+    def checkout():
+        basket = rng.sample(in_stock, min(10, len(in_stock)))
+        items = [{'product_id': product_id, 'quantity': 1} for product_id, _ in basket]
+        return client.post(reverse('api-checkout'), {'items': items}, content_type='application/json')
+
+    return {
+        'finance_tracker': lambda: client.get(reverse('finance-tracker')),
+        'ai_advisor': lambda: client.get(reverse('ai-advisor')),
+        'advisor_data': lambda: client.get(reverse('api-advisor')),
+        'sell_product': sell_product,
+        'scan_product': lambda: client.get(reverse('api-scan-product', args=[rng.choice(barcodes)])),
+        'scan_bulk': lambda: client.post(
+            reverse('api-scan-bulk'), {'barcodes': rng.sample(barcodes, min(100, len(barcodes)))},
+            content_type='application/json',
+        ),
+        'checkout': checkout,
+    }
+
+
+def run_benchmarks(scale_name, scale, repeat=20, endpoints=ENDPOINTS, seed=0):
+    """Generates data for one scale and benchmarks each endpoint. Returns a list of result dicts."""
+    started = time.perf_counter()
+    product_ids = generate_data(seed=seed, **scale)
+    generation_seconds = time.perf_counter() - started
+
+    get_barcode_cache().clear()
+    client = Client()
+    # checkout is for logged-in users only
+    client.force_login(User.objects.get_or_create(username='benchmark')[0])
+    calls = endpoint_calls(client, product_ids, random.Random(seed))
+
+    results = []
+    for name in endpoints:
+        result = measure(name, calls[name], repeat)
+        result.update({'scale': scale_name, **scale, 'generation_s': round(generation_seconds, 2)})
+        results.append(result)
+    return results
+
+
+def environment():
+    return {
+        'timestamp': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+    }
+
+
+def compare_results(baseline, current, threshold=0.2):
+    """
+    Compares two result lists by (scale, endpoint). Returns a list of
+    dicts with the p50/p90 ratio and query delta, flagging regressions
+    where latency grew by more than `threshold` or queries increased.
+    """
+    previous = {(row['scale'], row['endpoint']): row for row in baseline}
+    rows = []
+    for row in current:
+        old = previous.get((row['scale'], row['endpoint']))
+        if old is None:
+            continue
+        p50_ratio = row['p50_ms'] / old['p50_ms'] if old['p50_ms'] else 1.0
+        p90_ratio = row['p90_ms'] / old['p90_ms'] if old['p90_ms'] else 1.0
+        query_delta = row['queries'] - old['queries']
+        rows.append({
+            'scale': row['scale'],
+            'endpoint': row['endpoint'],
+            'p50_ratio': round(p50_ratio, 3),
+            'p90_ratio': round(p90_ratio, 3),
+            'query_delta': query_delta,
+            'regression': p50_ratio > 1 + threshold or query_delta > 0,
+        })
+    return rows
+
+
+def _write_worker(pragmas, sales, product_ids, seed, start, results):
+    """One till process: sells `sales` single units through sell_product as separate requests."""
+    rng = random.Random(seed)
+    client = Client()
+    # checkout is for logged-in users only
+    client.force_login(User.objects.get_or_create(username='benchmark')[0])
+    completed = failed = 0
+    with override_settings(SQLITE_PRAGMAS=pragmas):
+        start.wait()
+        started = time.perf_counter()
+        for _ in range(sales):
+            response = client.post(
+                reverse('sell-product-page', args=[rng.choice(product_ids)]), {'quantity_sold': 1}
+            )
+            # sell_product redirects after a sale and re-renders the form on any error
+            if response.status_code == 302:
+                completed += 1
+            else:
+                failed += 1
+            # the test client keeps connections open; end the "request" the way the handler does
+            close_old_connections()
+        elapsed = time.perf_counter() - started
+    connection.close()
+    results.put((completed, failed, elapsed))
+
+
+def run_write_benchmark(profiles=None, processes=4, sales_per_process=200, products=50, seed=0):
+    """
+    For each named database profile, copies a freshly migrated SQLite file,
+    stocks `products` products and has `processes` forked processes sell
+    through sell_product concurrently. Returns one result dict per profile
+    with completed/failed sales and throughput in sales per second.
+
+    Needs the 'fork' start method (Linux, macOS), so children inherit the
+    configured Django without importing settings again.
+    """
+    profiles = profiles or list(settings.DATABASE_PROFILES)
+    context = multiprocessing.get_context('fork')
+    settings_dict = connection.settings_dict
+    old_name, old_max_age = settings_dict['NAME'], settings_dict['CONN_MAX_AGE']
+    directory = tempfile.mkdtemp(prefix='profitify-writes-')
+
+    results = []
+    try:
+        template = os.path.join(directory, 'template.sqlite3')
+        connections.close_all()
+        settings_dict['NAME'] = template
+        with override_settings(SQLITE_PRAGMAS={}):
+            call_command('migrate', verbosity=0, interactive=False)
+        connections.close_all()
+
+        for name in profiles:
+            profile = settings.DATABASE_PROFILES[name]
+            database = os.path.join(directory, f'{name}.sqlite3')
+            shutil.copyfile(template, database)
+            settings_dict['NAME'] = database
+            settings_dict['CONN_MAX_AGE'] = profile['CONN_MAX_AGE']
+
+            with override_settings(SQLITE_PRAGMAS=profile['PRAGMAS']):
+                Product.objects.bulk_create([
+                    Product(barcode=f'WRITE{i:06d}', product_name=f'Product {i}',
+                            cost_price=Decimal('1.00'), selling_price=Decimal('2.00'))
+                    for i in range(products)
+                ])
+                product_ids = list(Product.objects.values_list('id', flat=True))
+                StockBatch.objects.bulk_create(
+                    [StockBatch(product_id=product_id, quantity=10 ** 6) for product_id in product_ids]
+                )
+                rebuild_on_hand()
+                get_barcode_cache().clear()
+            # children must open their own connections rather than share this one
+            connections.close_all()
+
+            start = context.Barrier(processes)
+            queue = context.Queue()
+            workers = [
+                context.Process(
+                    target=_write_worker,
+                    args=(profile['PRAGMAS'], sales_per_process, product_ids, seed + index, start, queue),
+                )
+                for index in range(processes)
+            ]
+            for worker in workers:
+                worker.start()
+            outcomes = [queue.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+
+            completed = sum(outcome[0] for outcome in outcomes)
+            elapsed = max(outcome[2] for outcome in outcomes)
+            results.append({
+                'profile': name,
+                'processes': processes,
+                'sales_per_process': sales_per_process,
+                'completed': completed,
+                'failed': sum(outcome[1] for outcome in outcomes),
+                'seconds': round(elapsed, 3),
+                'sales_per_second': round(completed / elapsed, 1) if elapsed else 0.0,
+            })
+    finally:
+        connections.close_all()
+        settings_dict['NAME'], settings_dict['CONN_MAX_AGE'] = old_name, old_max_age
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
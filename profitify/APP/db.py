@@ -0,0 +1,64 @@
+# APP/db.py
+"""
+Database connection tuning.
+
+Every new SQLite connection is configured with settings.SQLITE_PRAGMAS
+(WAL journaling, relaxed fsync, a larger page cache, memory-mapped reads
+and a busy timeout in the production profile, see DATABASE_PROFILES in
+settings.py).
+
+`write_atomic` is transaction.atomic() for blocks that are going to
+write. On SQLite it starts the transaction with BEGIN IMMEDIATE, taking
+the write lock up front: a plain (deferred) transaction that reads first
+and writes later fails straight away with "database is locked" when
+another connection is writing, because the busy timeout cannot help a
+read lock that needs upgrading.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def apply_pragmas(connection, pragmas):
+    """Runs `PRAGMA name = value` for each item; returns {name: value now in effect}."""
+    applied = {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            applied[name] = row[0] if row else None
+    return applied
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if pragmas:
+        apply_pragmas(connection, pragmas)
+
+
+class WriteAtomic(transaction.Atomic):
+    """Atomic block whose outermost transaction is started with BEGIN IMMEDIATE on SQLite."""
+
+    def __enter__(self):
+        connection = transaction.get_connection(self.using)
+        if connection.vendor != 'sqlite' or connection.in_atomic_block:
+            return super().__enter__()
+
+        # transaction_mode is read from OPTIONS when the connection opens, so open it first
+        connection.ensure_connection()
+        previous = connection.transaction_mode
+        connection.transaction_mode = 'IMMEDIATE'
+        try:
+            return super().__enter__()
+        finally:
+            connection.transaction_mode = previous
+
+
+def write_atomic(using=None, savepoint=True):
+    """Like transaction.atomic(using, savepoint), for blocks that write."""
+    return WriteAtomic(using, savepoint, False)
@@ -0,0 +1,82 @@
+# APP/exports.py
+"""
+Streaming exports of sales and stock.
+
+Rows are read with values_list(...).iterator(chunk_size=...) and written
+out one line at a time, so memory stays flat however many rows a date
+range covers.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .finance import timestamp_bounds
+from .models import Sale, SaleItem, StockBatch
+
+
+CHUNK_SIZE = 2000
+FORMATS = ('csv', 'ndjson')
+
+DATASETS = {
+    'sales': {
+        'model': Sale,
+        'date_field': 'sale_timestamp',
+        'fields': ('id', 'sale_timestamp', 'user_id', 'total_amount', 'total_profit'),
+    },
+    'sale-items': {
+        'model': SaleItem,
+        'date_field': 'sale__sale_timestamp',
+        'fields': ('id', 'sale_id', 'sale__sale_timestamp', 'product_id', 'product__barcode',
+                   'quantity', 'price_at_sale', 'cost_at_sale'),
+    },
+    'stock-batches': {
+        'model': StockBatch,
+        'date_field': 'received_date',
+        'fields': ('id', 'product_id', 'product__barcode', 'quantity', 'received_date', 'expiry_date'),
+    },
+}
+
+
+class Echo:
+    """A file-like object whose write() just returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(dataset, start_date=None, end_date=None):
+    """Yields value tuples for `dataset` within the optional inclusive date range, in id order."""
+    spec = DATASETS[dataset]
+    queryset = spec['model'].objects.all()
+    date_field = spec['date_field']
+
+    if date_field.endswith('timestamp'):
+        if start_date:
+            queryset = queryset.filter(**{f'{date_field}__gte': timestamp_bounds(start_date, start_date)[0]})
+        if end_date:
+            queryset = queryset.filter(**{f'{date_field}__lt': timestamp_bounds(end_date, end_date)[1]})
+    else:
+        if start_date:
+            queryset = queryset.filter(**{f'{date_field}__gte': start_date})
+        if end_date:
+            queryset = queryset.filter(**{f'{date_field}__lte': end_date})
+
+    return queryset.order_by('id').values_list(*spec['fields']).iterator(chunk_size=CHUNK_SIZE)
+
+
+def export_lines(dataset, start_date=None, end_date=None, fmt='csv'):
+    """Yields the export as text lines (CSV with a header row, or one JSON object per line)."""
+    fields = DATASETS[dataset]['fields']
+    rows = export_rows(dataset, start_date, end_date)
+
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow(row)
+    elif fmt == 'ndjson':
+        for row in rows:
+            yield json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder) + '\n'
+    else:
+        raise ValueError(f"Unknown export format: {fmt!r}")
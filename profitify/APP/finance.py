@@ -0,0 +1,150 @@
+# APP/finance.py
+"""
+Finance aggregation helpers.
+
+Every figure is computed by the database with aggregate queries over the
+DailyProductSales rollup, so the cost of a report depends on the number of
+products and days in the range rather than on the number of sales.
+Period grouping uses Trunc, which PostgreSQL runs as date_trunc().
+"""
+import datetime
+from decimal import Decimal
+
+from django.db.models import DateField, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import DailyProductSales, Sale, SaleItem
+
+
+LINE_REVENUE = ExpressionWrapper(
+    F('price_at_sale') * F('quantity'),
+    output_field=DecimalField(max_digits=14, decimal_places=2),
+)
+LINE_COST = ExpressionWrapper(
+    F('cost_at_sale') * F('quantity'),
+    output_field=DecimalField(max_digits=14, decimal_places=2),
+)
+LINE_PROFIT = ExpressionWrapper(
+    (F('price_at_sale') - F('cost_at_sale')) * F('quantity'),
+    output_field=DecimalField(max_digits=14, decimal_places=2),
+)
+
+PERIODS = ('day', 'week', 'month')
+
+
+def parse_date_range(start=None, end=None):
+    """
+    Turns optional 'YYYY-MM-DD' strings into a (start_date, end_date) pair.
+    Missing values default to today; a reversed range is swapped.
+    Raises ValueError on a malformed date.
+    """
+    today = timezone.localdate()
+    start_date = datetime.date.fromisoformat(start) if start else None
+    end_date = datetime.date.fromisoformat(end) if end else None
+
+    start_date = start_date or end_date or today
+    end_date = end_date or start_date
+    if start_date > end_date:
+        start_date, end_date = end_date, start_date
+    return start_date, end_date
+
+
+def timestamp_bounds(start_date, end_date):
+    """
+    Converts an inclusive date range into an aware [start, end) datetime range.
+    Filtering on the raw timestamp (instead of `__date`) lets the database use
+    an index on `sale_timestamp`.
+    """
+    tz = timezone.get_current_timezone()
+    start_dt = timezone.make_aware(datetime.datetime.combine(start_date, datetime.time.min), tz)
+    end_dt = timezone.make_aware(
+        datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min), tz
+    )
+    return start_dt, end_dt
+
+
+def sales_in_range(start_date, end_date):
+    start_dt, end_dt = timestamp_bounds(start_date, end_date)
+    return Sale.objects.filter(sale_timestamp__gte=start_dt, sale_timestamp__lt=end_dt)
+
+
+def sale_items_in_range(start_date, end_date):
+    start_dt, end_dt = timestamp_bounds(start_date, end_date)
+    return SaleItem.objects.filter(sale__sale_timestamp__gte=start_dt, sale__sale_timestamp__lt=end_dt)
+
+
+def daily_sales_in_range(start_date, end_date):
+    return DailyProductSales.objects.filter(date__gte=start_date, date__lte=end_date)
+
+
+def top_profit_makers(start_date, end_date, limit=5):
+    """Top products by profit for the range, as dicts with `product__product_name` and `total_profit`."""
+    return list(
+        daily_sales_in_range(start_date, end_date)
+        .values('product_id', 'product__product_name')
+        .annotate(total_profit=Sum('profit'), units_sold=Sum('units'))
+        .order_by('-total_profit')[:limit]
+    )
+
+
+def finance_summary(start_date, end_date, top_n=5):
+    """
+    Revenue, COGS, profit, sale count and top profit makers for an inclusive
+    date range, in three queries regardless of sales volume.
+    """
+    totals = daily_sales_in_range(start_date, end_date).aggregate(
+        revenue=Sum('revenue'),
+        cogs=Sum('cogs'),
+    )
+    sale_count = sales_in_range(start_date, end_date).count()
+
+    revenue = totals['revenue'] or Decimal('0')
+    cogs = totals['cogs'] or Decimal('0')
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'revenue': revenue,
+        'cogs': cogs,
+        'profit': revenue - cogs,
+        'sale_count': sale_count,
+        'profit_makers': top_profit_makers(start_date, end_date, limit=top_n),
+    }
+
+
+def series_period(start_date, end_date):
+    """The grouping that keeps a chart of the range readable: day, week or month."""
+    days = (end_date - start_date).days + 1
+    if days <= 62:
+        return 'day'
+    if days <= 366:
+        return 'week'
+    return 'month'
+
+
+def revenue_series(start_date, end_date, period=None):
+    """
+    Revenue, COGS and profit per day, week (starting Monday) or month of an
+    inclusive date range, as [{'period', 'revenue', 'cogs', 'profit'}, ...]
+    in date order, in one grouped query. Days without sales are filled with
+    zeros when grouping by day.
+    """
+    period = period or series_period(start_date, end_date)
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period: {period!r}")
+    bucket = F('date') if period == 'day' else Trunc('date', period, output_field=DateField())
+    rows = (
+        daily_sales_in_range(start_date, end_date)
+        .annotate(period=bucket)
+        .values('period')
+        .annotate(revenue=Sum('revenue'), cogs=Sum('cogs'), profit=Sum('profit'))
+        .order_by('period')
+    )
+    series = {row['period']: row for row in rows}
+    if period == 'day':
+        zero = Decimal('0')
+        for offset in range((end_date - start_date).days + 1):
+            day = start_date + datetime.timedelta(days=offset)
+            series.setdefault(day, {'period': day, 'revenue': zero, 'cogs': zero, 'profit': zero})
+    return [series[key] for key in sorted(series)]
@@ -0,0 +1,220 @@
+# APP/forecasting.py
+"""
+Demand forecasting for reorder levels.
+
+Daily sales (the DailyProductSales rollup) are loaded into a products x
+days NumPy matrix and every product is forecast in one vectorised pass:
+
+- day-of-week seasonal factors per product, shrunk towards 1 for
+  products with little history;
+- simple exponential smoothing of the deseasonalised series, one
+  vector step per day across all products;
+- the smoothed absolute one-step error (MAD) as the noise estimate.
+
+The reorder level is the forecast demand over the supplier lead time
+plus safety stock for the requested service level
+(z x 1.25 x MAD x sqrt(lead time)). `write_reorder_levels` stores it on
+Product in a handful of grouped UPDATEs. Products that sold nothing in
+the window are left alone, so manually set levels survive.
+
+NumPy is only needed for forecasting: `pip install numpy`. On multi-core
+hosts, with `processes` > 1, the products are split across forked
+processes, each loading and forecasting its own share.
+"""
+import datetime
+import itertools
+import math
+import multiprocessing
+import queue
+import statistics
+from collections import defaultdict
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.models import Case, CharField, IntegerField, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .advisor import get_advisor_cache
+from .models import DailyProductSales, Product
+
+try:
+    import numpy as np
+except ImportError:  # optional, see the module docstring
+    np = None
+
+
+HISTORY_DAYS = 730
+LEAD_TIME_DAYS = 7
+SERVICE_LEVEL = 0.95
+ALPHA = 0.1                 # smoothing weight of the newest day
+SEASONAL_PRIOR = 14         # units of "flat week" each product's weekday profile is blended with
+WARMUP_DAYS = 28
+CHUNK_SIZE = 500
+HISTORY_CHUNK_SIZE = 10000  # rollup rows turned into arrays at a time
+
+
+def require_numpy():
+    if np is None:
+        raise ImproperlyConfigured("Demand forecasting needs NumPy (pip install numpy).")
+
+
+def load_history(start, end, id_range=None):
+    """
+    (product_ids, matrix): units sold per product (rows, ascending id) per
+    day from `start` to `end` inclusive (columns), for products that sold
+    anything in that window. `id_range` = (first, last) limits the product ids.
+    """
+    require_numpy()
+    rows = DailyProductSales.objects.filter(date__gte=start, date__lte=end, units__gt=0)
+    if id_range is not None:
+        rows = rows.filter(product_id__gte=id_range[0], product_id__lte=id_range[1])
+    # dates come back as text and are parsed by NumPy in one go, which is
+    # much cheaper than a date object per row
+    rows = rows.order_by().values_list('product_id', Cast('date', CharField()), 'units')
+    rows = rows.iterator(chunk_size=HISTORY_CHUNK_SIZE)
+    # each chunk becomes three compact arrays, so only one chunk is ever
+    # held as Python tuples
+    product_parts, day_parts, units_parts = [np.zeros(0, np.int64)], [np.zeros(0, np.int64)], [np.zeros(0)]
+    while chunk := list(itertools.islice(rows, HISTORY_CHUNK_SIZE)):
+        product_col, day_col, units_col = zip(*chunk)
+        product_parts.append(np.array(product_col, dtype=np.int64))
+        day_parts.append((np.array(day_col, dtype='datetime64[D]') - np.datetime64(start)).astype(np.int64))
+        units_parts.append(np.array(units_col, dtype=np.float64))
+
+    ids, row_index = np.unique(np.concatenate(product_parts), return_inverse=True)
+    matrix = np.zeros((len(ids), (end - start).days + 1), dtype=np.float64)
+    matrix[row_index, np.concatenate(day_parts)] = np.concatenate(units_parts)
+    return ids, matrix
+
+
+def seasonal_factors(matrix, start):
+    """products x 7 weekday factors (Monday first), averaging 1 per product."""
+    weekday = (start.weekday() + np.arange(matrix.shape[1])) % 7
+    totals = np.stack([matrix[:, weekday == day].sum(axis=1) for day in range(7)], axis=1)
+    counts = np.bincount(weekday, minlength=7).astype(np.float64)
+    # units per weekday occurrence relative to units per day, with the prior as extra flat demand
+    per_day = (totals.sum(axis=1, keepdims=True) + SEASONAL_PRIOR) / counts.sum()
+    return ((totals + SEASONAL_PRIOR * counts / counts.sum()) / counts) / per_day
+
+
+def forecast(matrix, start, lead_time=LEAD_TIME_DAYS, service_level=SERVICE_LEVEL, alpha=ALPHA):
+    """
+    Forecasts every row of `matrix` (days from `start`) over the `lead_time`
+    days after it. Returns a dict of per-product arrays: 'daily' (current
+    deseasonalised rate), 'demand' (units over the lead time), 'safety_stock'
+    and 'reorder_level' (ceil(demand + safety_stock)).
+    """
+    require_numpy()
+    days = matrix.shape[1]
+    factors = seasonal_factors(matrix, start)
+    weekday = (start.weekday() + np.arange(days)) % 7
+
+    warmup = min(WARMUP_DAYS, days)
+    level = (matrix[:, :warmup] / factors[:, weekday[:warmup]]).mean(axis=1)
+    mad = np.abs(matrix[:, :warmup] - level[:, None] * factors[:, weekday[:warmup]]).mean(axis=1)
+    for day in range(days):
+        factor = factors[:, weekday[day]]
+        error = matrix[:, day] - level * factor
+        mad += alpha * (np.abs(error) - mad)
+        # the error is not divided by the factor: a day that hardly ever
+        # sells (a factor near 0) would otherwise yank the level around
+        level += alpha * error
+
+    ahead = (start.weekday() + days + np.arange(lead_time)) % 7
+    demand = level * factors[:, ahead].sum(axis=1)
+    z = statistics.NormalDist().inv_cdf(service_level)
+    safety_stock = z * 1.25 * mad * math.sqrt(lead_time)
+    return {
+        'daily': level,
+        'demand': demand,
+        'safety_stock': safety_stock,
+        'reorder_level': np.ceil(demand + safety_stock).astype(np.int64),
+    }
+
+
+def _forecast_share(id_range, start, end, options):
+    ids, matrix = load_history(start, end, id_range)
+    return ids, forecast(matrix, start, **options)['reorder_level']
+
+
+def _worker(id_range, start, end, options, results):
+    connections.close_all()  # the inherited connection belongs to the parent
+    ids, levels = _forecast_share(id_range, start, end, options)
+    results.put((ids.tolist(), levels.tolist()))
+    connections.close_all()
+
+
+def suggest_reorder_levels(as_of=None, history_days=HISTORY_DAYS, processes=1, **options):
+    """
+    {product_id: suggested reorder level} for every product that sold
+    something in the `history_days` up to `as_of`. `options` go to forecast().
+    With `processes` > 1 the products are split into contiguous id ranges
+    of about the same size, one per forked process.
+    """
+    require_numpy()
+    end = as_of or timezone.localdate()
+    start = end - datetime.timedelta(days=history_days - 1)
+    if processes <= 1:
+        ids, levels = _forecast_share(None, start, end, options)
+        return dict(zip(ids.tolist(), levels.tolist()))
+
+    product_ids = list(
+        DailyProductSales.objects.filter(date__gte=start, date__lte=end, units__gt=0)
+        .order_by('product_id').values_list('product_id', flat=True).distinct()
+    )
+    if not product_ids:
+        return {}
+    size = math.ceil(len(product_ids) / processes)
+    shares = [
+        (product_ids[index], product_ids[min(index + size, len(product_ids)) - 1])
+        for index in range(0, len(product_ids), size)
+    ]
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    connections.close_all()
+    workers = [
+        context.Process(target=_worker, args=(share, start, end, options, results))
+        for share in shares
+    ]
+    for worker in workers:
+        worker.start()
+    suggestions = {}
+    pending = len(workers)
+    while pending:
+        try:
+            ids, levels = results.get(timeout=1)
+        except queue.Empty:
+            failed = [worker.exitcode for worker in workers if worker.exitcode]
+            if failed:
+                raise RuntimeError(f"Forecast worker exited with code {failed[0]}")
+            continue
+        suggestions.update(zip(ids, levels))
+        pending -= 1
+    for worker in workers:
+        worker.join()
+    return suggestions
+
+
+def write_reorder_levels(levels):
+    """
+    Sets Product.reorder_level from {product_id: level}. Products sharing a
+    level are grouped into one CASE branch, one UPDATE per CHUNK_SIZE
+    products. Returns the number of products updated.
+    """
+    product_ids = sorted(levels)
+    updated = 0
+    with transaction.atomic():
+        for start in range(0, len(product_ids), CHUNK_SIZE):
+            chunk = product_ids[start:start + CHUNK_SIZE]
+            ids_by_level = defaultdict(list)
+            for product_id in chunk:
+                ids_by_level[levels[product_id]].append(product_id)
+            level = Case(
+                *[When(pk__in=ids, then=Value(value)) for value, ids in ids_by_level.items()],
+                output_field=IntegerField(),
+            )
+            updated += Product.objects.filter(pk__in=chunk).update(reorder_level=level)
+        # queryset updates skip the Product signals
+        transaction.on_commit(lambda: get_advisor_cache().invalidate())
+    return updated
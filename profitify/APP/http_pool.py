@@ -0,0 +1,76 @@
+# APP/http_pool.py
+"""
+A small keep-alive HTTP(S) connection pool over http.client, shared by
+the server-side proxies for external APIs (APP/llm.py, APP/product_lookup.py).
+"""
+import http.client
+import queue
+import threading
+from urllib.parse import urlsplit
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections shared between threads, up to `max_idle`
+    idle connections per origin. Connecting and reading have separate timeouts.
+    """
+
+    def __init__(self, max_idle=10, connect_timeout=5, read_timeout=30):
+        self.max_idle = max_idle
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, origin):
+        scheme, host, port = origin
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(host, port, timeout=self.connect_timeout)
+        connection.connect()
+        connection.sock.settimeout(self.read_timeout)
+        return connection
+
+    def _acquire(self, origin):
+        with self._lock:
+            idle = self._idle.setdefault(origin, queue.LifoQueue(self.max_idle))
+        try:
+            return idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(origin), False
+
+    def _release(self, origin, connection):
+        try:
+            self._idle[origin].put_nowait(connection)
+        except (KeyError, queue.Full):
+            connection.close()
+
+    def request(self, method, url, body=None, headers=None):
+        """Sends one request and returns (status, body bytes). Raises OSError/HTTPException on failure."""
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+
+        for attempt in range(2):
+            connection, reused = self._acquire(origin)
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                # an idle connection the server has closed in the meantime: retry once on a fresh one
+                if reused and attempt == 0 and not isinstance(e, TimeoutError):
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(origin, connection)
+            return response.status, data
+
+    def close(self):
+        with self._lock:
+            pools, self._idle = list(self._idle.values()), {}
+        for idle in pools:
+            while not idle.empty():
+                idle.get_nowait().close()
@@ -0,0 +1,251 @@
+# APP/imports.py
+"""
+Bulk product and stock import.
+
+Rows are read lazily from CSV, NDJSON or a JSON array and processed in
+chunks. Each chunk upserts its products by barcode with a single
+bulk_create(update_conflicts=True), bulk-creates the stock batches,
+updates Product.on_hand and records the receipts in the StockMovement
+ledger, all in one transaction. Invalid rows are reported with their
+row number and skipped; they never abort the file.
+
+Recognised columns: barcode, product_name, cost_price, selling_price
+(required) and description, reorder_level, supplier_info, quantity,
+expiry_date, received_date (optional). A row with a positive quantity also
+creates a StockBatch. Existing products are only updated in the optional
+columns the file actually has, so a partial sheet (say, a supplier's
+delivery list) leaves everything else on the product alone.
+"""
+import csv
+import datetime
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .advisor import get_advisor_cache
+from .barcode_cache import get_barcode_cache
+from .models import Product, StockBatch, StockMovement
+
+
+CHUNK_SIZE = 1000
+FORMATS = ('csv', 'ndjson', 'json')
+PRODUCT_UPDATE_FIELDS = ['product_name', 'description', 'cost_price', 'selling_price', 'reorder_level', 'supplier_info']
+# checked per row, so a value the column cannot hold fails its own row
+# rather than the whole chunk's transaction
+MAX_LENGTHS = {name: Product._meta.get_field(name).max_length for name in ('barcode', 'product_name', 'supplier_info')}
+PRICE_FIELD = Product._meta.get_field('cost_price')  # selling_price is the same
+PRICE_LIMIT = Decimal(10) ** (PRICE_FIELD.max_digits - PRICE_FIELD.decimal_places)
+
+
+class RowError(ValueError):
+    pass
+
+
+class ImportReport:
+
+    def __init__(self):
+        self.rows = 0
+        self.products_created = 0
+        self.products_updated = 0
+        self.batches_created = 0
+        self.errors = []
+
+    def add_error(self, row_number, message):
+        self.errors.append({'row': row_number, 'message': message})
+
+    def as_dict(self, max_errors=None):
+        return {
+            'rows': self.rows,
+            'products_created': self.products_created,
+            'products_updated': self.products_updated,
+            'batches_created': self.batches_created,
+            'error_count': len(self.errors),
+            'errors': self.errors[:max_errors] if max_errors is not None else self.errors,
+        }
+
+
+def read_rows(stream, fmt='csv'):
+    """Yields row dicts from a text stream without loading CSV/NDJSON input into memory."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                yield RowError(f"Line is not valid CSV: {e}.")
+                continue
+            yield row
+    elif fmt == 'ndjson':
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield RowError("Line is not valid JSON.")
+    elif fmt == 'json':
+        yield from json.load(stream)
+    else:
+        raise ValueError(f"Unknown import format: {fmt!r}")
+
+
+def _text(row, name, required=False):
+    value = row.get(name)
+    value = str(value).strip() if value is not None else ''
+    if required and not value:
+        raise RowError(f"'{name}' is required.")
+    if name in MAX_LENGTHS and len(value) > MAX_LENGTHS[name]:
+        raise RowError(f"'{name}' cannot be longer than {MAX_LENGTHS[name]} characters.")
+    return value or None
+
+
+def _decimal(row, name):
+    try:
+        value = Decimal(_text(row, name, required=True))
+    except InvalidOperation:
+        raise RowError(f"'{name}' must be a number.")
+    if not value.is_finite():
+        raise RowError(f"'{name}' must be a number.")
+    if value < 0:
+        raise RowError(f"'{name}' cannot be negative.")
+    # compared before rounding too, as quantize() fails on huge values
+    if value >= PRICE_LIMIT or value.quantize(Decimal('0.01')) >= PRICE_LIMIT:
+        raise RowError(f"'{name}' must be less than {PRICE_LIMIT}.")
+    return value.quantize(Decimal('0.01'))
+
+
+def _integer(row, name, default=0):
+    value = _text(row, name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise RowError(f"'{name}' must be a whole number.")
+
+
+def _date(row, name):
+    value = _text(row, name)
+    if value is None:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise RowError(f"'{name}' must be a date (YYYY-MM-DD).")
+
+
+def parse_row(row):
+    """Validates one input row. Returns (product_fields, batch_fields or None); raises RowError."""
+    if isinstance(row, RowError):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError("Row must be an object.")
+    product = {
+        'barcode': _text(row, 'barcode', required=True),
+        'product_name': _text(row, 'product_name', required=True),
+        'cost_price': _decimal(row, 'cost_price'),
+        'selling_price': _decimal(row, 'selling_price'),
+    }
+    # Optional columns are only set when the file has them; a blank
+    # reorder level means "not supplied", not 0
+    for name in ('description', 'supplier_info'):
+        if name in row:
+            product[name] = _text(row, name)
+    reorder_level = _integer(row, 'reorder_level', default=None)
+    if reorder_level is not None:
+        product['reorder_level'] = reorder_level
+    quantity = _integer(row, 'quantity')
+    if quantity < 0:
+        raise RowError("'quantity' cannot be negative.")
+    batch = None
+    if quantity:
+        batch = {
+            'quantity': quantity,
+            'expiry_date': _date(row, 'expiry_date'),
+            'received_date': _date(row, 'received_date') or timezone.localdate(),
+        }
+    return product, batch
+
+
+def _import_chunk(chunk, report, user=None):
+    products = {}
+    batches = []
+    row_numbers = []
+    for row_number, row in chunk:
+        try:
+            product, batch = parse_row(row)
+        except RowError as e:
+            report.add_error(row_number, str(e))
+            continue
+        # a later row for the same barcode wins, column by column
+        products.setdefault(product['barcode'], {}).update(product)
+        if batch:
+            batches.append((product['barcode'], batch))
+        row_numbers.append(row_number)
+
+    if not products:
+        return
+
+    try:
+        with transaction.atomic():
+            existing = set(
+                Product.objects.filter(barcode__in=list(products)).values_list('barcode', flat=True)
+            )
+            # One upsert per set of supplied columns (a CSV file has just one),
+            # so columns a row leaves out keep their current values
+            groups = {}
+            for fields in products.values():
+                groups.setdefault(frozenset(fields), []).append(fields)
+            for supplied, group in groups.items():
+                Product.objects.bulk_create(
+                    [Product(added_by_user=user, **fields) for fields in group],
+                    update_conflicts=True,
+                    unique_fields=['barcode'],
+                    update_fields=[name for name in PRODUCT_UPDATE_FIELDS if name in supplied],
+                )
+            ids = dict(Product.objects.filter(barcode__in=list(products)).values_list('barcode', 'id'))
+
+            new_batches = [StockBatch(product_id=ids[barcode], **fields) for barcode, fields in batches]
+            StockBatch.objects.bulk_create(new_batches)
+
+            # bulk_create skips StockBatch.save(), so apply the on_hand change here
+            deltas = {}
+            for batch in new_batches:
+                deltas[batch.product_id] = deltas.get(batch.product_id, 0) + batch.quantity
+            Product.adjust_on_hand(deltas)
+            StockMovement.record('receipt', [(batch.product_id, batch.pk, batch.quantity) for batch in new_batches])
+
+            # bulk_create skips the Product signals too, so drop cached scanner
+            # entries and advisor pages (which show reorder levels) here
+            barcodes = list(products)
+            transaction.on_commit(lambda: get_barcode_cache().invalidate_barcodes(barcodes))
+            transaction.on_commit(lambda: get_advisor_cache().invalidate())
+    except DatabaseError as e:
+        for row_number in row_numbers:
+            report.add_error(row_number, f"Database error: {e}")
+        return
+
+    report.products_created += len(products) - len(existing)
+    report.products_updated += len(existing)
+    report.batches_created += len(new_batches)
+
+
+def import_rows(rows, user=None, chunk_size=CHUNK_SIZE):
+    """
+    Imports an iterable of row dicts chunk by chunk and returns an ImportReport.
+    Row numbers in the report start at 1 for the first data row.
+    """
+    report = ImportReport()
+    chunk = []
+    for row_number, row in enumerate(rows, start=1):
+        report.rows += 1
+        chunk.append((row_number, row))
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, report, user)
+            chunk = []
+    if chunk:
+        _import_chunk(chunk, report, user)
+    return report
@@ -0,0 +1,113 @@
+# APP/ledger.py
+"""
+Point-in-time stock from the StockMovement ledger.
+
+Every batch change appends a StockMovement, and `take_snapshot` (run
+periodically, e.g. nightly, by `take_stock_snapshot`) stores the stock
+of the whole catalog together with the id of the last movement it
+covers. Stock at any moment is the latest snapshot taken by then plus
+the movements between that snapshot and the next one that happened
+before the moment, so the work is bounded by one snapshot interval
+however long the history grows. Catalog totals (units and value) are
+kept on the snapshot row itself: a valuation reads one row plus one
+interval's movements.
+
+Snapshots are taken inside write_atomic(), so on SQLite no stock writer
+can commit halfway through one. PostgreSQL hands out movement ids in
+insert order, not commit order, so there the snapshot first locks the
+movement table against writers: it waits for every movement already in
+flight to commit and holds new ones off until it is done, so the
+movements up to `last_movement_id` are exactly those in the on_hand
+values it reads.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import DecimalField, F, Max, Sum
+from django.utils import timezone
+
+from .db import write_atomic
+from .models import Product, StockMovement, StockSnapshot, StockSnapshotItem
+
+
+BATCH_SIZE = 1000
+
+
+def close_of_day(day):
+    """The moment `day` ends in the current time zone (stock "at" a date means after its last sale)."""
+    return timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+
+
+def take_snapshot():
+    """Stores the current stock of every product with any on hand; returns the StockSnapshot."""
+    with write_atomic():
+        if connection.vendor == 'postgresql':
+            # SHARE conflicts with the ROW EXCLUSIVE lock every INSERT takes
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {connection.ops.quote_name(StockMovement._meta.db_table)} IN SHARE MODE')
+        last_movement_id = StockMovement.objects.aggregate(last=Max('id'))['last'] or 0
+        snapshot = StockSnapshot.objects.create(taken_at=timezone.now(), last_movement_id=last_movement_id)
+
+        rows = Product.objects.exclude(on_hand=0).order_by('id').values_list('id', 'on_hand', 'cost_price')
+        items = []
+        for product_id, on_hand, cost_price in rows.iterator(chunk_size=BATCH_SIZE):
+            items.append(StockSnapshotItem(snapshot=snapshot, product_id=product_id, on_hand=on_hand, unit_cost=cost_price))
+            snapshot.units += on_hand
+            snapshot.value += on_hand * cost_price
+        StockSnapshotItem.objects.bulk_create(items, batch_size=BATCH_SIZE)
+        snapshot.save(update_fields=['units', 'value'])
+    return snapshot
+
+
+def _interval(when):
+    """
+    (snapshot, movements) behind the stock at `when`: the latest snapshot
+    taken by then and a queryset of the movements after it, up to the next
+    snapshot, that happened before `when`. Raises ValueError if the ledger
+    does not reach back that far.
+    """
+    snapshot = StockSnapshot.objects.filter(taken_at__lte=when).order_by('-taken_at').first()
+    if snapshot is None:
+        raise ValueError(f"No stock history before {timezone.localtime(when):%Y-%m-%d %H:%M}.")
+    movements = StockMovement.objects.filter(id__gt=snapshot.last_movement_id, created_at__lt=when)
+    following = (
+        StockSnapshot.objects.filter(taken_at__gt=snapshot.taken_at)
+        .order_by('taken_at')
+        .values_list('last_movement_id', flat=True)
+        .first()
+    )
+    if following is not None:
+        movements = movements.filter(id__lte=following)
+    return snapshot, movements.order_by()
+
+
+def stock_at(when, product_ids=None):
+    """{product_id: units on hand} at `when`, for `product_ids` or the whole catalog; products with none are left out."""
+    snapshot, movements = _interval(when)
+    items = snapshot.items.all()
+    if product_ids is not None:
+        items = items.filter(product_id__in=product_ids)
+        movements = movements.filter(product_id__in=product_ids)
+
+    stock = dict(items.values_list('product_id', 'on_hand'))
+    for product_id, delta in movements.values('product_id').annotate(delta=Sum('quantity')).values_list('product_id', 'delta'):
+        stock[product_id] = stock.get(product_id, 0) + delta
+    return {product_id: units for product_id, units in stock.items() if units}
+
+
+def stock_value_at(when):
+    """
+    {'units': n, 'value': Decimal} for the whole catalog at `when`: the
+    snapshot totals plus the movements since, which are valued at each
+    product's current cost price.
+    """
+    snapshot, movements = _interval(when)
+    delta = movements.aggregate(
+        units=Sum('quantity'),
+        value=Sum(F('quantity') * F('product__cost_price'), output_field=DecimalField(max_digits=16, decimal_places=2)),
+    )
+    return {
+        'units': snapshot.units + (delta['units'] or 0),
+        'value': snapshot.value + (delta['value'] or Decimal('0')),
+    }
@@ -0,0 +1,254 @@
+# APP/llm.py
+"""
+Server-side proxy for the AI advisor summary.
+
+The browser posts the waste/reorder/trend payload to generate_ai_summary
+and never sees the API key. Completions are cached by a hash of the
+payload, so repeated page views with unchanged inventory data do not pay
+for a new completion, and concurrent identical requests are coalesced
+into one upstream call. Upstream requests go through a small pool of
+keep-alive connections (APP/http_pool.py) with separate connect and
+read timeouts.
+
+Configured with settings.LLM_PROXY:
+
+    LLM_PROXY = {
+        'API_URL': 'https://api.groq.com/openai/v1/chat/completions',
+        'API_KEY': '...',           # no key: a rule-based summary is returned instead
+        'MODEL': 'openai/gpt-oss-20b',
+        'MAX_TOKENS': 512,
+        'TEMPERATURE': 1,
+        'CONNECT_TIMEOUT': 5,       # seconds
+        'READ_TIMEOUT': 30,         # seconds
+        'MAX_IDLE_CONNECTIONS': 10,
+        'CACHE_BACKEND': 'local',   # in-process LRU ('local') or Django's cache framework ('django')
+        'CACHE_TTL': 600,           # seconds a summary is served for the same payload
+        'CACHE_MAX_SIZE': 500,
+        'CACHE_ALIAS': 'default',
+    }
+"""
+import hashlib
+import http.client
+import json
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .barcode_cache import MISSING, DjangoCache, LRUCache
+from .http_pool import ConnectionPool
+
+
+DEFAULTS = {
+    'API_URL': 'https://api.groq.com/openai/v1/chat/completions',
+    'API_KEY': None,
+    'MODEL': 'openai/gpt-oss-20b',
+    'MAX_TOKENS': 512,
+    'TEMPERATURE': 1,
+    'CONNECT_TIMEOUT': 5,
+    'READ_TIMEOUT': 30,
+    'MAX_IDLE_CONNECTIONS': 10,
+    'CACHE_BACKEND': 'local',
+    'CACHE_TTL': 600,
+    'CACHE_MAX_SIZE': 500,
+    'CACHE_ALIAS': 'default',
+}
+
+PAYLOAD_KEYS = ('waste_data', 'reorder_data', 'trend_data')
+MAX_ITEMS = 200
+
+SYSTEM_PROMPT = (
+    "You are a helpful business advisor for small shop owners in India. Use very simple English "
+    "with lots of emojis. Keep responses under 200 words. Give practical, actionable advice."
+)
+
+
+class UpstreamError(Exception):
+    """The completion API failed or returned something unusable."""
+
+
+class UpstreamTimeout(UpstreamError):
+    """The completion API did not answer within the configured timeouts."""
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one call per key at a time; callers arriving meanwhile wait for and share its outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        """Returns (result, shared), where `shared` is True for callers that only waited."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+def clean_payload(data):
+    """
+    The waste/reorder/trend lists of a summary payload, each a list of at
+    most MAX_ITEMS objects. Raises ValueError for anything else.
+    """
+    payload = {}
+    for key in PAYLOAD_KEYS:
+        items = data.get(key) or []
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError(f"'{key}' must be a list of objects.")
+        payload[key] = items[:MAX_ITEMS]
+    return payload
+
+
+def build_prompt(payload):
+    lines = ["Give me shop advice for today. Use VERY SIMPLE English with emojis.", "", "RULES:",
+             "- Use ✅ for good things", "- Use ❌ for problems", "- Use ⚠️ for warnings",
+             "- Use simple words only", "", "MY SHOP DATA:"]
+    if payload['waste_data']:
+        lines.append("Products expiring soon:")
+        lines.extend(f"- {item.get('product') or 'Product'} (expires: {item.get('expiry_date')})"
+                     for item in payload['waste_data'])
+    if payload['reorder_data']:
+        lines.append("Products with low stock:")
+        lines.extend(f"- {item.get('name')} (only {item.get('current_stock')} left)" for item in payload['reorder_data'])
+    if payload['trend_data']:
+        lines.append("Products selling fast:")
+        lines.extend(f"- {item.get('product_name')}" for item in payload['trend_data'])
+    return '\n'.join(lines)
+
+
+def rule_based_summary(payload):
+    """The summary used when no API key is configured."""
+    low_stock = next((item.get('name') for item in payload['reorder_data']), None)
+    fastest_moving = next((item.get('product_name') for item in payload['trend_data']), None)
+    expiring = len(payload['waste_data'])
+
+    if low_stock:
+        return (f"SUCCESS: Your inventory has been analyzed. Recommendation: Immediate focus should be "
+                f"restocking '{low_stock}'. Additionally, check {expiring} item(s) approaching expiry.")
+    if fastest_moving:
+        return (f"SUCCESS: Inventory is stable. Recommendation: A strong trend is emerging for "
+                f"'{fastest_moving}'. Proactively increase your next order to capitalize on this demand.")
+    if expiring:
+        return (f"SUCCESS: Inventory is stable. Recommendation: {expiring} item(s) are approaching expiry. "
+                f"Run a flash sale or promotion to clear this stock immediately.")
+    return ("SUCCESS: All inventory levels are optimal, and no critical alerts are present. "
+            "Recommendation: Continue monitoring sales and consider diversifying product offerings.")
+
+
+class SummaryService:
+
+    def __init__(self, options):
+        self.options = options
+        if options['CACHE_BACKEND'] == 'django':
+            self.store = DjangoCache(options['CACHE_ALIAS'], options['CACHE_TTL'], 'APP:llm')
+        elif options['CACHE_BACKEND'] == 'local':
+            self.store = LRUCache(options['CACHE_MAX_SIZE'], options['CACHE_TTL'])
+        else:
+            raise ValueError(f"Unknown LLM_PROXY cache backend: {options['CACHE_BACKEND']!r}")
+        self.pool = ConnectionPool(
+            options['MAX_IDLE_CONNECTIONS'], options['CONNECT_TIMEOUT'], options['READ_TIMEOUT'],
+        )
+        self.flight = SingleFlight()
+
+    @property
+    def enabled(self):
+        return bool(self.options['API_KEY'])
+
+    def cache_key(self, payload):
+        canonical = json.dumps([self.options['MODEL'], SYSTEM_PROMPT, payload], sort_keys=True, default=str)
+        return 'APP:llm-summary:' + hashlib.sha256(canonical.encode()).hexdigest()
+
+    def summarize(self, payload):
+        """
+        Returns (summary, cached) for a cleaned payload. `cached` is True when
+        no upstream call was made for this request. Raises UpstreamError.
+        """
+        key = self.cache_key(payload)
+        summary = self.store.get(key)
+        if summary is not MISSING:
+            return summary, True
+        return self.flight.do(key, lambda: self._complete_and_store(key, payload))
+
+    def _complete_and_store(self, key, payload):
+        # another caller may have finished the same completion just before this one started
+        summary = self.store.get(key)
+        if summary is not MISSING:
+            return summary
+        summary = self.complete(payload)
+        self.store.set(key, summary)
+        return summary
+
+    def complete(self, payload):
+        body = json.dumps({
+            'model': self.options['MODEL'],
+            'messages': [
+                {'role': 'system', 'content': SYSTEM_PROMPT},
+                {'role': 'user', 'content': build_prompt(payload)},
+            ],
+            'temperature': self.options['TEMPERATURE'],
+            'max_tokens': self.options['MAX_TOKENS'],
+            'stream': False,
+        }).encode()
+        headers = {
+            'Authorization': f"Bearer {self.options['API_KEY']}",
+            'Content-Type': 'application/json',
+        }
+        try:
+            status, data = self.pool.request('POST', self.options['API_URL'], body, headers)
+        except TimeoutError:
+            raise UpstreamTimeout("The AI service did not respond in time.")
+        except (OSError, http.client.HTTPException) as e:
+            raise UpstreamError(f"Could not reach the AI service: {e}")
+
+        try:
+            result = json.loads(data)
+        except ValueError:
+            raise UpstreamError(f"The AI service returned an invalid response (HTTP {status}).")
+        if status != 200:
+            message = (result.get('error') or {}).get('message') if isinstance(result, dict) else None
+            raise UpstreamError(f"AI service error: {message or f'HTTP {status}'}")
+        try:
+            return result['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError):
+            raise UpstreamError("The AI service returned no summary.")
+
+
+@lru_cache(maxsize=None)
+def get_summary_service():
+    options = {**DEFAULTS, **getattr(settings, 'LLM_PROXY', {})}
+    return SummaryService(options)
+
+
+@receiver(setting_changed)
+def reset_summary_service(setting, **kwargs):
+    if setting == 'LLM_PROXY':
+        get_summary_service.cache_clear()
@@ -0,0 +1,198 @@
+# APP/loadtest.py
+"""
+HTTP load test for the scanner endpoints, WSGI against ASGI.
+
+`prepare_database` writes a throwaway SQLite file with a stocked catalog.
+`start_server` runs uvicorn in a subprocess on that file, either on
+profitify.wsgi (uvicorn's WSGI interface, where every request occupies
+one of a small pool of threads) or on profitify.asgi (the async scanner
+views run on the event loop). `run_load` then keeps `concurrency`
+keep-alive connections busy scanning random barcodes for a fixed time
+and reports throughput and latency percentiles.
+
+Run through the `load_test_scanner` management command. uvicorn is only
+needed for this load test, not by the application.
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections
+from django.urls import reverse
+
+from .benchmarks import percentile
+from .models import Product, StockBatch
+from .stock import rebuild_on_hand
+
+
+INTERFACES = {
+    'wsgi': ('profitify.wsgi:application', 'wsgi'),
+    'asgi': ('profitify.asgi:application', 'asgi3'),
+}
+LOAD_ENDPOINTS = ('scan_product', 'scan_barcode')
+
+
+def prepare_database(path, products=1000, seed=0):
+    """Migrates a new SQLite file at `path` and stocks `products` products. Returns their barcodes."""
+    rng = random.Random(seed)
+    settings_dict = connection.settings_dict
+    old_name = settings_dict['NAME']
+    connections.close_all()
+    settings_dict['NAME'] = path
+    try:
+        call_command('migrate', verbosity=0, interactive=False)
+        Product.objects.bulk_create([
+            Product(barcode=f'LOAD{i:08d}', product_name=f'Product {i}',
+                    cost_price=Decimal('1.00'), selling_price=Decimal('2.00'))
+            for i in range(products)
+        ])
+        StockBatch.objects.bulk_create([
+            StockBatch(product_id=product_id, quantity=rng.randint(1, 100))
+            for product_id in Product.objects.values_list('id', flat=True)
+        ])
+        rebuild_on_hand()
+        return [f'LOAD{i:08d}' for i in range(products)]
+    finally:
+        connections.close_all()
+        settings_dict['NAME'] = old_name
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(interface, database, port, timeout=30):
+    """Starts uvicorn for `interface` ('wsgi' or 'asgi') on `database`; waits until it accepts connections."""
+    app, uvicorn_interface = INTERFACES[interface]
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'profitify.settings'),
+        'DATABASE_ENGINE': 'sqlite',
+        'SQLITE_PATH': str(database),
+        'REQUEST_METRICS_ENABLED': 'false',
+    }
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', app, '--interface', uvicorn_interface,
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning', '--no-access-log'],
+        cwd=settings.BASE_DIR, env=env,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn ({interface}) exited with code {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"uvicorn ({interface}) did not start within {timeout}s")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def build_request(endpoint, barcode):
+    """Raw HTTP/1.1 request bytes for one scan."""
+    if endpoint == 'scan_product':
+        path = reverse('api-scan-product', args=[barcode])
+        return f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'.encode()
+    path = reverse('scan-barcode-api')
+    body = json.dumps({'barcode': barcode}).encode()
+    head = (
+        f'POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+        f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'
+    )
+    return head.encode() + body
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed by server")
+    status = int(status_line.split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(port, requests, deadline, latencies, errors):
+    reader = writer = None
+    try:
+        while time.monotonic() < deadline:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            started = time.perf_counter()
+            try:
+                writer.write(random.choice(requests))
+                await writer.drain()
+                status = await _read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                errors.append('connection')
+                writer.close()
+                writer = None
+                continue
+            if status >= 400:
+                errors.append(status)
+            else:
+                latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def _run_load(port, requests, concurrency, duration):
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        _client(port, requests, deadline, latencies, errors) for _ in range(concurrency)
+    ])
+    return latencies, errors, time.perf_counter() - started
+
+
+def run_load(port, barcodes, endpoint='scan_product', concurrency=100, duration=10, seed=0):
+    """Scans random `barcodes` over `concurrency` connections for `duration` seconds. Returns a result dict."""
+    rng = random.Random(seed)
+    requests = [build_request(endpoint, barcode) for barcode in rng.sample(barcodes, min(len(barcodes), 500))]
+    latencies, errors, elapsed = asyncio.run(_run_load(port, requests, concurrency, duration))
+    latencies.sort()
+    result = {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+    if latencies:
+        result.update({
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p90_ms': round(percentile(latencies, 0.90), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+        })
+    return result
@@ -0,0 +1,54 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from APP.benchmarks import environment, run_write_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures concurrent sell_product throughput with several processes writing to a "
+        "throwaway SQLite file, once per database profile, and writes the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile', action='append', dest='profiles',
+            help="Database profile from settings.DATABASE_PROFILES; repeat for several. Defaults to all.",
+        )
+        parser.add_argument('--processes', type=int, default=4, help="Concurrent writer processes (default 4).")
+        parser.add_argument('--sales', type=int, default=200, help="Sales per process (default 200).")
+        parser.add_argument('--products', type=int, default=50, help="Products to sell from (default 50).")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for product choice.")
+        parser.add_argument('--output', help="Write the JSON results to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'] or list(settings.DATABASE_PROFILES)
+        unknown = [name for name in profiles if name not in settings.DATABASE_PROFILES]
+        if unknown:
+            raise CommandError(f"Unknown database profile(s): {', '.join(unknown)}")
+        if options['processes'] < 1 or options['sales'] < 1:
+            raise CommandError("--processes and --sales must be at least 1.")
+
+        results = run_write_benchmark(
+            profiles, processes=options['processes'], sales_per_process=options['sales'],
+            products=options['products'], seed=options['seed'],
+        )
+        for row in results:
+            self.stderr.write(
+                f"{row['profile']:>12}: {row['completed']} sales in {row['seconds']}s "
+                f"({row['sales_per_second']}/s), {row['failed']} failed"
+            )
+        if len(results) > 1 and results[0]['sales_per_second']:
+            self.stderr.write(
+                f"{results[-1]['profile']} vs {results[0]['profile']}: "
+                f"x{results[-1]['sales_per_second'] / results[0]['sales_per_second']:.2f}"
+            )
+
+        output = json.dumps({'environment': environment(), 'results': results}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(output + '\n')
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from APP.alerts import sync_alerts, trend_alert_specs
+
+
+class Command(BaseCommand):
+    help = "Detects products selling faster or slower than usual and writes trend alerts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--short-days', type=int, default=7, help="Recent window in days (default 7).")
+        parser.add_argument('--long-days', type=int, default=28, help="Baseline window in days (default 28).")
+        parser.add_argument('--threshold', type=float, default=1.5, help="Velocity ratio that counts as a trend (default 1.5).")
+        parser.add_argument('--min-units', type=int, default=5, help="Ignore products selling fewer units in the baseline window.")
+
+    def handle(self, *args, **options):
+        specs = trend_alert_specs(
+            short_days=options['short_days'],
+            long_days=options['long_days'],
+            threshold=options['threshold'],
+            min_units=options['min_units'],
+        )
+        created, updated, removed = sync_alerts('trend', specs)
+        self.stdout.write(self.style.SUCCESS(
+            f"Trend alerts: {created} created, {updated} updated, {removed} removed."
+        ))
@@ -0,0 +1,31 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from APP.exports import DATASETS, FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = "Streams sales, sale items or stock batches to CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--start', help="First day to include (YYYY-MM-DD).")
+        parser.add_argument('--end', help="Last day to include (YYYY-MM-DD).")
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help="File to write to. Defaults to stdout.")
+
+    def handle(self, *args, **options):
+        try:
+            start_date = datetime.date.fromisoformat(options['start']) if options['start'] else None
+            end_date = datetime.date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        lines = export_lines(options['dataset'], start_date, end_date, options['format'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
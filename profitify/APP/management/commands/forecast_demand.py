@@ -0,0 +1,66 @@
+import datetime
+import json
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from APP.forecasting import (
+    CHUNK_SIZE, HISTORY_DAYS, LEAD_TIME_DAYS, SERVICE_LEVEL, suggest_reorder_levels, write_reorder_levels,
+)
+from APP.models import Product
+
+
+class Command(BaseCommand):
+    help = "Forecasts demand from sales history and suggests (or, with --write, sets) reorder levels."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', help="Last day of history to use (YYYY-MM-DD). Defaults to today.")
+        parser.add_argument('--days', type=int, default=HISTORY_DAYS, help=f"Days of history (default {HISTORY_DAYS}).")
+        parser.add_argument(
+            '--lead-time', type=int, default=LEAD_TIME_DAYS,
+            help=f"Supplier lead time in days (default {LEAD_TIME_DAYS}).",
+        )
+        parser.add_argument(
+            '--service-level', type=float, default=SERVICE_LEVEL,
+            help=f"Probability of not running out during the lead time (default {SERVICE_LEVEL}).",
+        )
+        parser.add_argument('--processes', type=int, default=1, help="Forecast in this many processes (default 1).")
+        parser.add_argument('--write', action='store_true', help="Store the suggestions as Product.reorder_level.")
+        parser.add_argument('--output', help="Write {product_id: suggested level} as JSON to this file.")
+
+    def handle(self, *args, **options):
+        if options['days'] < 7 or options['lead_time'] < 1 or options['processes'] < 1:
+            raise CommandError("--days must be at least 7, --lead-time and --processes at least 1.")
+        if not 0 < options['service_level'] < 1:
+            raise CommandError("--service-level must be between 0 and 1.")
+        try:
+            as_of = datetime.date.fromisoformat(options['as_of']) if options['as_of'] else None
+        except ValueError:
+            raise CommandError(f"Not a date (YYYY-MM-DD): {options['as_of']}")
+
+        started = time.perf_counter()
+        try:
+            levels = suggest_reorder_levels(
+                as_of, options['days'], options['processes'],
+                lead_time=options['lead_time'], service_level=options['service_level'],
+            )
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        product_ids = sorted(levels)
+        current = {}
+        for start in range(0, len(product_ids), CHUNK_SIZE):
+            chunk = product_ids[start:start + CHUNK_SIZE]
+            current.update(Product.objects.filter(pk__in=chunk).values_list('id', 'reorder_level'))
+        changed = {product_id: level for product_id, level in levels.items() if current.get(product_id) != level}
+        if options['output']:
+            with open(options['output'], 'w') as stream:
+                json.dump(levels, stream, indent=2)
+        if options['write']:
+            write_reorder_levels(changed)
+
+        verb = "Updated" if options['write'] else "Would update"
+        self.stderr.write(f"Forecast {len(levels)} product(s) in {elapsed:.2f}s.")
+        self.stdout.write(self.style.SUCCESS(f"{verb} the reorder level of {len(changed)} product(s)."))
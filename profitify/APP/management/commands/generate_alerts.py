@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from APP.alerts import ALERT_TYPES, refresh_alerts
+
+
+class Command(BaseCommand):
+    help = "Computes reorder, waste and trend conditions and syncs them into the Alert table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            action='append',
+            choices=ALERT_TYPES,
+            dest='alert_types',
+            help="Alert type to refresh; repeat for several. Defaults to all types.",
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help="Keep running and refresh every INTERVAL seconds (0 runs once).",
+        )
+
+    def handle(self, *args, **options):
+        alert_types = options['alert_types'] or ALERT_TYPES
+
+        while True:
+            results = refresh_alerts(alert_types)
+            for alert_type, (created, updated, removed) in results.items():
+                self.stdout.write(
+                    f"{alert_type}: {created} created, {updated} updated, {removed} removed."
+                )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS("Alerts are up to date."))
@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from APP.purchasing import ORDER_UP_TO, generate_purchase_orders
+
+
+class Command(BaseCommand):
+    help = "Creates draft purchase orders, one per supplier, for every product below its reorder level."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--order-up-to',
+            type=int,
+            default=ORDER_UP_TO,
+            help=f"Order enough to reach this multiple of the reorder level (default {ORDER_UP_TO}).",
+        )
+        parser.add_argument('--username', help="User recorded as the creator of the orders.")
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report what would be ordered.",
+        )
+
+    def handle(self, *args, **options):
+        if options['order_up_to'] < 1:
+            raise CommandError("--order-up-to must be at least 1.")
+
+        user = None
+        if options['username']:
+            try:
+                user = User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user: {options['username']}")
+
+        result = generate_purchase_orders(user, options['order_up_to'], options['dry_run'])
+
+        for supplier in result['suppliers']:
+            self.stdout.write(f"Draft order for {supplier or '(no supplier)'}")
+        verb = "Would create" if options['dry_run'] else "Created"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['orders']} purchase order(s) with {result['items']} item(s), {result['units']} unit(s)."
+        ))
@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from APP.imports import FORMATS, import_rows, read_rows
+
+
+class Command(BaseCommand):
+    help = "Imports products (upserted by barcode) and stock batches from a CSV, NDJSON or JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import.")
+        parser.add_argument('--format', choices=FORMATS, help="Input format. Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows per transaction (default 1000).")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or options['path'].rsplit('.', 1)[-1].lower()
+        if fmt not in FORMATS:
+            raise CommandError(f"Cannot tell the format of {options['path']}; pass --format.")
+
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as stream:
+                report = import_rows(read_rows(stream, fmt), chunk_size=options['chunk_size'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in report.errors:
+            self.stderr.write(f"Row {error['row']}: {error['message']}")
+        summary = report.as_dict(max_errors=0)
+        summary.pop('errors')
+        self.stdout.write(self.style.SUCCESS(json.dumps(summary)))
@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from APP.benchmarks import environment
+from APP.loadtest import (
+    INTERFACES, LOAD_ENDPOINTS, free_port, prepare_database, run_load, start_server, stop_server,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the scanner endpoints under uvicorn, once through the WSGI and once through "
+        "the ASGI application, against a throwaway SQLite database, and writes the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interface', action='append', choices=sorted(INTERFACES), dest='interfaces',
+            help="Entry point to test; repeat for several. Defaults to wsgi and asgi.",
+        )
+        parser.add_argument('--endpoint', choices=LOAD_ENDPOINTS, default='scan_product',
+                            help="Scanner endpoint to load (default scan_product).")
+        parser.add_argument('--concurrency', type=int, default=200, help="Open connections (default 200).")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds per run (default 10).")
+        parser.add_argument('--products', type=int, default=1000, help="Products in the catalog (default 1000).")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the catalog and scans.")
+        parser.add_argument('--output', help="Write the JSON results to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            raise CommandError("The load test needs uvicorn (pip install uvicorn).")
+        if options['concurrency'] < 1 or options['duration'] <= 0:
+            raise CommandError("--concurrency and --duration must be positive.")
+        interfaces = options['interfaces'] or ['wsgi', 'asgi']
+
+        results = []
+        with tempfile.TemporaryDirectory(prefix='profitify-load-') as directory:
+            database = os.path.join(directory, 'load.sqlite3')
+            barcodes = prepare_database(database, products=options['products'], seed=options['seed'])
+            for interface in interfaces:
+                self.stderr.write(f"Load testing {interface}...")
+                port = free_port()
+                server = start_server(interface, database, port)
+                try:
+                    result = run_load(
+                        port, barcodes, endpoint=options['endpoint'], concurrency=options['concurrency'],
+                        duration=options['duration'], seed=options['seed'],
+                    )
+                finally:
+                    stop_server(server)
+                results.append({'interface': interface, **result})
+                self.stderr.write(
+                    f"{interface:>5}: {result['requests_per_second']} req/s, "
+                    f"p50 {result.get('p50_ms')} ms, p99 {result.get('p99_ms')} ms, {result['errors']} errors"
+                )
+
+        output = json.dumps({'environment': environment(), 'results': results}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(output + '\n')
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,23 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from APP.rollups import rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = "Backfills or rebuilds the DailyProductSales rollup from raw sale items."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD). Defaults to all history.")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD). Defaults to all history.")
+
+    def handle(self, *args, **options):
+        try:
+            start_date = datetime.date.fromisoformat(options['start']) if options['start'] else None
+            end_date = datetime.date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        written = rebuild_daily_sales(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily product sales row(s)."))
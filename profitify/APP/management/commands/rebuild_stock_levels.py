@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from APP.stock import find_on_hand_drift, rebuild_on_hand
+
+
+class Command(BaseCommand):
+    help = "Rebuilds Product.on_hand from StockBatch quantities, or verifies it with --verify."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help="Only report products whose on_hand is out of sync; exit non-zero if any are found.",
+        )
+
+    def handle(self, *args, **options):
+        drift = find_on_hand_drift()
+
+        for product_id, name, on_hand, actual in drift:
+            self.stdout.write(f"Product #{product_id} '{name}': on_hand={on_hand}, batches={actual}")
+
+        if options['verify']:
+            if drift:
+                raise CommandError(f"{len(drift)} product(s) have an out-of-sync stock level.")
+            self.stdout.write(self.style.SUCCESS("All stock levels are in sync."))
+            return
+
+        updated = rebuild_on_hand()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stock levels for {updated} product(s); {len(drift)} were out of sync."
+        ))
@@ -0,0 +1,59 @@
+import datetime
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from APP.imports import FORMATS, read_rows
+from APP.receiving import ReceivingError, receive_purchase_orders
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Not a date (YYYY-MM-DD): {value}")
+
+
+class Command(BaseCommand):
+    help = "Receives purchase orders into stock: whole orders, and/or delivery lines from a file."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--order',
+            action='append',
+            type=int,
+            default=[],
+            dest='order_ids',
+            help="Purchase order to receive in full; repeat for several.",
+        )
+        parser.add_argument(
+            '--lines',
+            help="CSV, NDJSON or JSON file of delivery lines (item_id, quantity, expiry_date) for partial receipts.",
+        )
+        parser.add_argument('--format', choices=FORMATS, help="Format of --lines. Defaults to the file extension.")
+        parser.add_argument('--expiry-date', help="Expiry date for lines that do not give one (YYYY-MM-DD).")
+        parser.add_argument('--received-date', help="Date the delivery arrived (YYYY-MM-DD). Defaults to today.")
+
+    def handle(self, *args, **options):
+        expiry_date = _date(options['expiry_date']) if options['expiry_date'] else None
+        received_date = _date(options['received_date']) if options['received_date'] else None
+
+        lines = []
+        if options['lines']:
+            fmt = options['format'] or options['lines'].rsplit('.', 1)[-1].lower()
+            if fmt not in FORMATS:
+                raise CommandError(f"Cannot tell the format of {options['lines']}; pass --format.")
+            try:
+                with open(options['lines'], newline='', encoding='utf-8') as stream:
+                    lines = list(read_rows(stream, fmt))
+            except (OSError, ValueError) as e:
+                raise CommandError(str(e))
+
+        try:
+            result = receive_purchase_orders(options['order_ids'], lines, expiry_date, received_date)
+        except ReceivingError as e:
+            for error in e.errors:
+                self.stderr.write(json.dumps(error))
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(json.dumps(result)))
@@ -0,0 +1,75 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from APP.benchmarks import ENDPOINTS, SCALES, compare_results, environment, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the hot views and APIs against synthetic data in a throwaway test database "
+        "and writes latency percentiles and query counts as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', action='append', choices=sorted(SCALES), dest='scales',
+            help="Data scale to run; repeat for several. Defaults to small and medium.",
+        )
+        parser.add_argument(
+            '--endpoint', action='append', choices=ENDPOINTS, dest='endpoints',
+            help="Endpoint to benchmark; repeat for several. Defaults to all.",
+        )
+        parser.add_argument('--repeat', type=int, default=20, help="Requests per endpoint (default 20).")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the synthetic data.")
+        parser.add_argument('--output', help="Write the JSON results to this file instead of stdout.")
+        parser.add_argument('--baseline', help="Earlier JSON results to compare against.")
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help="Relative p50 slowdown counted as a regression when comparing (default 0.2).",
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help="Exit with an error if the comparison finds a regression.",
+        )
+
+    def handle(self, *args, **options):
+        scales = options['scales'] or ['small', 'medium']
+        endpoints = options['endpoints'] or ENDPOINTS
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = []
+            for scale_name in scales:
+                call_command('flush', interactive=False, verbosity=0)
+                self.stderr.write(f"Benchmarking scale '{scale_name}'...")
+                results.extend(run_benchmarks(
+                    scale_name, SCALES[scale_name], repeat=options['repeat'],
+                    endpoints=endpoints, seed=options['seed'],
+                ))
+            report = {'environment': environment(), 'results': results}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as handle:
+                baseline = json.load(handle)['results']
+            comparison = compare_results(baseline, results, options['threshold'])
+            for row in comparison:
+                flag = 'REGRESSION' if row['regression'] else 'ok'
+                self.stderr.write(
+                    f"{row['scale']:>8} {row['endpoint']:<16} p50 x{row['p50_ratio']:<6} "
+                    f"p90 x{row['p90_ratio']:<6} queries {row['query_delta']:+d}  {flag}"
+                )
+            if options['fail_on_regression'] and any(row['regression'] for row in comparison):
+                raise CommandError("Benchmark regression detected.")
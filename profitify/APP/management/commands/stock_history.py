@@ -0,0 +1,44 @@
+import datetime
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from APP.ledger import close_of_day, stock_at, stock_value_at
+
+
+class Command(BaseCommand):
+    help = "Reports stock at the close of past days from the stock ledger, as one JSON line per date."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            action='append',
+            required=True,
+            dest='dates',
+            help="Day to report (YYYY-MM-DD); repeat for several.",
+        )
+        parser.add_argument(
+            '--product',
+            action='append',
+            type=int,
+            dest='product_ids',
+            help="Report units of this product instead of catalog totals; repeat for several.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            days = sorted(datetime.date.fromisoformat(value) for value in options['dates'])
+        except ValueError:
+            raise CommandError("--date must be YYYY-MM-DD.")
+
+        for day in days:
+            try:
+                if options['product_ids']:
+                    stock = stock_at(close_of_day(day), options['product_ids'])
+                    row = {'products': {str(product_id): stock.get(product_id, 0) for product_id in options['product_ids']}}
+                else:
+                    totals = stock_value_at(close_of_day(day))
+                    row = {'units': totals['units'], 'value': str(totals['value'])}
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(json.dumps({'date': day.isoformat(), **row}))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from APP.ledger import take_snapshot
+
+
+class Command(BaseCommand):
+    help = "Records the current stock of every product as a StockSnapshot. Schedule it, e.g. nightly."
+
+    def handle(self, *args, **options):
+        snapshot = take_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot #{snapshot.pk}: {snapshot.items.count()} product(s), {snapshot.units} unit(s), "
+            f"value {snapshot.value}."
+        ))
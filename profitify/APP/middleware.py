@@ -0,0 +1,216 @@
+# APP/middleware.py
+"""
+Per-request performance instrumentation.
+
+For a sampled share of requests, RequestMetricsMiddleware records wall
+time, database query count and database time for the view, using a
+connection execute wrapper. A request that runs the same SQL statement
+more than N_PLUS_ONE_THRESHOLD times is flagged as a likely N+1 pattern.
+Rolling percentiles per view are served by `views.metrics_api`.
+
+Configured with settings.REQUEST_METRICS:
+
+    REQUEST_METRICS = {
+        'ENABLED': True,
+        'SAMPLE_RATE': 0.1,            # share of requests measured (0..1)
+        'WINDOW': 1000,                # samples kept per view
+        'N_PLUS_ONE_THRESHOLD': 10,    # repeats of one statement that count as N+1
+    }
+
+Requests that are not sampled only pay for one random() call. The
+middleware is async-capable, so it does not push async views back onto
+a thread under ASGI. Their queries run on other threads, though (the
+async ORM and sync_to_async), so the execute wrapper sits on every
+connection and finds the request being measured through a context
+variable, which follows sync_to_async from thread to thread. A sampled
+async request makes one hop to the ORM thread to make sure its
+connection carries the wrapper.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+logger = logging.getLogger(__name__)
+
+# every request no URL pattern matched (404s, scanners probing paths) is
+# counted under this one name, so made-up paths cannot grow the metrics
+UNRESOLVED_VIEW = '<unresolved>'
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.1,
+    'WINDOW': 1000,
+    'N_PLUS_ONE_THRESHOLD': 10,
+}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_METRICS', {})}
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class QueryRecorder:
+    """Execute wrapper counting queries, their total time and repeated statements."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+
+# the QueryRecorder of the request being measured, if any
+current_recorder = contextvars.ContextVar('request_metrics_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper on every connection: passes the query to the current request's recorder."""
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def hook_connection(connection=connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def hook_new_connection(sender, connection, **kwargs):
+    hook_connection(connection)
+
+
+class MetricsStore:
+    """Rolling per-view samples of (wall ms, queries, db ms) plus N+1 sightings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(deque)
+        self._n_plus_one = defaultdict(Counter)
+
+    def record(self, view, wall_ms, queries, db_ms, repeated, window):
+        with self._lock:
+            samples = self._samples[view]
+            samples.append((wall_ms, queries, db_ms))
+            while len(samples) > window:
+                samples.popleft()
+            for sql in repeated:
+                self._n_plus_one[view][sql] += 1
+
+    def summary(self):
+        with self._lock:
+            snapshot = {view: list(samples) for view, samples in self._samples.items()}
+            n_plus_one = {view: dict(counter) for view, counter in self._n_plus_one.items()}
+
+        views = {}
+        for view, samples in snapshot.items():
+            wall = sorted(sample[0] for sample in samples)
+            queries = sorted(sample[1] for sample in samples)
+            db = sorted(sample[2] for sample in samples)
+            views[view] = {
+                'samples': len(samples),
+                'wall_ms': {name: round(percentile(wall, fraction), 3) for name, fraction in
+                            (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))},
+                'db_ms': {name: round(percentile(db, fraction), 3) for name, fraction in
+                          (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))},
+                'queries': {'p50': percentile(queries, 0.5), 'max': queries[-1]},
+                'n_plus_one': [
+                    {'sql': sql, 'requests': requests}
+                    for sql, requests in sorted(n_plus_one.get(view, {}).items(), key=lambda item: -item[1])
+                ],
+            }
+        return views
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._n_plus_one.clear()
+
+
+metrics = MetricsStore()
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        options = get_options()
+        if not options['ENABLED'] or random.random() >= options['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        hook_connection()
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.record(request, recorder, started, options)
+        return response
+
+    async def __acall__(self, request):
+        options = get_options()
+        if not options['ENABLED'] or random.random() >= options['SAMPLE_RATE']:
+            return await self.get_response(request)
+
+        # the async ORM runs on the thread-sensitive thread, whose connection
+        # may predate the connection_created hook
+        await sync_to_async(hook_connection)()
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.record(request, recorder, started, options)
+        return response
+
+    def record(self, request, recorder, started, options):
+        wall_ms = (time.perf_counter() - started) * 1000
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else UNRESOLVED_VIEW
+        repeated = [
+            sql for sql, times in recorder.statements.items()
+            if times > options['N_PLUS_ONE_THRESHOLD']
+        ]
+        if repeated:
+            logger.warning(
+                "Possible N+1 in %s: %d statement(s) repeated more than %d times",
+                view, len(repeated), options['N_PLUS_ONE_THRESHOLD'],
+            )
+        metrics.record(view, wall_ms, recorder.count, recorder.seconds * 1000, repeated, options['WINDOW'])
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:11
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_on_hand(apps, schema_editor):
+    Product = apps.get_model('APP', 'Product')
+    StockBatch = apps.get_model('APP', 'StockBatch')
+    totals = (
+        StockBatch.objects.filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    Product.objects.update(on_hand=Coalesce(Subquery(totals, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('APP', '0004_alter_purchaseorder_user_alter_sale_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='on_hand',
+            field=models.IntegerField(default=0, editable=False, help_text='Total quantity across all stock batches, maintained on every batch change.'),
+        ),
+        migrations.RunPython(populate_on_hand, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('on_hand__lt', models.F('reorder_level'))), fields=['on_hand'], name='product_below_reorder_idx'),
+        ),
+    ]
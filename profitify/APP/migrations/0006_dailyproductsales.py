@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:12
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_sales(apps, schema_editor):
+    SaleItem = apps.get_model('APP', 'SaleItem')
+    DailyProductSales = apps.get_model('APP', 'DailyProductSales')
+    money = DecimalField(max_digits=14, decimal_places=2)
+    totals = (
+        SaleItem.objects.annotate(day=TruncDate('sale__sale_timestamp'))
+        .values('day', 'product_id')
+        .annotate(
+            units=Sum('quantity'),
+            revenue=Sum(ExpressionWrapper(F('price_at_sale') * F('quantity'), output_field=money)),
+            cogs=Sum(ExpressionWrapper(F('cost_at_sale') * F('quantity'), output_field=money)),
+        )
+        .order_by()
+    )
+    DailyProductSales.objects.bulk_create(
+        [
+            DailyProductSales(
+                product_id=row['product_id'],
+                date=row['day'],
+                units=row['units'],
+                revenue=row['revenue'],
+                cogs=row['cogs'],
+                profit=row['revenue'] - row['cogs'],
+            )
+            for row in totals.iterator()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('APP', '0005_product_on_hand'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('cogs', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('profit', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='APP.product')),
+            ],
+            options={
+                'verbose_name_plural': 'daily product sales',
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='unique_daily_product_sales')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('APP', '0006_dailyproductsales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='payload',
+            field=models.JSONField(blank=True, default=dict, help_text='Structured data behind the alert, as shown on the advisor page.'),
+        ),
+    ]
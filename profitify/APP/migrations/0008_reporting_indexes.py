@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('APP', '0007_alert_payload'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('is_viewed', False)), fields=['alert_type', 'created_at'], name='alert_unviewed_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['sale_timestamp'], name='sale_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['sale', 'product'], name='saleitem_sale_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockbatch',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['product', 'expiry_date'], name='stockbatch_sellable_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockbatch',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['expiry_date'], name='stockbatch_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('APP', '0008_reporting_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductLookup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('barcode', models.CharField(max_length=255, unique=True)),
+                ('found', models.BooleanField(default=False)),
+                ('source', models.CharField(blank=True, max_length=32)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+        ),
+    ]
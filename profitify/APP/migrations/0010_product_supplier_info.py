@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('APP', '0009_productlookup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='supplier_info',
+            field=models.CharField(blank=True, help_text='Who this product is ordered from; draft purchase orders are grouped by it.', max_length=255, null=True),
+        ),
+    ]
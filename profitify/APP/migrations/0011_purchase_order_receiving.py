@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('APP', '0010_product_supplier_info'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='received_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='purchaseorderitem',
+            name='received_quantity',
+            field=models.IntegerField(default=0, help_text='Units received so far; the line is complete when this reaches quantity.'),
+        ),
+        migrations.AddField(
+            model_name='stockbatch',
+            name='purchase_order_item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_batches', to='APP.purchaseorderitem'),
+        ),
+        migrations.AddField(
+            model_name='stockbatch',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Agreed cost per unit when the batch came in on a purchase order.', max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def take_opening_snapshot(apps, schema_editor):
+    # The ledger starts here: stock before this moment is only known as this total
+    Product = apps.get_model('APP', 'Product')
+    StockSnapshot = apps.get_model('APP', 'StockSnapshot')
+    StockSnapshotItem = apps.get_model('APP', 'StockSnapshotItem')
+    snapshot = StockSnapshot.objects.create(taken_at=timezone.now())
+    items = [
+        StockSnapshotItem(snapshot=snapshot, product_id=product_id, on_hand=on_hand, unit_cost=cost_price)
+        for product_id, on_hand, cost_price in Product.objects.exclude(on_hand=0).values_list('id', 'on_hand', 'cost_price')
+    ]
+    StockSnapshotItem.objects.bulk_create(items, batch_size=1000)
+    snapshot.units = sum(item.on_hand for item in items)
+    snapshot.value = sum((item.on_hand * item.unit_cost for item in items), Decimal('0'))
+    snapshot.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('APP', '0011_purchase_order_receiving'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(unique=True)),
+                ('last_movement_id', models.BigIntegerField(default=0)),
+                ('units', models.BigIntegerField(default=0)),
+                ('value', models.DecimalField(decimal_places=2, default=Decimal('0'), help_text="Stock valued at each product's cost price when the snapshot was taken.", max_digits=16)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('receipt', 'Receipt'), ('sale', 'Sale'), ('adjustment', 'Adjustment'), ('waste', 'Waste')], max_length=10)),
+                ('quantity', models.IntegerField(help_text='Units added to (positive) or taken from (negative) stock.')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='APP.stockbatch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='APP.product')),
+                ('sale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='APP.sale')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at'], name='stockmovement_product_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshotItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('on_hand', models.IntegerField()),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='APP.product')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='APP.stocksnapshot')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('snapshot', 'product'), name='unique_stock_snapshot_item')],
+            },
+        ),
+        migrations.RunPython(take_opening_snapshot, migrations.RunPython.noop),
+    ]
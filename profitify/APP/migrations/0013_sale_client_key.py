@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('APP', '0012_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='client_key',
+            field=models.CharField(blank=True, help_text='Idempotency key from the till that recorded the sale offline; an upload retried with it is not booked twice.', max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='sale_timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:53
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('APP', '0015_cache_generation'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CacheGeneration',
+        ),
+    ]
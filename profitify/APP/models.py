@@ -1,9 +1,16 @@
 # APP/models.py
-from django.db import models
+from django.db import connection, models, transaction
 from django.contrib.auth.models import User  # Using Django's built-in User model
+from django.dispatch import Signal
 from django.utils import timezone
 from decimal import Decimal
 
+# Sent with `product_ids` whenever stock levels of those products change.
+stock_changed = Signal()
+
+# Sent with `alert_type` when alerts are synced in bulk (no per-row save signals fire).
+alerts_changed = Signal()
+
 
 class Product(models.Model):
     barcode = models.CharField(max_length=255, unique=True, null=True, blank=True)
@@ -16,28 +23,260 @@ class Product(models.Model):
         default=0, 
         help_text="The minimum stock level before a reorder is triggered."
     )
+    on_hand = models.IntegerField(
+        default=0,
+        editable=False,
+        help_text="Total quantity across all stock batches, maintained on every batch change."
+    )
+    supplier_info = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        help_text="Who this product is ordered from; draft purchase orders are grouped by it."
+    )
     # This links to the user who added the product
     added_by_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Only products that need restocking are indexed, so the reorder
+            # check reads a handful of index entries instead of the catalog.
+            models.Index(
+                fields=['on_hand'],
+                name='product_below_reorder_idx',
+                condition=models.Q(on_hand__lt=models.F('reorder_level')),
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The barcode this product is cached under, so a changed barcode can be invalidated
+        instance._stored_barcode = instance.__dict__.get('barcode')
+        return instance
+
     def __str__(self):
         return self.product_name
 
+    @staticmethod
+    def adjust_on_hand(deltas):
+        """
+        Applies {product_id: quantity_delta} to Product.on_hand with conditional
+        F() updates, so concurrent writers never overwrite each other.
+        Call this from any code path that changes StockBatch.quantity without
+        going through StockBatch.save() (queryset.update, bulk_create, ...).
+        """
+        deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        # One UPDATE for the whole set: on_hand + CASE WHEN id IN (..) THEN delta .. END,
+        # with products sharing a delta grouped into one branch
+        ids_by_delta = {}
+        for product_id, delta in deltas.items():
+            ids_by_delta.setdefault(delta, []).append(product_id)
+        change = models.Case(
+            *[models.When(pk__in=ids, then=models.Value(delta)) for delta, ids in ids_by_delta.items()],
+            output_field=models.IntegerField(),
+        )
+        Product.objects.filter(pk__in=list(deltas)).update(on_hand=models.F('on_hand') + change)
+        stock_changed.send(sender=Product, product_ids=list(deltas))
+
 
 class StockBatch(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_batches')
     quantity = models.IntegerField()
     received_date = models.DateField(default=timezone.now)
     expiry_date = models.DateField(null=True, blank=True)
+    unit_cost = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="Agreed cost per unit when the batch came in on a purchase order."
+    )
+    purchase_order_item = models.ForeignKey(
+        'PurchaseOrderItem', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_batches'
+    )
+
+    class Meta:
+        indexes = [
+            # Sellable batches of a product in expiry order (sell_product, scan APIs, allocation)
+            models.Index(
+                fields=['product', 'expiry_date'],
+                name='stockbatch_sellable_idx',
+                condition=models.Q(quantity__gt=0),
+            ),
+            # Non-empty batches by expiry date (waste alerts)
+            models.Index(
+                fields=['expiry_date'],
+                name='stockbatch_expiry_idx',
+                condition=models.Q(quantity__gt=0),
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_stock()
+        return instance
+
+    def _remember_stock(self):
+        # What this batch currently contributes to Product.on_hand
+        self._stored_product_id = self.__dict__.get('product_id')
+        self._stored_quantity = self.__dict__.get('quantity') or 0
+        self._stored_expiry_date = self.__dict__.get('expiry_date')
+
+    def save(self, *args, movement_kind=None, **kwargs):
+        """
+        Saves the batch, moves Product.on_hand by the change and records it
+        in the StockMovement ledger: a new batch is a 'receipt', any other
+        change an 'adjustment' unless `movement_kind` says otherwise.
+        """
+        previous_product_id = getattr(self, '_stored_product_id', None)
+        previous_quantity = getattr(self, '_stored_quantity', 0) if previous_product_id else 0
+        previous_expiry_date = getattr(self, '_stored_expiry_date', None)
+        kind = movement_kind or ('adjustment' if previous_product_id else 'receipt')
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            movements = []
+            if previous_product_id and previous_product_id != self.product_id:
+                Product.adjust_on_hand({previous_product_id: -previous_quantity})
+                movements.append((previous_product_id, self.pk, -previous_quantity))
+                previous_quantity = 0
+            Product.adjust_on_hand({self.product_id: self.quantity - previous_quantity})
+            movements.append((self.product_id, self.pk, self.quantity - previous_quantity))
+            StockMovement.record(kind, movements)
+            # adjust_on_hand only signals quantity changes, but a new expiry date
+            # or product can change which batch is sold (and scanned) first
+            if previous_product_id and (
+                previous_product_id != self.product_id or previous_expiry_date != self.expiry_date
+            ):
+                stock_changed.send(sender=StockBatch, product_ids=sorted({previous_product_id, self.product_id}))
+        self._remember_stock()
+
+    def delete(self, *args, movement_kind='adjustment', **kwargs):
+        """Deletes the batch; pass movement_kind='waste' when the stock is written off."""
+        product_id = getattr(self, '_stored_product_id', None) or self.product_id
+        quantity = getattr(self, '_stored_quantity', self.quantity)
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Product.adjust_on_hand({product_id: -quantity})
+            # the batch row is gone, so the movement keeps only the product
+            StockMovement.record(movement_kind, [(product_id, None, -quantity)])
+        return result
 
     def __str__(self):
         return f"{self.product.product_name} - Batch ({self.quantity})"
 
 
+class StockMovement(models.Model):
+    """
+    Append-only ledger of stock changes, one row per batch change, written
+    in the same transaction as the change itself. Stock at any moment is
+    the nearest StockSnapshot plus the movements after it (APP/ledger.py).
+    Mistakes are corrected with another movement, never by editing one.
+    """
+    KINDS = [
+        ('receipt', 'Receipt'),
+        ('sale', 'Sale'),
+        ('adjustment', 'Adjustment'),
+        ('waste', 'Waste'),
+    ]
+    # PROTECT: a product with stock history cannot be deleted out from under its audit trail
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='stock_movements')
+    batch = models.ForeignKey(
+        StockBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements'
+    )
+    kind = models.CharField(max_length=10, choices=KINDS)
+    quantity = models.IntegerField(help_text="Units added to (positive) or taken from (negative) stock.")
+    sale = models.ForeignKey('Sale', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # One product's history, in time order (audits, point-in-time stock of a product)
+            models.Index(fields=['product', 'created_at'], name='stockmovement_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} of {self.quantity:+d} x {self.product_id} at {self.created_at:%Y-%m-%d %H:%M}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Stock movements cannot be changed; record a correcting movement instead.")
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def record(cls, kind, lines, sale=None):
+        """
+        Appends one `kind` movement per (product_id, batch_id, quantity) line,
+        skipping zero quantities, in one INSERT. Call this for any
+        StockBatch write that bypasses StockBatch.save(), next to
+        Product.adjust_on_hand.
+        """
+        now = timezone.now()
+        cls.objects.bulk_create([
+            cls(product_id=product_id, batch_id=batch_id, kind=kind, quantity=quantity, sale=sale, created_at=now)
+            for product_id, batch_id, quantity in lines
+            if quantity
+        ])
+
+
+class StockSnapshot(models.Model):
+    """
+    Stock of the whole catalog at `taken_at`: totals here, per-product
+    counts in StockSnapshotItem. Covers every StockMovement up to
+    `last_movement_id`, so later movements are exactly those with a
+    higher id. Taken periodically by `take_stock_snapshot`.
+    """
+    taken_at = models.DateTimeField(unique=True)
+    last_movement_id = models.BigIntegerField(default=0)
+    units = models.BigIntegerField(default=0)
+    value = models.DecimalField(
+        max_digits=16,
+        decimal_places=2,
+        default=Decimal('0'),
+        help_text="Stock valued at each product's cost price when the snapshot was taken."
+    )
+
+    def __str__(self):
+        return f"Stock at {self.taken_at:%Y-%m-%d %H:%M}: {self.units} units"
+
+
+class StockSnapshotItem(models.Model):
+    snapshot = models.ForeignKey(StockSnapshot, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    on_hand = models.IntegerField()
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['snapshot', 'product'], name='unique_stock_snapshot_item'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.on_hand} at {self.snapshot.taken_at:%Y-%m-%d %H:%M}"
+
+
 class Sale(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
-    sale_timestamp = models.DateTimeField(auto_now_add=True)
+    # defaults to now, but sales uploaded by an offline till keep the time they were made
+    sale_timestamp = models.DateTimeField(default=timezone.now, editable=False)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     total_profit = models.DecimalField(max_digits=10, decimal_places=2)
+    client_key = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Idempotency key from the till that recorded the sale offline; an upload retried with it is not booked twice."
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sale_timestamp'], name='sale_timestamp_idx'),
+        ]
 
     def __str__(self):
         ts = self.sale_timestamp.strftime('%Y-%m-%d %H:%M') if self.sale_timestamp else "unspecified"
@@ -51,10 +290,115 @@ class SaleItem(models.Model):
     price_at_sale = models.DecimalField(max_digits=10, decimal_places=2)
     cost_at_sale = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['sale', 'product'], name='saleitem_sale_product_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_values = instance._line_values()
+        return instance
+
+    def _line_values(self):
+        return tuple(
+            self.__dict__.get(name)
+            for name in ('sale_id', 'product_id', 'quantity', 'price_at_sale', 'cost_at_sale')
+        )
+
+    def _rollup_line(self, values):
+        # (product_id, sale date, quantity, revenue, cost) as counted in DailyProductSales
+        if not values or None in values:
+            return None
+        sale_id, product_id, quantity, price, cost = values
+        sale = self.sale if sale_id == self.sale_id else Sale.objects.get(pk=sale_id)
+        return (product_id, timezone.localdate(sale.sale_timestamp), quantity, price * quantity, cost * quantity)
+
+    def save(self, *args, **kwargs):
+        previous_values = getattr(self, '_stored_values', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            current_values = self._line_values()
+            if previous_values != current_values:
+                DailyProductSales.record_lines(
+                    [self._rollup_line(current_values)],
+                    previous_lines=[self._rollup_line(previous_values)],
+                )
+        self._stored_values = current_values
+
+    def delete(self, *args, **kwargs):
+        previous_values = getattr(self, '_stored_values', None) or self._line_values()
+        previous_line = self._rollup_line(previous_values)
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            DailyProductSales.record_lines([], previous_lines=[previous_line])
+        return result
+
     def __str__(self):
         return f"{self.product.product_name} x{self.quantity} (Sale #{self.sale_id if self.sale_id else self.sale})"
 
 
+class DailyProductSales(models.Model):
+    """
+    Per-product, per-day sales totals, kept current as SaleItem rows are
+    written so reports read one row per product per day instead of every
+    line item. `rebuild_sales_rollups` recreates it from raw sales.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    date = models.DateField()
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    cogs = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='unique_daily_product_sales'),
+        ]
+        verbose_name_plural = 'daily product sales'
+
+    def __str__(self):
+        return f"{self.product.product_name} on {self.date}: {self.units} sold"
+
+    @classmethod
+    def record_lines(cls, lines, previous_lines=()):
+        """
+        Adds each (product_id, date, quantity, revenue, cost) line to the
+        rollup and subtracts each previous line. Lines that share a product
+        and day are merged first, so a basket touches each rollup row once.
+        Call this for any SaleItem write that bypasses SaleItem.save().
+        """
+        totals = {}
+        for sign, group in ((1, lines), (-1, previous_lines)):
+            for line in group:
+                if line is None:
+                    continue
+                product_id, day, quantity, revenue, cost = line
+                units, rev, cogs = totals.get((product_id, day), (0, Decimal('0'), Decimal('0')))
+                totals[(product_id, day)] = (units + sign * quantity, rev + sign * revenue, cogs + sign * cost)
+
+        if not totals:
+            return
+        # One upsert for the whole set: missing rows are inserted, existing
+        # ones incremented in place (ON CONFLICT works on SQLite and PostgreSQL).
+        # The statement is prepared once however many rows there are.
+        quote = connection.ops.quote_name
+        table = quote(cls._meta.db_table)
+        columns = [quote(cls._meta.get_field(name).column) for name in ('product', 'date', 'units', 'revenue', 'cogs', 'profit')]
+        key = ', '.join(columns[:2])
+        increments = ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in columns[2:])
+        sql = (
+            f'INSERT INTO {table} ({", ".join(columns)}) VALUES (%s, %s, %s, %s, %s, %s) '
+            f'ON CONFLICT ({key}) DO UPDATE SET {increments}'
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                (product_id, connection.ops.adapt_datefield_value(day), units, revenue, cogs, revenue - cogs)
+                for (product_id, day), (units, revenue, cogs) in totals.items()
+            ])
+
+
 class Alert(models.Model):
     ALERT_TYPES = [
         ('reorder', 'Reorder'),
@@ -65,9 +409,24 @@ class Alert(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True)
     message = models.TextField()
     suggestion_details = models.TextField(null=True, blank=True)
+    payload = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Structured data behind the alert, as shown on the advisor page."
+    )
     is_viewed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Unviewed alerts by type, in creation order (advisor page)
+            models.Index(
+                fields=['alert_type', 'created_at'],
+                name='alert_unviewed_type_idx',
+                condition=models.Q(is_viewed=False),
+            ),
+        ]
+
     def __str__(self):
         return f"[{self.get_alert_type_display()}] {self.message[:50]}..."
 
@@ -83,6 +442,7 @@ class PurchaseOrder(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     created_at = models.DateTimeField(auto_now_add=True)
     sent_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"PO #{self.id} - {self.status}"
@@ -93,6 +453,26 @@ class PurchaseOrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.IntegerField()
     agreed_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    received_quantity = models.IntegerField(
+        default=0,
+        help_text="Units received so far; the line is complete when this reaches quantity."
+    )
 
     def __str__(self):
         return f"PO #{self.purchase_order.id} - {self.product.product_name} x{self.quantity}"
+
+
+class ProductLookup(models.Model):
+    """
+    Product metadata fetched from the open product databases, cached per
+    barcode. Misses are stored too (found=False), so an unknown barcode is
+    not looked up again until its entry expires. See APP/product_lookup.py.
+    """
+    barcode = models.CharField(max_length=255, unique=True)
+    found = models.BooleanField(default=False)
+    source = models.CharField(max_length=32, blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    fetched_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.barcode}: {self.data.get('name') if self.found else 'not found'}"
@@ -0,0 +1,207 @@
+# APP/product_lookup.py
+"""
+Server-side product metadata lookup for onboarding.
+
+A barcode is looked up in OpenFoodFacts and OpenPetFoodFacts at the same
+time, and the answer is stored in the ProductLookup table: hits are
+served from there for FOUND_TTL and misses for MISSING_TTL (negative
+caching). A batch of barcodes costs one query against the table, and
+all of its misses are fetched together on a shared thread pool over
+keep-alive connections. Failed requests are not cached, so a barcode is
+retried once the source is reachable again.
+
+Configured with settings.PRODUCT_LOOKUP:
+
+    PRODUCT_LOOKUP = {
+        'SOURCES': {                  # in order of preference when several know a barcode
+            'openfoodfacts': 'https://world.openfoodfacts.org',
+            'openpetfoodfacts': 'https://world.openpetfoodfacts.org',
+        },
+        'USER_AGENT': 'Profitify/1.0',
+        'CONNECT_TIMEOUT': 3,         # seconds
+        'READ_TIMEOUT': 5,            # seconds
+        'FOUND_TTL': 30 * 86400,      # seconds a hit is served from the table
+        'MISSING_TTL': 86400,         # seconds a miss is remembered
+        'MAX_WORKERS': 8,             # upstream requests in flight at once
+        'MAX_BATCH': 100,             # barcodes per bulk request
+    }
+"""
+import datetime
+import http.client
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .http_pool import ConnectionPool
+from .models import ProductLookup
+
+
+DEFAULTS = {
+    'SOURCES': {
+        'openfoodfacts': 'https://world.openfoodfacts.org',
+        'openpetfoodfacts': 'https://world.openpetfoodfacts.org',
+    },
+    'USER_AGENT': 'Profitify/1.0',
+    'CONNECT_TIMEOUT': 3,
+    'READ_TIMEOUT': 5,
+    'FOUND_TTL': 30 * 86400,
+    'MISSING_TTL': 86400,
+    'MAX_WORKERS': 8,
+    'MAX_BATCH': 100,
+}
+
+SOURCE_LABELS = {
+    'openfoodfacts': ('Open Food Facts', 'human-food'),
+    'openpetfoodfacts': ('Open Pet Food Facts', 'pet-food'),
+}
+
+LOOKUP_CHUNK_SIZE = 500
+BARCODE_RE = re.compile(r'^[0-9A-Za-z-]{1,64}$')
+
+
+def is_valid_barcode(barcode):
+    return isinstance(barcode, str) and bool(BARCODE_RE.match(barcode))
+
+
+def normalize_product(source, product):
+    """The fields the add-product form uses, from an OpenFoodFacts-style product object."""
+    label, product_type = SOURCE_LABELS.get(source, (source, 'other'))
+    return {
+        'name': product.get('product_name') or product.get('product_name_en') or '',
+        'brand': product.get('brands') or '',
+        'categories': product.get('categories') or '',
+        'quantity': product.get('quantity') or '',
+        'ingredients': product.get('ingredients_text') or '',
+        'image_url': product.get('image_url') or '',
+        'type': product_type,
+        'source_label': label,
+    }
+
+
+def _result(entry):
+    if entry.found:
+        return {'status': 'found', 'source': entry.source, 'product': entry.data}
+    return {'status': 'not_found'}
+
+
+class ProductLookupService:
+
+    def __init__(self, options):
+        self.options = options
+        self.pool = ConnectionPool(options['MAX_WORKERS'], options['CONNECT_TIMEOUT'], options['READ_TIMEOUT'])
+        self.executor = ThreadPoolExecutor(max_workers=options['MAX_WORKERS'], thread_name_prefix='product-lookup')
+
+    def _is_fresh(self, entry, now):
+        ttl = self.options['FOUND_TTL'] if entry.found else self.options['MISSING_TTL']
+        return entry.fetched_at + datetime.timedelta(seconds=ttl) > now
+
+    def fetch(self, source, base_url, barcode):
+        """Asks one source. Returns ('found', product), ('not_found', None) or ('error', message)."""
+        url = f"{base_url.rstrip('/')}/api/v0/product/{quote(barcode)}.json"
+        headers = {'User-Agent': self.options['USER_AGENT'], 'Accept': 'application/json'}
+        try:
+            status, data = self.pool.request('GET', url, headers=headers)
+        except TimeoutError:
+            return 'error', f"{source} timed out"
+        except (OSError, http.client.HTTPException) as e:
+            return 'error', f"{source} unreachable: {e}"
+
+        if status == 404:
+            return 'not_found', None
+        if status != 200:
+            return 'error', f"{source} returned HTTP {status}"
+        try:
+            body = json.loads(data)
+        except ValueError:
+            return 'error', f"{source} returned invalid JSON"
+        if body.get('status') == 1 and isinstance(body.get('product'), dict):
+            return 'found', normalize_product(source, body['product'])
+        return 'not_found', None
+
+    def fetch_many(self, barcodes):
+        """
+        Asks every source about every barcode at once. Returns {barcode: (outcome, value, source)},
+        preferring the first source in SOURCES that knows the barcode.
+        """
+        sources = list(self.options['SOURCES'].items())
+        futures = {
+            (barcode, name): self.executor.submit(self.fetch, name, base_url, barcode)
+            for barcode in barcodes
+            for name, base_url in sources
+        }
+        outcomes = {}
+        for barcode in barcodes:
+            answers = [(name, *futures[(barcode, name)].result()) for name, _ in sources]
+            found = next((answer for answer in answers if answer[1] == 'found'), None)
+            errors = [answer[2] for answer in answers if answer[1] == 'error']
+            if found:
+                outcomes[barcode] = ('found', found[2], found[0])
+            elif errors:
+                # a source that failed might have known the barcode, so this is not a cacheable miss
+                outcomes[barcode] = ('error', '; '.join(errors), '')
+            else:
+                outcomes[barcode] = ('not_found', None, '')
+        return outcomes
+
+    def lookup_many(self, barcodes, refresh=False):
+        """
+        {barcode: result} for each barcode, where a result is
+        {'status': 'found', 'source': ..., 'product': {...}}, {'status': 'not_found'}
+        or {'status': 'error', 'message': ...}. Fresh table entries are read
+        in one query per LOOKUP_CHUNK_SIZE barcodes; the rest are fetched in
+        parallel and stored. `refresh` ignores the table.
+        """
+        barcodes = list(dict.fromkeys(barcodes))
+        now = timezone.now()
+        results = {}
+        if not refresh:
+            for start in range(0, len(barcodes), LOOKUP_CHUNK_SIZE):
+                for entry in ProductLookup.objects.filter(barcode__in=barcodes[start:start + LOOKUP_CHUNK_SIZE]):
+                    if self._is_fresh(entry, now):
+                        results[entry.barcode] = _result(entry)
+
+        missing = [barcode for barcode in barcodes if barcode not in results]
+        if not missing:
+            return results
+
+        entries = []
+        for barcode, (outcome, value, source) in self.fetch_many(missing).items():
+            if outcome == 'error':
+                results[barcode] = {'status': 'error', 'message': value}
+                continue
+            entry = ProductLookup(
+                barcode=barcode, found=outcome == 'found', source=source,
+                data=value or {}, fetched_at=timezone.now(),
+            )
+            entries.append(entry)
+            results[barcode] = _result(entry)
+        if entries:
+            ProductLookup.objects.bulk_create(
+                entries,
+                update_conflicts=True,
+                unique_fields=['barcode'],
+                update_fields=['found', 'source', 'data', 'fetched_at'],
+            )
+        return results
+
+    def lookup(self, barcode, refresh=False):
+        return self.lookup_many([barcode], refresh=refresh)[barcode]
+
+
+@lru_cache(maxsize=None)
+def get_product_lookup():
+    options = {**DEFAULTS, **getattr(settings, 'PRODUCT_LOOKUP', {})}
+    return ProductLookupService(options)
+
+
+@receiver(setting_changed)
+def reset_product_lookup(setting, **kwargs):
+    if setting == 'PRODUCT_LOOKUP':
+        get_product_lookup.cache_clear()
@@ -0,0 +1,96 @@
+# APP/purchasing.py
+"""
+Automatic purchase orders.
+
+`generate_purchase_orders` reads every product below its reorder level
+(one query on the partial product_below_reorder_idx index), subtracts
+what is already on open orders (one aggregate query) and writes one
+draft PurchaseOrder per supplier with all of its items, in bulk and in
+one transaction. The query count is the same for ten products or fifty
+thousand.
+
+Each product is ordered up to ORDER_UP_TO times its reorder level, so a
+delivery lifts it clear of the threshold instead of just to it.
+"""
+from collections import defaultdict
+
+from django.db.models import F, Sum
+
+from .db import write_atomic
+from .models import PurchaseOrder, PurchaseOrderItem
+from .stock import products_below_reorder_level
+
+
+ORDER_UP_TO = 2
+OPEN_STATUSES = ('draft', 'sent')
+BATCH_SIZE = 1000
+
+
+def order_quantity(on_hand, reorder_level, on_order=0, order_up_to=ORDER_UP_TO):
+    """Units to order so stock plus open orders reaches `order_up_to` x reorder_level."""
+    return max(reorder_level * order_up_to - on_hand - on_order, 0)
+
+
+def open_order_quantities():
+    """{product_id: units} still to arrive on draft or sent purchase orders."""
+    rows = (
+        PurchaseOrderItem.objects.filter(purchase_order__status__in=OPEN_STATUSES)
+        .values('product_id')
+        .annotate(units=Sum(F('quantity') - F('received_quantity')))
+        .order_by()
+        .values_list('product_id', 'units')
+    )
+    return dict(rows)
+
+
+def plan_purchase_orders(order_up_to=ORDER_UP_TO):
+    """
+    {supplier_info: [(product_id, quantity, agreed_cost), ...]} for every
+    product below its reorder level that open orders do not already cover.
+    Products without a supplier are grouped under None.
+    """
+    on_order = open_order_quantities()
+    rows = (
+        products_below_reorder_level()
+        .order_by('supplier_info', 'id')
+        .values_list('id', 'on_hand', 'reorder_level', 'supplier_info', 'cost_price')
+    )
+    plan = defaultdict(list)
+    for product_id, on_hand, reorder_level, supplier_info, cost_price in rows.iterator(chunk_size=BATCH_SIZE):
+        quantity = order_quantity(on_hand, reorder_level, on_order.get(product_id, 0), order_up_to)
+        if quantity > 0:
+            plan[supplier_info].append((product_id, quantity, cost_price))
+    return dict(plan)
+
+
+def generate_purchase_orders(user=None, order_up_to=ORDER_UP_TO, dry_run=False):
+    """
+    Creates a draft PurchaseOrder per supplier for everything that needs
+    reordering. Returns {'orders': n, 'items': n, 'units': n, 'suppliers': [...]}.
+    With `dry_run` nothing is written.
+    """
+    # planned inside the write transaction, so two runs cannot both order the same shortfall
+    with write_atomic():
+        plan = plan_purchase_orders(order_up_to)
+        result = {
+            'orders': len(plan),
+            'items': sum(len(items) for items in plan.values()),
+            'units': sum(quantity for items in plan.values() for _, quantity, _ in items),
+            'suppliers': [supplier or '' for supplier in plan],
+        }
+        if dry_run or not plan:
+            return result
+
+        orders = PurchaseOrder.objects.bulk_create(
+            [PurchaseOrder(user=user, supplier_info=supplier, status='draft') for supplier in plan]
+        )
+        PurchaseOrderItem.objects.bulk_create(
+            [
+                PurchaseOrderItem(purchase_order=order, product_id=product_id, quantity=quantity, agreed_cost=cost)
+                for order, items in zip(orders, plan.values())
+                for product_id, quantity, cost in items
+            ],
+            batch_size=BATCH_SIZE,
+        )
+    result['order_ids'] = [order.pk for order in orders]
+    return result
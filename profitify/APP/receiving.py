@@ -0,0 +1,194 @@
+# APP/receiving.py
+"""
+Receiving purchase orders into stock.
+
+A delivery is a list of lines, each receiving some units of one
+PurchaseOrderItem as a StockBatch with its own expiry date and the
+item's agreed cost. Whole orders can be received too, which adds a line
+for everything still outstanding on them. Lines may receive less than
+was ordered (partial receipts); an order becomes 'received' once every
+one of its items is complete.
+
+The whole delivery is applied in one transaction with a fixed number of
+statements: the items are read in chunks, the batches are bulk-created,
+on_hand moves in one UPDATE (Product.adjust_on_hand), the ledger gets
+one 'receipt' StockMovement per batch and received quantities are
+written back in bulk. Receiving more than is outstanding is rejected,
+so a delivery posted twice cannot double the stock.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Value, When
+from django.utils import timezone
+
+from .db import write_atomic
+from .models import Product, PurchaseOrder, PurchaseOrderItem, StockBatch, StockMovement
+
+
+CHUNK_SIZE = 500
+BATCH_SIZE = 1000
+RECEIVABLE_STATUSES = ('draft', 'sent')
+
+
+class ReceivingError(Exception):
+    """Raised when a delivery cannot be received; `errors` lists the offending lines."""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def _date(value, name):
+    if value in (None, '') or isinstance(value, datetime.date):
+        return value or None
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"'{name}' must be a date (YYYY-MM-DD).")
+
+
+def parse_lines(lines, expiry_date=None):
+    """
+    Normalises [{'item_id': .., 'quantity': .., 'expiry_date': ..}, ...] into
+    a list of (item_id, quantity, expiry_date); lines without an expiry date
+    use `expiry_date`. Raises ReceivingError for malformed lines.
+    """
+    parsed = []
+    errors = []
+    for index, line in enumerate(lines):
+        try:
+            item_id = int(line['item_id'])
+            quantity = int(line['quantity'])
+        except (KeyError, TypeError, ValueError):
+            errors.append({'line': index, 'message': "Each line needs an integer item_id and quantity."})
+            continue
+        try:
+            line_expiry = _date(line.get('expiry_date'), 'expiry_date') or expiry_date
+        except ValueError as e:
+            errors.append({'line': index, 'item_id': item_id, 'message': str(e)})
+            continue
+        if quantity <= 0:
+            errors.append({'line': index, 'item_id': item_id, 'message': "Quantity must be greater than zero."})
+            continue
+        parsed.append((item_id, quantity, line_expiry))
+
+    if errors:
+        raise ReceivingError("Invalid delivery.", errors)
+    return parsed
+
+
+def _load_items(order_ids, item_ids):
+    """{item_id: item} for the given orders and items, locked where the database supports it."""
+    queryset = PurchaseOrderItem.objects.select_related('purchase_order').order_by('id')
+    if connection.features.has_select_for_update:
+        queryset = queryset.select_for_update()
+    items = {}
+    for ids, field in ((sorted(order_ids), 'purchase_order_id__in'), (sorted(item_ids), 'pk__in')):
+        for start in range(0, len(ids), CHUNK_SIZE):
+            for item in queryset.filter(**{field: ids[start:start + CHUNK_SIZE]}):
+                items[item.pk] = item
+    return items
+
+
+def _add_received_quantities(receipts):
+    """
+    received_quantity += units for {item_id: units}: one UPDATE per chunk of
+    items, with items receiving the same number of units grouped into one
+    CASE branch (like Product.adjust_on_hand).
+    """
+    item_ids = sorted(receipts)
+    for start in range(0, len(item_ids), CHUNK_SIZE):
+        chunk = item_ids[start:start + CHUNK_SIZE]
+        ids_by_units = defaultdict(list)
+        for item_id in chunk:
+            ids_by_units[receipts[item_id]].append(item_id)
+        added = Case(
+            *[When(pk__in=ids, then=Value(units)) for units, ids in ids_by_units.items()],
+            output_field=IntegerField(),
+        )
+        PurchaseOrderItem.objects.filter(pk__in=chunk).update(received_quantity=F('received_quantity') + added)
+
+
+def receive_purchase_orders(order_ids=(), lines=(), expiry_date=None, received_date=None):
+    """
+    Receives whole orders (`order_ids`, everything outstanding) and/or
+    individual `lines` (see parse_lines) into stock. Returns
+    {'lines', 'units', 'batches', 'completed_orders': [id, ...]}.
+    Raises ReceivingError, leaving stock untouched, if anything is invalid.
+    """
+    order_ids = {int(order_id) for order_id in order_ids}
+    lines = parse_lines(lines, expiry_date)
+    if not order_ids and not lines:
+        raise ReceivingError("Nothing to receive.")
+    received_date = received_date or timezone.localdate()
+
+    with write_atomic():
+        items = _load_items(order_ids, {item_id for item_id, _, _ in lines})
+        errors = []
+
+        orders = {item.purchase_order_id: item.purchase_order for item in items.values()}
+        missing = order_ids - set(orders)
+        if missing:
+            orders.update(PurchaseOrder.objects.in_bulk(list(missing)))
+        for order_id in sorted(order_ids):
+            if order_id not in orders:
+                errors.append({'purchase_order': order_id, 'message': "Purchase order not found."})
+            elif orders[order_id].status not in RECEIVABLE_STATUSES:
+                errors.append({
+                    'purchase_order': order_id, 'message': f"Purchase order is already {orders[order_id].status}.",
+                })
+        for item in items.values():
+            if item.purchase_order_id in order_ids and item.received_quantity < item.quantity:
+                lines.append((item.pk, item.quantity - item.received_quantity, expiry_date))
+
+        receipts = defaultdict(int)
+        for item_id, quantity, _ in lines:
+            receipts[item_id] += quantity
+        for item_id, quantity in receipts.items():
+            item = items.get(item_id)
+            if item is None:
+                errors.append({'item_id': item_id, 'message': "Purchase order item not found."})
+            elif item.purchase_order.status not in RECEIVABLE_STATUSES:
+                errors.append({'item_id': item_id, 'message': f"Purchase order #{item.purchase_order_id} "
+                                                               f"is already {item.purchase_order.status}."})
+            elif quantity > item.quantity - item.received_quantity:
+                errors.append({'item_id': item_id, 'message': f"Only {item.quantity - item.received_quantity} "
+                                                               f"unit(s) are outstanding."})
+        if errors:
+            raise ReceivingError("The delivery does not match the purchase orders.", errors)
+
+        batches = [
+            StockBatch(
+                product_id=items[item_id].product_id, quantity=quantity, received_date=received_date,
+                expiry_date=line_expiry, unit_cost=items[item_id].agreed_cost, purchase_order_item_id=item_id,
+            )
+            for item_id, quantity, line_expiry in lines
+        ]
+        StockBatch.objects.bulk_create(batches, batch_size=BATCH_SIZE)
+
+        # bulk_create skips StockBatch.save(), so apply the on_hand change here
+        deltas = defaultdict(int)
+        for batch in batches:
+            deltas[batch.product_id] += batch.quantity
+        Product.adjust_on_hand(dict(deltas))
+        StockMovement.record('receipt', [(batch.product_id, batch.pk, batch.quantity) for batch in batches])
+
+        _add_received_quantities(receipts)
+
+        touched = sorted({items[item_id].purchase_order_id for item_id in receipts})
+        outstanding = PurchaseOrderItem.objects.filter(
+            purchase_order=OuterRef('pk'), received_quantity__lt=F('quantity'),
+        )
+        completed = list(
+            PurchaseOrder.objects.filter(pk__in=touched).exclude(Exists(outstanding)).values_list('id', flat=True)
+        )
+        PurchaseOrder.objects.filter(pk__in=completed).update(status='received', received_at=timezone.now())
+
+    return {
+        'lines': len(lines),
+        'units': sum(batch.quantity for batch in batches),
+        'batches': len(batches),
+        'completed_orders': completed,
+    }
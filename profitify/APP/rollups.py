@@ -0,0 +1,64 @@
+# APP/rollups.py
+"""
+Backfill and rebuild helpers for the DailyProductSales rollup.
+Day-to-day maintenance happens in SaleItem.save(); these functions recreate
+the rollup from raw line items for history or after bulk edits.
+"""
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+from .finance import LINE_COST, LINE_PROFIT, LINE_REVENUE, timestamp_bounds
+from .models import DailyProductSales, SaleItem
+
+
+def rebuild_daily_sales(start_date=None, end_date=None, batch_size=2000):
+    """
+    Replaces rollup rows for the inclusive date range (all history when no
+    range is given) with totals recomputed from SaleItem. Returns the number
+    of rollup rows written.
+    """
+    items = SaleItem.objects.all()
+    rollups = DailyProductSales.objects.all()
+    if start_date:
+        start_dt, _ = timestamp_bounds(start_date, start_date)
+        items = items.filter(sale__sale_timestamp__gte=start_dt)
+        rollups = rollups.filter(date__gte=start_date)
+    if end_date:
+        _, end_dt = timestamp_bounds(end_date, end_date)
+        items = items.filter(sale__sale_timestamp__lt=end_dt)
+        rollups = rollups.filter(date__lte=end_date)
+
+    totals = (
+        items.annotate(day=TruncDate('sale__sale_timestamp'))
+        .values('day', 'product_id')
+        .annotate(
+            units=Sum('quantity'),
+            revenue=Sum(LINE_REVENUE),
+            cogs=Sum(LINE_COST),
+            profit=Sum(LINE_PROFIT),
+        )
+        .order_by()
+    )
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        for row in totals.iterator(chunk_size=batch_size):
+            batch.append(DailyProductSales(
+                product_id=row['product_id'],
+                date=row['day'],
+                units=row['units'],
+                revenue=row['revenue'],
+                cogs=row['cogs'],
+                profit=row['profit'],
+            ))
+            if len(batch) >= batch_size:
+                DailyProductSales.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            DailyProductSales.objects.bulk_create(batch)
+            written += len(batch)
+    return written
@@ -0,0 +1,266 @@
+# APP/sales.py
+"""
+Recording sales.
+
+A basket of any size becomes one Sale: products and their stock batches
+are fetched with one query each, the SaleItems are bulk-created and all
+batch decrements are applied in the same transaction, together with a
+'sale' StockMovement per batch taken from. Each line is costed at the
+unit cost of the batches it was taken from (see allocation_cost).
+
+Stock is taken first-expiry-first-out across as many batches as needed.
+Batches are read with SELECT ... FOR UPDATE where the database supports
+it (SKIP LOCKED on PostgreSQL, so tills selling the same product take
+different batches instead of queueing on one), and the decrement itself
+is a single conditional UPDATE that only succeeds if every batch still
+holds what was allocated, so concurrent tills can neither oversell nor
+lose each other's decrements. On SQLite the transaction starts with
+BEGIN IMMEDIATE (see APP/db.py), so a till waits for the write lock
+instead of failing when another one is selling.
+"""
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .db import write_atomic
+from .models import DailyProductSales, Product, Sale, SaleItem, StockBatch, StockMovement
+
+
+class SaleError(Exception):
+    """Raised when a basket cannot be sold; `errors` lists the offending lines."""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+class StockConflict(Exception):
+    """A batch changed between allocation and decrement; the caller should retry."""
+
+
+def merge_lines(lines):
+    """
+    Normalises [{'product_id': .., 'quantity': ..}, ...] into an ordered
+    {product_id: quantity} dict, adding up repeated products.
+    Raises SaleError for malformed lines.
+    """
+    merged = OrderedDict()
+    errors = []
+    for index, line in enumerate(lines):
+        try:
+            product_id = int(line['product_id'])
+            quantity = int(line['quantity'])
+        except (KeyError, TypeError, ValueError):
+            errors.append({'line': index, 'message': "Each item needs an integer product_id and quantity."})
+            continue
+        if quantity <= 0:
+            errors.append({'line': index, 'product_id': product_id, 'message': "Quantity must be greater than zero."})
+            continue
+        merged[product_id] = merged.get(product_id, 0) + quantity
+
+    if errors:
+        raise SaleError("Invalid basket.", errors)
+    if not merged:
+        raise SaleError("The basket is empty.")
+    return merged
+
+
+def available_batches(product_ids, lock=False, skip_locked=False):
+    """
+    {product_id: [batch, ...]} of non-empty batches, earliest expiry first, in one query.
+    With `lock`, the rows are locked until the surrounding transaction ends;
+    with `skip_locked` too, rows another transaction has locked are left out
+    (on databases that support it) instead of waited for.
+    """
+    batches = {product_id: [] for product_id in product_ids}
+    queryset = (
+        StockBatch.objects.filter(product_id__in=product_ids, quantity__gt=0)
+        .order_by('product_id', F('expiry_date').asc(nulls_last=True), 'id')
+    )
+    if lock and connection.features.has_select_for_update:
+        skip_locked = skip_locked and connection.features.has_select_for_update_skip_locked
+        queryset = queryset.select_for_update(skip_locked=skip_locked)
+    for batch in queryset:
+        batches[batch.product_id].append(batch)
+    return batches
+
+
+def allocate(batches, quantity):
+    """
+    Splits `quantity` across `batches` in order. Returns [(batch, taken), ...],
+    or None when the batches do not hold enough stock.
+    """
+    allocations = []
+    remaining = quantity
+    for batch in batches:
+        if remaining <= 0:
+            break
+        taken = min(batch.quantity, remaining)
+        allocations.append((batch, taken))
+        remaining -= taken
+    return allocations if remaining <= 0 else None
+
+
+def take_stock(allocations):
+    """
+    Applies [(batch, taken), ...] as one conditional UPDATE. Every batch must
+    still hold at least `taken` units, otherwise nothing is decremented and
+    StockConflict is raised. Must run inside a transaction.
+    """
+    if not allocations:
+        return
+    taken_by_batch = {}
+    for batch, taken in allocations:
+        taken_by_batch[batch.pk] = taken_by_batch.get(batch.pk, 0) + taken
+
+    # batches giving up the same number of units share one condition and one CASE branch
+    ids_by_taken = {}
+    for batch_id, taken in taken_by_batch.items():
+        ids_by_taken.setdefault(taken, []).append(batch_id)
+    enough = Q()
+    for taken, ids in ids_by_taken.items():
+        enough |= Q(pk__in=ids, quantity__gte=taken)
+    change = Case(
+        *[When(pk__in=ids, then=Value(taken)) for taken, ids in ids_by_taken.items()],
+        output_field=IntegerField(),
+    )
+    updated = StockBatch.objects.filter(enough).update(quantity=F('quantity') - change)
+    if updated != len(taken_by_batch):
+        raise StockConflict()
+
+    for batch, taken in allocations:
+        batch.quantity -= taken
+
+
+def allocation_cost(allocation, default_cost):
+    """
+    Cost per unit of [(batch, taken), ...]: the batches' unit_cost averaged
+    over the units taken from each, with batches that have no unit_cost
+    (stock not received on a purchase order) counted at `default_cost`.
+    """
+    units = sum(taken for _, taken in allocation)
+    if not units:
+        return default_cost
+    total = sum(
+        (taken * (default_cost if batch.unit_cost is None else batch.unit_cost) for batch, taken in allocation),
+        Decimal('0'),
+    )
+    return (total / units).quantize(Decimal('0.01'))
+
+
+def allocate_stock(quantities):
+    """
+    Takes {product_id: quantity} out of stock, first-expiry-first-out across
+    as many batches as needed. Returns {product_id: [(batch, taken), ...]}.
+    Raises SaleError listing every product that is short, or StockConflict
+    if another transaction changed the batches first.
+    Must run inside a transaction.
+
+    Batches locked by another sale are skipped where the database supports
+    it; a product whose unlocked batches fall short is read again, this time
+    waiting for the locks, before it is reported as short.
+    """
+    batches = available_batches(list(quantities), lock=True, skip_locked=True)
+    if connection.features.has_select_for_update_skip_locked:
+        short = [
+            product_id for product_id, quantity in quantities.items()
+            if sum(batch.quantity for batch in batches[product_id]) < quantity
+        ]
+        if short:
+            batches.update(available_batches(short, lock=True))
+
+    errors = []
+    allocations = {}
+    for product_id, quantity in quantities.items():
+        allocation = allocate(batches[product_id], quantity)
+        if allocation is None:
+            available = sum(batch.quantity for batch in batches[product_id])
+            errors.append({
+                'product_id': product_id,
+                'message': f"Not enough stock. Available: {available}",
+                'available': available,
+            })
+            continue
+        allocations[product_id] = allocation
+    if errors:
+        raise SaleError("Some items could not be sold.", errors)
+
+    take_stock([pair for allocation in allocations.values() for pair in allocation])
+    Product.adjust_on_hand({product_id: -quantity for product_id, quantity in quantities.items()})
+    return allocations
+
+
+def record_sale(lines, user=None, attempts=5):
+    """
+    Sells a whole basket as one Sale in a single transaction.
+    Raises SaleError (with per-line `errors`) if any product is unknown or
+    short of stock; nothing is written in that case. A basket that loses a
+    race for the same batches is retried up to `attempts` times.
+    """
+    quantities = merge_lines(lines)
+
+    for attempt in range(attempts):
+        try:
+            return _record_sale(quantities, user)
+        except StockConflict:
+            if attempt == attempts - 1:
+                raise SaleError("Stock changed while selling; please try again.")
+
+
+def _record_sale(quantities, user):
+    with write_atomic():
+        products = Product.objects.in_bulk(list(quantities))
+        errors = [
+            {'product_id': product_id, 'message': "Product not found."}
+            for product_id in quantities if product_id not in products
+        ]
+        allocations = {}
+        try:
+            allocations = allocate_stock({product_id: quantities[product_id] for product_id in products})
+        except SaleError as e:
+            errors.extend(e.errors)
+        if errors:
+            # leaving the atomic block with an exception rolls back any stock already taken
+            raise SaleError("Some items could not be sold.", errors)
+
+        costs = {
+            product_id: allocation_cost(allocation, products[product_id].cost_price)
+            for product_id, allocation in allocations.items()
+        }
+        total_amount = Decimal('0')
+        total_profit = Decimal('0')
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            total_amount += product.selling_price * quantity
+            total_profit += (product.selling_price - costs[product_id]) * quantity
+
+        sale = Sale.objects.create(total_amount=total_amount, total_profit=total_profit, user=user)
+
+        items = [
+            SaleItem(
+                sale=sale,
+                product=products[product_id],
+                quantity=quantity,
+                price_at_sale=products[product_id].selling_price,
+                cost_at_sale=costs[product_id],
+            )
+            for product_id, quantity in quantities.items()
+        ]
+        SaleItem.objects.bulk_create(items)
+        StockMovement.record('sale', [
+            (product_id, batch.pk, -taken)
+            for product_id, allocation in allocations.items()
+            for batch, taken in allocation
+        ], sale=sale)
+
+        # bulk_create skips SaleItem.save(), so keep the rollup in step here
+        sale_day = timezone.localdate(sale.sale_timestamp)
+        DailyProductSales.record_lines([
+            (item.product_id, sale_day, item.quantity, item.price_at_sale * item.quantity, item.cost_at_sale * item.quantity)
+            for item in items
+        ])
+
+    return sale
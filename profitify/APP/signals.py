@@ -0,0 +1,32 @@
+# APP/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .advisor import get_advisor_cache
+from .barcode_cache import get_barcode_cache
+from .models import Alert, Product, alerts_changed, stock_changed
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_barcode(sender, instance, **kwargs):
+    barcodes = {instance.barcode, getattr(instance, '_stored_barcode', None)}
+    instance._stored_barcode = instance.barcode
+    transaction.on_commit(lambda: get_barcode_cache().invalidate_barcodes(barcodes))
+    transaction.on_commit(lambda: get_advisor_cache().invalidate())
+
+
+@receiver(stock_changed)
+def invalidate_stock_barcodes(sender, product_ids, **kwargs):
+    # reads the barcodes after COMMIT; robust, so a failed read is logged
+    # instead of failing a sale that has already been booked
+    transaction.on_commit(lambda: get_barcode_cache().invalidate_products(product_ids), robust=True)
+    transaction.on_commit(lambda: get_advisor_cache().invalidate())
+
+
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=Alert)
+@receiver(alerts_changed)
+def invalidate_advisor(sender, **kwargs):
+    transaction.on_commit(lambda: get_advisor_cache().invalidate())
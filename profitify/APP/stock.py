@@ -0,0 +1,45 @@
+# APP/stock.py
+"""
+Stock level helpers built on the maintained Product.on_hand column.
+"""
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Product, StockBatch
+
+
+def _batch_total_subquery():
+    totals = (
+        StockBatch.objects.filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return Coalesce(Subquery(totals, output_field=IntegerField()), 0)
+
+
+def products_below_reorder_level():
+    """Products whose on-hand stock is under their reorder level (one indexed query)."""
+    return Product.objects.filter(on_hand__lt=F('reorder_level'))
+
+
+def find_on_hand_drift():
+    """
+    Returns a list of (product_id, product_name, on_hand, actual) for every
+    product whose stored on_hand disagrees with the sum of its batches.
+    """
+    rows = (
+        Product.objects.annotate(actual=_batch_total_subquery())
+        .exclude(on_hand=F('actual'))
+        .values_list('id', 'product_name', 'on_hand', 'actual')
+        .order_by('id')
+    )
+    return list(rows)
+
+
+def rebuild_on_hand():
+    """Recomputes on_hand for every product from its batches in a single UPDATE."""
+    with transaction.atomic():
+        return Product.objects.update(on_hand=_batch_total_subquery())
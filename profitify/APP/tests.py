@@ -1,3 +1,1683 @@
-from django.test import TestCase
+import datetime
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F, ProtectedError
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .advisor import GENERATION_KEY, get_advisor_cache
+from .alerts import refresh_alerts, sync_alerts, trend_alert_specs
+from .barcode_cache import LRUCache, MISSING, get_barcode_cache
+from .benchmarks import ENDPOINTS, compare_results, run_benchmarks
+from .db import write_atomic
+from .forecasting import load_history, np, seasonal_factors, suggest_reorder_levels, write_reorder_levels
+from .finance import daily_sales_in_range, finance_summary, revenue_series, sales_in_range
+from .http_pool import ConnectionPool
+from .imports import import_rows, read_rows
+from .ledger import close_of_day, stock_at, stock_value_at, take_snapshot
+from .llm import get_summary_service
+from .middleware import RequestMetricsMiddleware, metrics
+from .models import (
+    Alert, DailyProductSales, Product, ProductLookup, PurchaseOrder, PurchaseOrderItem, Sale, SaleItem,
+    StockBatch, StockMovement,
+)
+from .purchasing import generate_purchase_orders
+from .receiving import ReceivingError, receive_purchase_orders
+from .rollups import rebuild_daily_sales
+from .sales import SaleError, record_sale
+from .stock import find_on_hand_drift, products_below_reorder_level
+from .trends import compute_trends
+
+
+def make_product(name='Milk', barcode=None, cost='10.00', price='15.00', reorder_level=0):
+    return Product.objects.create(
+        product_name=name,
+        barcode=barcode,
+        cost_price=Decimal(cost),
+        selling_price=Decimal(price),
+        reorder_level=reorder_level,
+    )
+
+
+def make_sale(product, quantity, price=None, cost=None):
+    price = product.selling_price if price is None else Decimal(price)
+    cost = product.cost_price if cost is None else Decimal(cost)
+    sale = Sale.objects.create(total_amount=price * quantity, total_profit=(price - cost) * quantity)
+    SaleItem.objects.create(sale=sale, product=product, quantity=quantity, price_at_sale=price, cost_at_sale=cost)
+    return sale
+
+
+class StubServer:
+    """
+    A local HTTP server standing in for an external API. `respond(method, path, body)`
+    returns (status, JSON-able payload); every request is recorded in `requests`.
+    """
+
+    def __init__(self, respond, delay=0):
+        self.respond = respond
+        self.delay = delay
+        self.requests = []
+
+    def __enter__(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def handle_method(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                stub.requests.append((self.command, self.path, body))
+                time.sleep(stub.delay)
+                status, payload = stub.respond(self.command, self.path, body)
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up waiting (timeout tests)
+
+            do_GET = do_POST = handle_method
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+
+class FinanceSummaryTests(TestCase):
+
+    def test_totals_and_profit_makers(self):
+        milk = make_product('Milk', cost='10.00', price='15.00')
+        bread = make_product('Bread', cost='20.00', price='30.00')
+        make_sale(milk, 2)
+        make_sale(bread, 3)
+
+        today = timezone.localdate()
+        summary = finance_summary(today, today)
+
+        self.assertEqual(summary['revenue'], Decimal('120.00'))
+        self.assertEqual(summary['cogs'], Decimal('80.00'))
+        self.assertEqual(summary['profit'], Decimal('40.00'))
+        self.assertEqual(summary['sale_count'], 2)
+        self.assertEqual(
+            [row['product__product_name'] for row in summary['profit_makers']],
+            ['Bread', 'Milk'],
+        )
+
+    def test_query_count_is_independent_of_sales_volume(self):
+        milk = make_product()
+        for _ in range(20):
+            make_sale(milk, 1)
+
+        today = timezone.localdate()
+        with self.assertNumQueries(3):
+            finance_summary(today, today)
+
+    def test_finance_tracker_accepts_date_range(self):
+        response = self.client.get(reverse('finance-tracker'), {'start': '2025-01-01', 'end': '2025-01-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['sale_count'], 0)
+
+        response = self.client.get(reverse('finance-tracker'), {'start': 'not-a-date'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['is_today'])
+
+    def test_revenue_series_groups_by_period(self):
+        milk = make_product()
+        monday = datetime.date(2025, 3, 3)
+        for day, units in ((monday, 1), (monday + datetime.timedelta(days=2), 2), (monday + datetime.timedelta(days=8), 4)):
+            DailyProductSales.objects.create(
+                product=milk, date=day, units=units,
+                revenue=Decimal('15.00') * units, cogs=Decimal('10.00') * units, profit=Decimal('5.00') * units,
+            )
+        end = monday + datetime.timedelta(days=9)
+
+        daily = revenue_series(monday, end)
+        self.assertEqual(len(daily), 10)
+        self.assertEqual([row['revenue'] for row in daily[:3]], [Decimal('15.00'), Decimal('0'), Decimal('30.00')])
+
+        weekly = revenue_series(monday, end, period='week')
+        self.assertEqual([row['period'] for row in weekly], [monday, monday + datetime.timedelta(days=7)])
+        self.assertEqual([row['profit'] for row in weekly], [Decimal('15.00'), Decimal('20.00')])
+
+        self.assertEqual(revenue_series(monday, end, period='month')[0]['period'], datetime.date(2025, 3, 1))
+
+    def test_finance_tracker_charts_at_least_a_week(self):
+        response = self.client.get(reverse('finance-tracker'))
+        chart = response.context['revenue_chart']
+        self.assertEqual(len(chart['labels']), 7)
+        self.assertEqual(chart['revenue'], [0.0] * 7)
+
+
+class OnHandTests(TestCase):
+
+    def test_batch_changes_keep_on_hand_in_sync(self):
+        milk = make_product()
+        batch = StockBatch.objects.create(product=milk, quantity=10)
+        StockBatch.objects.create(product=milk, quantity=5)
+        milk.refresh_from_db()
+        self.assertEqual(milk.on_hand, 15)
+
+        batch.quantity = 4
+        batch.save()
+        milk.refresh_from_db()
+        self.assertEqual(milk.on_hand, 9)
+
+        batch.delete()
+        milk.refresh_from_db()
+        self.assertEqual(milk.on_hand, 5)
+
+    def test_admin_bulk_delete_keeps_on_hand_in_sync(self):
+        milk = make_product()
+        StockBatch.objects.create(product=milk, quantity=10)
+        StockBatch.objects.create(product=milk, quantity=5)
+
+        admin.site._registry[StockBatch].delete_queryset(None, StockBatch.objects.all())
+
+        milk.refresh_from_db()
+        self.assertEqual(milk.on_hand, 0)
+        self.assertEqual(sum(StockMovement.objects.values_list('quantity', flat=True)), 0)
+
+    def test_sell_product_decrements_on_hand(self):
+        milk = make_product()
+        StockBatch.objects.create(product=milk, quantity=10)
+
+        self.client.post(reverse('sell-product-page', args=[milk.id]), {'quantity_sold': 3})
+
+        milk.refresh_from_db()
+        self.assertEqual(milk.on_hand, 7)
+        self.assertEqual(SaleItem.objects.get().quantity, 3)
+
+    def test_products_below_reorder_level(self):
+        low = make_product('Low', reorder_level=10)
+        ok = make_product('Ok', reorder_level=2)
+        StockBatch.objects.create(product=low, quantity=3)
+        StockBatch.objects.create(product=ok, quantity=3)
+
+        self.assertEqual(list(products_below_reorder_level()), [low])
+
+    def test_rebuild_command_repairs_drift(self):
+        milk = make_product()
+        StockBatch.objects.create(product=milk, quantity=10)
+        Product.objects.filter(pk=milk.pk).update(on_hand=99)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_stock_levels', '--verify', stdout=StringIO())
+
+        call_command('rebuild_stock_levels', stdout=StringIO())
+        self.assertEqual(find_on_hand_drift(), [])
+
+
+class StockLedgerTests(TestCase):
+
+    def test_every_batch_change_is_recorded(self):
+        milk = make_product()
+        first = StockBatch.objects.create(product=milk, quantity=10, expiry_date=datetime.date(2026, 1, 1))
+        second = StockBatch.objects.create(product=milk, quantity=5, expiry_date=datetime.date(2026, 2, 1))
+        sale = record_sale([{'product_id': milk.id, 'quantity': 12}])
+        second = StockBatch.objects.get(pk=second.pk)
+        second.quantity = 2
+        second.save()
+        second.quantity = 0
+        second.save(movement_kind='waste')
+        StockBatch.objects.get(pk=first.pk).delete()  # empty by now, so nothing to record
+
+        self.assertEqual(
+            list(StockMovement.objects.order_by('id').values_list('kind', 'batch_id', 'quantity', 'sale_id')),
+            [
+                ('receipt', None, 10, None),  # the batch is gone, its movements stay
+                ('receipt', second.pk, 5, None),
+                ('sale', None, -10, sale.pk),
+                ('sale', second.pk, -2, sale.pk),
+                ('adjustment', second.pk, -1, None),
+                ('waste', second.pk, -2, None),
+            ],
+        )
+        milk.refresh_from_db()
+        self.assertEqual(milk.on_hand, sum(StockMovement.objects.values_list('quantity', flat=True)))
+
+    def test_movements_cannot_be_edited(self):
+        StockBatch.objects.create(product=make_product(), quantity=1)
+        movement = StockMovement.objects.get()
+        movement.quantity = 100
+
+        with self.assertRaises(ValueError):
+            movement.save()
+
+    def test_products_with_history_cannot_be_deleted(self):
+        milk = make_product()
+        StockBatch.objects.create(product=milk, quantity=1)
+
+        with self.assertRaises(ProtectedError):
+            milk.delete()
+        self.assertEqual(StockMovement.objects.filter(product=milk).count(), 1)
+
+    def test_stock_at_a_past_moment(self):
+        milk = make_product(cost='2.00')
+        take_snapshot()
+        StockBatch.objects.create(product=milk, quantity=10)
+        after_receipt = timezone.now()
+        record_sale([{'product_id': milk.id, 'quantity': 3}])
+        take_snapshot()
+        record_sale([{'product_id': milk.id, 'quantity': 2}])
+        after_second_sale = timezone.now()
+        take_snapshot()
+        record_sale([{'product_id': milk.id, 'quantity': 1}])
+
+        self.assertEqual(stock_at(after_receipt), {milk.id: 10})
+        with self.assertNumQueries(4):  # snapshot, the one after it, its items, the movements in between
+            self.assertEqual(stock_at(after_second_sale, [milk.id]), {milk.id: 5})
+        self.assertEqual(stock_at(timezone.now()), {milk.id: 4})
+        self.assertEqual(stock_value_at(after_second_sale), {'units': 5, 'value': Decimal('10.00')})
+
+    def test_history_before_the_ledger_is_an_error(self):
+        with self.assertRaises(ValueError):
+            stock_at(close_of_day(datetime.date(2000, 1, 1)))
+
+    def test_history_command(self):
+        milk = make_product(cost='2.00')
+        take_snapshot()
+        StockBatch.objects.create(product=milk, quantity=10)
+        today = timezone.localdate()
+        out = StringIO()
+
+        call_command('stock_history', '--date', today.isoformat(), stdout=out)
+        call_command('stock_history', '--date', today.isoformat(), '--product', str(milk.id), stdout=out)
+
+        self.assertEqual(
+            [json.loads(line) for line in out.getvalue().splitlines()],
+            [
+                {'date': today.isoformat(), 'units': 10, 'value': '20.00'},
+                {'date': today.isoformat(), 'products': {str(milk.id): 10}},
+            ],
+        )
+
+
+class DailyProductSalesTests(TestCase):
+
+    def test_sale_items_update_rollup(self):
+        milk = make_product(cost='10.00', price='15.00')
+        make_sale(milk, 2)
+        sale = make_sale(milk, 3)
+
+        rollup = DailyProductSales.objects.get(product=milk)
+        self.assertEqual(rollup.date, timezone.localdate())
+        self.assertEqual(rollup.units, 5)
+        self.assertEqual(rollup.revenue, Decimal('75.00'))
+        self.assertEqual(rollup.profit, Decimal('25.00'))
+
+        item = sale.items.get()
+        item.quantity = 1
+        item.save()
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.units, 3)
+
+        item.delete()
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.units, 2)
+        self.assertEqual(rollup.cogs, Decimal('20.00'))
+
+    def test_admin_delete_of_sales_updates_rollup(self):
+        milk = make_product()
+        make_sale(milk, 2)
+        make_sale(milk, 3)
+
+        admin.site._registry[Sale].delete_queryset(None, Sale.objects.filter(items__quantity=3))
+
+        self.assertEqual(DailyProductSales.objects.get(product=milk).units, 2)
+
+    def test_rebuild_matches_incremental_rollup(self):
+        milk = make_product()
+        bread = make_product('Bread')
+        make_sale(milk, 2)
+        make_sale(bread, 4)
+        expected = sorted(DailyProductSales.objects.values_list('product_id', 'units', 'revenue', 'cogs', 'profit'))
+
+        DailyProductSales.objects.all().delete()
+        self.assertEqual(rebuild_daily_sales(), 2)
+        self.assertEqual(
+            sorted(DailyProductSales.objects.values_list('product_id', 'units', 'revenue', 'cogs', 'profit')),
+            expected,
+        )
+
+
+class TrendTests(TestCase):
+
+    def setUp(self):
+        get_advisor_cache().invalidate()
+        self.today = datetime.date(2025, 6, 30)
+        self.rising = make_product('Rising')
+        self.steady = make_product('Steady')
+        rows = []
+        for offset in range(28):
+            day = self.today - datetime.timedelta(days=offset)
+            rows.append(DailyProductSales(product=self.rising, date=day, units=6 if offset < 7 else 1))
+            rows.append(DailyProductSales(product=self.steady, date=day, units=2))
+        DailyProductSales.objects.bulk_create(rows)
+
+    def test_compute_trends_flags_only_changed_velocity(self):
+        with self.assertNumQueries(1):
+            trends = compute_trends(as_of=self.today)
+
+        self.assertEqual([trend['product_id'] for trend in trends], [self.rising.id])
+        self.assertEqual(trends[0]['short_rate'], 6)
+
+    def test_trend_alerts_are_not_duplicated(self):
+        self.assertEqual(sync_alerts('trend', trend_alert_specs(as_of=self.today)), (1, 0, 0))
+        self.assertEqual(sync_alerts('trend', trend_alert_specs(as_of=self.today)), (0, 0, 0))
+
+        alert = Alert.objects.get(alert_type='trend')
+        self.assertEqual(alert.product, self.rising)
+        self.assertIn('faster', alert.message)
+
+        response = self.client.get(reverse('api-advisor'), {'type': 'trend'})
+        self.assertEqual(
+            response.json()['alerts']['trend']['items'],
+            [{'product_name': 'Rising', 'message': alert.message, 'product_id': self.rising.id}],
+        )
+
+
+class AlertGenerationTests(TestCase):
+
+    def test_refresh_alerts_upserts_and_resolves(self):
+        today = timezone.localdate()
+        low = make_product('Low', reorder_level=10)
+        batch = StockBatch.objects.create(product=low, quantity=3, expiry_date=today + datetime.timedelta(days=2))
+        make_product('Fresh', reorder_level=0)
+
+        results = refresh_alerts(('reorder', 'waste'))
+        self.assertEqual(results, {'reorder': (1, 0, 0), 'waste': (1, 0, 0)})
+
+        batch.quantity = 5
+        batch.save()
+        results = refresh_alerts(('reorder', 'waste'))
+        self.assertEqual(results, {'reorder': (0, 1, 0), 'waste': (0, 1, 0)})
+        self.assertEqual(
+            Alert.objects.get(alert_type='reorder').payload,
+            {'name': 'Low', 'current_stock': 5, 'reorder_level': 10},
+        )
+
+        batch.quantity = 20
+        batch.expiry_date = today + datetime.timedelta(days=30)
+        batch.save()
+        results = refresh_alerts(('reorder', 'waste'))
+        self.assertEqual(results, {'reorder': (0, 0, 1), 'waste': (0, 0, 1)})
+        self.assertFalse(Alert.objects.exists())
+
+    def test_viewed_alerts_are_not_raised_again(self):
+        low = make_product('Low', reorder_level=10)
+        StockBatch.objects.create(product=low, quantity=3)
+        refresh_alerts(('reorder',))
+        Alert.objects.update(is_viewed=True)
+
+        self.assertEqual(refresh_alerts(('reorder',)), {'reorder': (0, 0, 0)})
+        self.assertEqual(Alert.objects.filter(is_viewed=False).count(), 0)
+
+        Product.objects.filter(pk=low.pk).update(reorder_level=0)
+        self.assertEqual(refresh_alerts(('reorder',)), {'reorder': (0, 0, 1)})
+        self.assertFalse(Alert.objects.exists())
+
+    def test_ai_advisor_page_does_not_query_alerts(self):
+        low = make_product('Low', reorder_level=10)
+        StockBatch.objects.create(product=low, quantity=3)
+        refresh_alerts()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('ai-advisor'))
+
+        self.assertContains(response, reverse('api-advisor'))
+
+
+class AdvisorApiTests(TestCase):
+
+    def setUp(self):
+        get_advisor_cache().invalidate()
+        today = timezone.localdate()
+        for i in range(5):
+            product = make_product(f'Low {i}', reorder_level=10)
+            StockBatch.objects.create(product=product, quantity=i + 1, expiry_date=today + datetime.timedelta(days=5 - i))
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_alerts(('reorder', 'waste'))
+
+    def advisor(self, **params):
+        return self.client.get(reverse('api-advisor'), params)
+
+    def test_pages_are_paginated_and_query_count_is_constant(self):
+        # a COUNT, the page and the waste stock aggregate
+        with self.assertNumQueries(3):
+            first = self.advisor(type='waste', page_size=2).json()['alerts']['waste']
+        with self.assertNumQueries(3):
+            last = self.advisor(type='waste', page=3, page_size=2).json()['alerts']['waste']
+
+        self.assertEqual((first['total'], first['has_next'], last['has_next']), (5, True, False))
+        self.assertEqual([item['product'] for item in first['items']], ['Low 4', 'Low 3'])
+        self.assertEqual(first['items'][0]['stock'], 5)
+        self.assertEqual(len(last['items']), 1)
+
+        # waste page 1 is cached already and an empty list needs no page query
+        with self.assertNumQueries(3):
+            everything = self.advisor(page_size=2).json()['alerts']
+        self.assertEqual(set(everything), {'reorder', 'waste', 'trend'})
+        self.assertEqual(everything['trend']['total'], 0)
+
+    def test_pages_are_cached_until_stock_changes(self):
+        first = self.advisor(type='reorder').json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.advisor(type='reorder').json(), first)
+
+        product = Product.objects.get(product_name='Low 0')
+        with self.captureOnCommitCallbacks(execute=True):
+            StockBatch.objects.create(product=product, quantity=4)
+
+        items = self.advisor(type='reorder').json()['alerts']['reorder']['items']
+        self.assertEqual(items[0], {'name': 'Low 0', 'current_stock': 5, 'reorder_level': 10, 'product_id': product.id})
+
+    def test_pages_are_dropped_when_alerts_are_synced(self):
+        self.advisor(type='reorder')
+        Product.objects.update(reorder_level=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_alerts(('reorder',))
+
+        self.assertEqual(self.advisor(type='reorder').json()['alerts']['reorder']['total'], 0)
+
+    def test_pages_are_dropped_when_another_process_changes_data(self):
+        self.advisor(type='reorder')
+        # what generate_alerts running in another process leaves behind: new
+        # alert rows and a new generation, but nothing in this process's cache
+        Alert.objects.filter(alert_type='reorder').update(is_viewed=True)
+        caches['default'].incr(GENERATION_KEY)
+
+        self.assertEqual(self.advisor(type='reorder').json()['alerts']['reorder']['total'], 0)
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({'type': 'other'}, {'page': 'x'}, {'page': 0}, {'page_size': 1000}):
+            self.assertEqual(self.advisor(**params).status_code, 400)
+
+
+class PurchaseOrderGenerationTests(TestCase):
+
+    def setUp(self):
+        self.milk = Product.objects.create(
+            product_name='Milk', cost_price=Decimal('10.00'), selling_price=Decimal('15.00'),
+            reorder_level=10, supplier_info='Dairy Co',
+        )
+        self.cheese = Product.objects.create(
+            product_name='Cheese', cost_price=Decimal('30.00'), selling_price=Decimal('45.00'),
+            reorder_level=4, supplier_info='Dairy Co',
+        )
+        self.rice = Product.objects.create(
+            product_name='Rice', cost_price=Decimal('40.00'), selling_price=Decimal('55.00'), reorder_level=5,
+        )
+        StockBatch.objects.create(product=self.milk, quantity=3)
+        StockBatch.objects.create(product=self.cheese, quantity=9)
+
+    def test_draft_orders_are_grouped_by_supplier_in_bulk(self):
+        with self.assertNumQueries(6):  # plan (2) + savepoint pair + one insert per table
+            result = generate_purchase_orders()
+
+        self.assertEqual((result['orders'], result['items'], result['units']), (2, 2, 27))
+        dairy = PurchaseOrder.objects.get(supplier_info='Dairy Co')
+        self.assertEqual(dairy.status, 'draft')
+        self.assertEqual(
+            list(dairy.items.values_list('product__product_name', 'quantity', 'agreed_cost')),
+            [('Milk', 17, Decimal('10.00'))],
+        )
+        self.assertEqual(PurchaseOrderItem.objects.get(product=self.rice).purchase_order.supplier_info, None)
+
+    def test_open_orders_are_not_ordered_twice(self):
+        generate_purchase_orders()
+        self.assertEqual(generate_purchase_orders()['orders'], 0)
+
+        PurchaseOrder.objects.update(status='received')
+        self.assertEqual(generate_purchase_orders()['items'], 2)
+
+    def test_dry_run_writes_nothing(self):
+        out = StringIO()
+        call_command('generate_purchase_orders', '--dry-run', stdout=out)
+
+        self.assertIn('Would create 2 purchase order(s) with 2 item(s), 27 unit(s)', out.getvalue())
+        self.assertFalse(PurchaseOrder.objects.exists())
+
+
+class ReceivingTests(TestCase):
+
+    def setUp(self):
+        self.milk = make_product('Milk')
+        self.rice = make_product('Rice')
+        self.order = PurchaseOrder.objects.create(supplier_info='Wholesale', status='sent')
+        self.milk_line = self.order.items.create(product=self.milk, quantity=10, agreed_cost=Decimal('8.50'))
+        self.rice_line = self.order.items.create(product=self.rice, quantity=4, agreed_cost=Decimal('30.00'))
+        self.client.force_login(User.objects.create_user('manager', is_staff=True))
+
+    def receive(self, payload):
+        return self.client.post(reverse('api-receive-purchase-orders'), payload, content_type='application/json')
+
+    def test_staff_only(self):
+        self.client.force_login(User.objects.create_user('cashier'))
+
+        self.assertEqual(self.receive({'purchase_orders': [self.order.id]}).status_code, 403)
+
+        client = self.client_class(enforce_csrf_checks=True)
+        client.force_login(User.objects.get(username='manager'))
+        response = client.post(
+            reverse('api-receive-purchase-orders'), {'purchase_orders': [self.order.id]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(StockBatch.objects.exists())
+
+    def test_partial_then_full_receipt(self):
+        response = self.receive({'lines': [
+            {'item_id': self.milk_line.id, 'quantity': 4, 'expiry_date': '2025-09-01'},
+            {'item_id': self.milk_line.id, 'quantity': 2, 'expiry_date': '2025-09-15'},
+        ]})
+        self.assertEqual(response.json()['completed_orders'], [])
+        self.order.refresh_from_db()
+        self.milk_line.refresh_from_db()
+        self.assertEqual((self.order.status, self.milk_line.received_quantity), ('sent', 6))
+        self.assertEqual(
+            list(self.milk.stock_batches.order_by('expiry_date').values_list('quantity', 'unit_cost', 'expiry_date')),
+            [(4, Decimal('8.50'), datetime.date(2025, 9, 1)), (2, Decimal('8.50'), datetime.date(2025, 9, 15))],
+        )
+
+        result = self.receive({'purchase_orders': [self.order.id]}).json()
+
+        self.assertEqual((result['units'], result['completed_orders']), (8, [self.order.id]))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'received')
+        self.assertIsNotNone(self.order.received_at)
+        self.assertEqual(Product.objects.get(pk=self.milk.pk).on_hand, 10)
+        self.assertEqual(Product.objects.get(pk=self.rice.pk).on_hand, 4)
+
+    def test_over_receipts_and_received_orders_are_rejected(self):
+        response = self.receive({'lines': [{'item_id': self.rice_line.id, 'quantity': 5}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Only 4 unit(s)', response.json()['errors'][0]['message'])
+
+        receive_purchase_orders([self.order.id])
+        with self.assertRaises(ReceivingError):
+            receive_purchase_orders([self.order.id])
+        self.assertEqual(StockBatch.objects.count(), 2)
+        self.assertEqual(self.receive({'lines': [{'item_id': 'x', 'quantity': 1}]}).status_code, 400)
+
+    def test_large_delivery_uses_a_fixed_number_of_queries(self):
+        products = Product.objects.bulk_create([
+            Product(product_name=f'Item {i}', cost_price=Decimal('1.00'), selling_price=Decimal('2.00'))
+            for i in range(100)
+        ])
+        big = PurchaseOrder.objects.create(status='sent')
+        PurchaseOrderItem.objects.bulk_create([
+            PurchaseOrderItem(purchase_order=big, product=product, quantity=3) for product in products
+        ])
+
+        # read, batch insert, on_hand, ledger, received quantities, completed orders (2), plus the savepoint pair
+        with self.assertNumQueries(9):
+            result = receive_purchase_orders([big.id], expiry_date=datetime.date(2026, 1, 1))
+
+        self.assertEqual((result['batches'], result['completed_orders']), (100, [big.id]))
+        self.assertEqual(Product.objects.filter(pk__in=[p.pk for p in products], on_hand=3).count(), 100)
+
+    def test_open_orders_count_only_outstanding_units(self):
+        self.milk.reorder_level = 10
+        self.milk.save()
+        receive_purchase_orders(lines=[{'item_id': self.milk_line.id, 'quantity': 6}])
+
+        # 6 on hand and 4 still to arrive, so 10 more reach twice the reorder level
+        self.assertEqual(generate_purchase_orders(dry_run=True)['units'], 10)
+
+    def test_command_reads_delivery_lines(self):
+        out = StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as stream:
+            stream.write(f"item_id,quantity,expiry_date\n{self.rice_line.id},4,2025-10-01\n")
+            stream.flush()
+            call_command('receive_purchase_orders', '--lines', stream.name, stdout=out)
+
+        self.assertEqual(json.loads(out.getvalue())['units'], 4)
+        self.assertEqual(self.rice.stock_batches.get().expiry_date, datetime.date(2025, 10, 1))
+
+
+@skipUnless(np is not None, "needs NumPy")
+class ForecastTests(TestCase):
+
+    def setUp(self):
+        self.as_of = datetime.date(2026, 3, 29)  # a Sunday
+        self.start = self.as_of - datetime.timedelta(days=55)  # eight full weeks, Monday first
+        self.bread = Product.objects.create(
+            product_name='Bread', cost_price=Decimal('20.00'), selling_price=Decimal('30.00'), reorder_level=5,
+        )
+        self.salt = Product.objects.create(
+            product_name='Salt', cost_price=Decimal('10.00'), selling_price=Decimal('12.00'), reorder_level=3,
+        )
+        # ten a day on weekdays, thirty on Saturdays, none on Sundays
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(product=self.bread, date=day, units=30 if day.weekday() == 5 else 10)
+            for day in (self.start + datetime.timedelta(days=offset) for offset in range(56))
+            if day.weekday() != 6
+        ])
+
+    def test_weekday_factors_follow_the_sales_pattern(self):
+        matrix = np.array([[30.0 if day % 7 == 5 else 0.0 if day % 7 == 6 else 10.0 for day in range(56)]])
+
+        factors = seasonal_factors(matrix, self.start)[0]
+
+        self.assertAlmostEqual(factors.mean(), 1.0)
+        self.assertGreater(factors[5], 2 * factors[0])
+        self.assertLess(factors[6], factors[0])
+
+    @mock.patch('APP.forecasting.HISTORY_CHUNK_SIZE', 7)
+    def test_history_is_loaded_chunk_by_chunk(self):
+        make_product('Unsold')
+        DailyProductSales.objects.create(product=self.salt, date=self.as_of, units=2)
+
+        ids, matrix = load_history(self.start, self.as_of)
+
+        self.assertEqual(ids.tolist(), [self.bread.pk, self.salt.pk])
+        self.assertEqual(matrix.shape, (2, 56))
+        self.assertEqual(matrix[0].tolist(), [30.0 if day % 7 == 5 else 0.0 if day % 7 == 6 else 10.0 for day in range(56)])
+        self.assertEqual(matrix[1].tolist(), [0.0] * 55 + [2.0])
+
+    def test_reorder_level_covers_the_lead_time(self):
+        levels = suggest_reorder_levels(self.as_of, history_days=56, lead_time=7, service_level=0.95)
+
+        self.assertEqual(list(levels), [self.bread.pk])  # salt sold nothing
+        self.assertGreaterEqual(levels[self.bread.pk], 80)  # a week sells 80 units
+        self.assertLess(levels[self.bread.pk], 120)
+
+    def test_nothing_sold_means_nothing_to_forecast(self):
+        quiet_week = datetime.date(2020, 1, 5)
+
+        self.assertEqual(suggest_reorder_levels(quiet_week, history_days=56, processes=4), {})
+
+    def test_written_levels_leave_other_products_alone(self):
+        levels = suggest_reorder_levels(self.as_of, history_days=56)
+
+        self.assertEqual(write_reorder_levels(levels), 1)
+        self.bread.refresh_from_db()
+        self.salt.refresh_from_db()
+        self.assertEqual(self.bread.reorder_level, levels[self.bread.pk])
+        self.assertEqual(self.salt.reorder_level, 3)
+
+    def test_command_only_reports_without_write(self):
+        out = StringIO()
+        call_command('forecast_demand', '--as-of', '2026-03-29', '--days', '56', stdout=out, stderr=StringIO())
+
+        self.assertIn('Would update the reorder level of 1 product(s)', out.getvalue())
+        self.bread.refresh_from_db()
+        self.assertEqual(self.bread.reorder_level, 5)
+
+
+class CheckoutTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cashier')
+        self.client.force_login(self.user)
+
+    def post_basket(self, items):
+        return self.client.post(reverse('api-checkout'), json.dumps({'items': items}), content_type='application/json')
+
+    def test_basket_becomes_one_sale(self):
+        milk = make_product('Milk', cost='10.00', price='15.00')
+        bread = make_product('Bread', cost='20.00', price='30.00')
+        StockBatch.objects.create(product=milk, quantity=2, expiry_date=datetime.date(2030, 1, 1))
+        StockBatch.objects.create(product=milk, quantity=5, expiry_date=datetime.date(2030, 2, 1))
+        StockBatch.objects.create(product=bread, quantity=5)
+
+        response = self.post_basket([
+            {'product_id': milk.id, 'quantity': 3},
+            {'product_id': bread.id, 'quantity': 1},
+            {'product_id': milk.id, 'quantity': 1},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        sale = Sale.objects.get()
+        self.assertEqual(sale.total_amount, Decimal('90.00'))
+        self.assertEqual(sale.total_profit, Decimal('30.00'))
+        self.assertEqual(sale.items.count(), 2)
+        self.assertEqual(
+            list(milk.stock_batches.order_by('expiry_date').values_list('quantity', flat=True)),
+            [0, 3],
+        )
+        milk.refresh_from_db()
+        self.assertEqual(milk.on_hand, 3)
+        self.assertEqual(DailyProductSales.objects.get(product=milk).units, 4)
+
+    def test_lines_are_costed_at_the_batches_sold_from(self):
+        milk = make_product('Milk', cost='10.00', price='15.00')
+        StockBatch.objects.create(product=milk, quantity=2, unit_cost=Decimal('8.00'), expiry_date=datetime.date(2030, 1, 1))
+        StockBatch.objects.create(product=milk, quantity=5, expiry_date=datetime.date(2030, 2, 1))
+
+        self.post_basket([{'product_id': milk.id, 'quantity': 4}])
+
+        sale = Sale.objects.get()
+        self.assertEqual(sale.items.get().cost_at_sale, Decimal('9.00'))  # two at 8.00, two at the cost price
+        self.assertEqual(sale.total_profit, Decimal('24.00'))
+        self.assertEqual(DailyProductSales.objects.get(product=milk).cogs, Decimal('36.00'))
+
+    def test_short_basket_writes_nothing(self):
+        milk = make_product()
+        StockBatch.objects.create(product=milk, quantity=1)
+
+        response = self.post_basket([{'product_id': milk.id, 'quantity': 2}, {'product_id': 999, 'quantity': 1}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()['errors']), 2)
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(milk.stock_batches.get().quantity, 1)
+
+    def test_query_count_is_independent_of_basket_size(self):
+        products = [make_product(f'P{i}') for i in range(10)]
+        for product in products:
+            StockBatch.objects.create(product=product, quantity=5)
+
+        with self.assertNumQueries(12):  # the session and the user, then the sale
+            self.post_basket([{'product_id': product.id, 'quantity': 2} for product in products])
+
+    def test_requires_a_logged_in_user_and_the_csrf_token(self):
+        milk = make_product()
+        StockBatch.objects.create(product=milk, quantity=5)
+        body = json.dumps({'items': [{'product_id': milk.id, 'quantity': 1}]})
+        client = self.client_class(enforce_csrf_checks=True)
+
+        self.assertEqual(client.post(reverse('api-checkout'), body, content_type='application/json').status_code, 403)
+        client.force_login(self.user)
+        self.assertEqual(client.post(reverse('api-checkout'), body, content_type='application/json').status_code, 403)
+        client.get(reverse('ai-advisor'))  # any page with a form sets the CSRF cookie
+        response = client.post(
+            reverse('api-checkout'), body, content_type='application/json',
+            headers={'X-CSRFToken': client.cookies['csrftoken'].value},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Sale.objects.get().user, self.user)
+
+
+class TillSyncTests(TestCase):
+
+    def setUp(self):
+        self.milk = make_product('Milk', cost='10.00', price='15.00')
+        self.bread = make_product('Bread', cost='20.00', price='30.00')
+        StockBatch.objects.create(product=self.milk, quantity=5)
+        StockBatch.objects.create(product=self.bread, quantity=5)
+        self.client.force_login(User.objects.create_user('till-1'))
+
+    def upload(self, sales):
+        return self.client.post(reverse('api-till-sync'), json.dumps({'sales': sales}), content_type='application/json')
+
+    def test_offline_sales_are_booked_once(self):
+        sales = [
+            {'client_key': 'till-1-1', 'sold_at': '2026-01-05T09:30:00',
+             'items': [{'product_id': self.milk.id, 'quantity': 2}, {'product_id': self.bread.id, 'quantity': 1}]},
+            {'client_key': 'till-1-2', 'items': [{'product_id': self.milk.id, 'quantity': 1}]},
+        ]
+
+        first = self.upload(sales).json()
+        retry = self.upload(sales).json()
+
+        self.assertEqual([result['status'] for result in first['results']], ['created', 'created'])
+        self.assertEqual(
+            first['stock'],
+            {str(self.milk.id): {'delta': -3, 'on_hand': 2}, str(self.bread.id): {'delta': -1, 'on_hand': 4}},
+        )
+        self.assertEqual([result['status'] for result in retry['results']], ['duplicate', 'duplicate'])
+        self.assertEqual(
+            [result['sale_id'] for result in retry['results']], [result['sale_id'] for result in first['results']],
+        )
+        self.assertEqual(retry['stock'][str(self.milk.id)], {'delta': 0, 'on_hand': 2})
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertEqual(StockMovement.objects.filter(kind='sale').count(), 3)
+        self.assertEqual(
+            DailyProductSales.objects.get(product=self.bread).date, datetime.date(2026, 1, 5),
+        )
+
+    def test_requires_a_logged_in_user_and_the_csrf_token(self):
+        body = json.dumps({'sales': [{'client_key': 'a', 'items': [{'product_id': self.milk.id, 'quantity': 1}]}]})
+        client = self.client_class(enforce_csrf_checks=True)
+
+        self.assertEqual(client.post(reverse('api-till-sync'), body, content_type='application/json').status_code, 403)
+        client.force_login(User.objects.get(username='till-1'))
+        self.assertEqual(client.post(reverse('api-till-sync'), body, content_type='application/json').status_code, 403)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_short_sales_are_rejected_on_their_own(self):
+        response = self.upload([
+            {'client_key': 'a', 'items': [{'product_id': self.milk.id, 'quantity': 4}]},
+            {'client_key': 'b', 'items': [{'product_id': self.milk.id, 'quantity': 2}]},
+            {'client_key': 'c', 'items': [{'product_id': self.bread.id, 'quantity': 2}]},
+            {'client_key': 'a', 'items': [{'product_id': self.milk.id, 'quantity': 4}]},
+            {'items': []},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(
+            [result['status'] for result in results], ['created', 'rejected', 'created', 'duplicate', 'rejected'],
+        )
+        self.assertEqual(results[1]['errors'][0]['available'], 1)
+        self.assertEqual(results[3]['sale_id'], results[0]['sale_id'])
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.on_hand, 1)
+
+    def test_offline_sales_are_costed_at_the_batches_sold_from(self):
+        StockBatch.objects.create(
+            product=self.milk, quantity=3, unit_cost=Decimal('7.00'), expiry_date=datetime.date(2030, 1, 1),
+        )
+
+        self.upload([
+            {'client_key': 'a', 'items': [{'product_id': self.milk.id, 'quantity': 2}]},
+            {'client_key': 'b', 'items': [{'product_id': self.milk.id, 'quantity': 2}]},
+        ])
+
+        self.assertEqual(
+            list(SaleItem.objects.order_by('sale__client_key').values_list('cost_at_sale', flat=True)),
+            [Decimal('7.00'), Decimal('8.50')],  # the second sale gets the last 7.00 unit and one at 10.00
+        )
+        self.assertEqual(Sale.objects.get(client_key='b').total_profit, Decimal('13.00'))
+
+    @override_settings(TILL_SYNC={'CHUNK_SIZE': 100})
+    def test_query_count_is_independent_of_the_number_of_sales(self):
+        def sales(prefix, count):
+            return [
+                {'client_key': f'{prefix}-{i}', 'items': [{'product_id': self.milk.id, 'quantity': 1},
+                                                          {'product_id': self.bread.id, 'quantity': 1}]}
+                for i in range(count)
+            ]
+        StockBatch.objects.create(product=self.milk, quantity=100)
+        StockBatch.objects.create(product=self.bread, quantity=100)
+
+        with CaptureQueriesContext(connection) as few:
+            self.upload(sales('few', 2))
+        with CaptureQueriesContext(connection) as many:
+            self.upload(sales('many', 50))
+
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(Sale.objects.count(), 52)
+
+    @override_settings(TILL_SYNC={'MAX_SALES': 1})
+    def test_oversized_upload_is_refused(self):
+        response = self.upload([{'client_key': 'a', 'items': []}, {'client_key': 'b', 'items': []}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.upload('not a list').status_code, 400)
+
+
+class SellProductTests(TestCase):
+
+    def test_sale_spans_batches_in_expiry_order(self):
+        milk = make_product()
+        StockBatch.objects.create(product=milk, quantity=4, expiry_date=datetime.date(2030, 3, 1))
+        StockBatch.objects.create(product=milk, quantity=2, expiry_date=datetime.date(2030, 1, 1))
+        StockBatch.objects.create(product=milk, quantity=3)
+
+        response = self.client.post(reverse('sell-product-page', args=[milk.id]), {'quantity_sold': 5})
+
+        self.assertRedirects(response, reverse('dashboard-page'), fetch_redirect_response=False)
+        self.assertEqual(
+            list(milk.stock_batches.order_by('id').values_list('quantity', flat=True)),
+            [1, 0, 3],
+        )
+
+    def test_short_sale_is_rejected(self):
+        milk = make_product()
+        StockBatch.objects.create(product=milk, quantity=2)
+
+        response = self.client.post(reverse('sell-product-page', args=[milk.id]), {'quantity_sold': 3})
+
+        self.assertEqual(response.context['error_message'], "Not enough stock. Available: 2")
+        self.assertFalse(Sale.objects.exists())
+
+
+class ConcurrentSaleTests(TransactionTestCase):
+    """Many tills selling the same product at once must never oversell or lose a decrement."""
+
+    threads = 6
+    sales_per_thread = 10
+
+    def test_parallel_sales_never_oversell(self):
+        milk = make_product()
+        for _ in range(3):
+            StockBatch.objects.create(product=milk, quantity=15)
+        initial_stock = 45
+        sold = []
+        start = threading.Barrier(self.threads)
+
+        def till():
+            start.wait()
+            try:
+                for _ in range(self.sales_per_thread):
+                    # a till retries while another one holds the database write lock
+                    for _ in range(200):
+                        try:
+                            record_sale([{'product_id': milk.id, 'quantity': 1}])
+                            sold.append(1)
+                            break
+                        except SaleError:
+                            break
+                        except OperationalError:
+                            time.sleep(0.001)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=till) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        remaining = sum(milk.stock_batches.values_list('quantity', flat=True))
+        milk.refresh_from_db()
+        self.assertGreater(len(sold), 0)
+        self.assertLessEqual(len(sold), initial_stock)
+        self.assertGreaterEqual(remaining, 0)
+        self.assertEqual(remaining + len(sold), initial_stock)
+        self.assertEqual(milk.on_hand, remaining)
+        self.assertEqual(SaleItem.objects.count(), len(sold))
+
+
+@skipUnless(connection.features.has_select_for_update_skip_locked, "needs SELECT ... FOR UPDATE SKIP LOCKED")
+class SkipLockedAllocationTests(TransactionTestCase):
+
+    def test_sale_skips_a_batch_another_till_holds(self):
+        milk = make_product()
+        first = StockBatch.objects.create(product=milk, quantity=5, expiry_date=datetime.date(2030, 1, 1))
+        second = StockBatch.objects.create(product=milk, quantity=5, expiry_date=datetime.date(2030, 6, 1))
+        locked = threading.Event()
+        release = threading.Event()
+
+        def other_till():
+            try:
+                with transaction.atomic():
+                    list(StockBatch.objects.select_for_update().filter(pk=first.pk))
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=other_till)
+        holder.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            record_sale([{'product_id': milk.id, 'quantity': 2}])
+        finally:
+            release.set()
+            holder.join()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.quantity, second.quantity), (5, 3))
+
+
+class BarcodeCacheTests(TestCase):
+
+    def setUp(self):
+        get_barcode_cache().clear()
+        self.milk = make_product(barcode='111')
+        StockBatch.objects.create(product=self.milk, quantity=5)
+
+    def scan(self, barcode):
+        return self.client.get(reverse('api-scan-product', args=[barcode])).json()
+
+    def test_repeated_scans_are_served_from_cache(self):
+        self.assertEqual(self.scan('111')['available_stock_in_batch'], 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.scan('111')['status'], 'found')
+
+    def test_unknown_barcodes_are_cached_until_the_product_is_added(self):
+        self.assertEqual(self.scan('222')['status'], 'not_found')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.scan('222')['status'], 'not_found')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_product('Bread', barcode='222')
+        self.assertEqual(self.scan('222')['status'], 'not_in_stock')
+
+    def test_stock_changes_invalidate_the_entry(self):
+        self.scan('111')
+        with self.captureOnCommitCallbacks(execute=True):
+            record_sale([{'product_id': self.milk.id, 'quantity': 5}])
+        self.assertEqual(self.scan('111')['status'], 'not_in_stock')
+
+    @override_settings(BARCODE_CACHE={'MAX_SIZE': 4})
+    def test_stock_changes_invalidate_the_entry_under_eviction_pressure(self):
+        for barcode in ('201', '202', '203', '204'):
+            StockBatch.objects.create(product=make_product(barcode=barcode), quantity=1)
+        self.scan('111')
+        for barcode in ('201', '202', '203', '204'):
+            self.scan('111')  # the hot barcode stays cached while the others come and go
+            self.scan(barcode)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record_sale([{'product_id': self.milk.id, 'quantity': 3}])
+
+        self.assertEqual(self.scan('111')['available_stock_in_batch'], 2)
+
+    def test_expiry_changes_invalidate_the_entry(self):
+        StockBatch.objects.create(product=self.milk, quantity=2, expiry_date=datetime.date(2030, 1, 1))
+        self.assertEqual(self.scan('111')['available_stock_in_batch'], 2)
+
+        batch = StockBatch.objects.get(product=self.milk, expiry_date=None)
+        batch.expiry_date = datetime.date(2029, 1, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            batch.save()
+        self.assertEqual(self.scan('111')['available_stock_in_batch'], 5)
+
+    @override_settings(
+        BARCODE_CACHE={'BACKEND': 'django'},
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'barcode-tests'}},
+    )
+    def test_clearing_the_django_backend_leaves_other_entries_alone(self):
+        caches['default'].set('unrelated', 'kept')
+        self.scan('111')
+        with self.assertNumQueries(0):
+            self.scan('111')
+
+        get_barcode_cache().clear()
+
+        self.assertEqual(caches['default'].get('unrelated'), 'kept')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.scan('111')['status'], 'found')
+
+    def test_barcode_change_invalidates_the_old_barcode(self):
+        self.scan('111')
+        product = Product.objects.get(pk=self.milk.pk)
+        product.barcode = '333'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(self.scan('111')['status'], 'not_found')
+        self.assertEqual(self.scan('333')['status'], 'found')
+
+    def test_lru_is_bounded_and_expires(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('b'), MISSING)
+        self.assertEqual(cache.get('a'), 1)
+
+        expired = LRUCache(max_size=2, ttl=-1)
+        expired.set('a', 1)
+        self.assertEqual(expired.get('a'), MISSING)
+
+    async def test_async_scan_views_share_the_cache(self):
+        response = await self.async_client.get(reverse('api-scan-product', args=['111']))
+        self.assertEqual(response.json()['available_stock_in_batch'], 5)
+
+        # a queryset update sends no signals, so a cached entry keeps the old name
+        await Product.objects.filter(pk=self.milk.pk).aupdate(product_name='Renamed')
+        response = await self.async_client.get(reverse('api-scan-product', args=['111']))
+        self.assertEqual(response.json()['name'], 'Milk')
+
+        response = await self.async_client.post(
+            reverse('scan-barcode-api'), {'barcode': '111'}, content_type='application/json'
+        )
+        self.assertEqual(response.json()['redirect_url'], reverse('sell-product-page', args=[self.milk.id]))
+
+        summaries = await get_barcode_cache().aget_many(['111', '999'])
+        self.assertIsNone(summaries['999'])
+        self.assertEqual(summaries['111']['product_id'], self.milk.id)
+
+
+class BulkScanTests(TestCase):
+
+    def setUp(self):
+        get_barcode_cache().clear()
+
+    def test_bulk_scan_matches_single_scan_payloads(self):
+        milk = make_product('Milk', barcode='111')
+        make_product('Bread', barcode='222')
+        StockBatch.objects.create(product=milk, quantity=4, expiry_date=datetime.date(2030, 1, 1))
+        barcodes = ['111', '222', '999', '111']
+
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                reverse('api-scan-bulk'), json.dumps({'barcodes': barcodes}), content_type='application/json'
+            )
+
+        results = response.json()['results']
+        self.assertEqual([result['barcode'] for result in results], barcodes)
+        self.assertEqual([result['status'] for result in results], ['found', 'not_in_stock', 'not_found', 'found'])
+        single = self.client.get(reverse('api-scan-product', args=['111'])).json()
+        self.assertEqual({key: value for key, value in results[0].items() if key != 'barcode'}, single)
+
+    def test_rejects_non_list(self):
+        response = self.client.post(
+            reverse('api-scan-bulk'), json.dumps({'barcodes': '111'}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('manager', is_staff=True))
+
+    def test_streams_csv_and_ndjson(self):
+        milk = make_product(barcode='111')
+        make_sale(milk, 2)
+        make_sale(milk, 1)
+        today = timezone.localdate().isoformat()
+
+        response = self.client.get(reverse('api-export', args=['sale-items']), {'start': today, 'end': today})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,sale_id,sale__sale_timestamp,product_id,product__barcode,quantity,price_at_sale,cost_at_sale')
+        self.assertEqual(len(lines), 3)
+
+        response = self.client.get(reverse('api-export', args=['sales']), {'format': 'ndjson', 'end': '2000-01-01'})
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+    def test_command_writes_export(self):
+        milk = make_product(barcode='111')
+        StockBatch.objects.create(product=milk, quantity=3)
+        out = StringIO()
+        call_command('export_data', 'stock-batches', '--format', 'ndjson', stdout=out)
+        row = json.loads(out.getvalue())
+        self.assertEqual((row['product__barcode'], row['quantity']), ('111', 3))
+
+    def test_unknown_dataset(self):
+        self.assertEqual(self.client.get(reverse('api-export', args=['users'])).status_code, 404)
+
+    def test_staff_only(self):
+        self.client.force_login(User.objects.create_user('cashier'))
+        self.assertEqual(self.client.get(reverse('api-export', args=['sales'])).status_code, 403)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api-export', args=['sales'])).status_code, 403)
+
+
+class ImportTests(TestCase):
+
+    CSV = (
+        "barcode,product_name,cost_price,selling_price,reorder_level,quantity,expiry_date\n"
+        "111,Milk,10,15,5,20,2030-01-01\n"
+        "222,Bread,abc,30,0,5,\n"
+        "333,Eggs,4.5,6,0,0,\n"
+        "111,Milk 1L,11,16,5,4,2030-02-01\n"
+    )
+
+    def test_import_upserts_products_and_creates_batches(self):
+        make_product('Old eggs', barcode='333', cost='1.00', price='2.00')
+
+        report = import_rows(read_rows(StringIO(self.CSV), 'csv'), chunk_size=2)
+
+        self.assertEqual(report.as_dict(), {
+            'rows': 4,
+            'products_created': 1,
+            'products_updated': 2,  # Eggs, and Milk again in the second chunk
+            'batches_created': 2,
+            'error_count': 1,
+            'errors': [{'row': 2, 'message': "'cost_price' must be a number."}],
+        })
+        milk = Product.objects.get(barcode='111')
+        self.assertEqual((milk.product_name, milk.cost_price, milk.on_hand), ('Milk 1L', Decimal('11.00'), 24))
+        self.assertEqual(Product.objects.get(barcode='333').product_name, 'Eggs')
+        self.assertFalse(Product.objects.filter(barcode='222').exists())
+
+    def test_partial_sheet_leaves_missing_columns_alone(self):
+        milk = make_product('Milk', barcode='111', reorder_level=8)
+        Product.objects.filter(pk=milk.pk).update(description='Whole milk', supplier_info='Dairy Co')
+        sheet = "barcode,product_name,cost_price,selling_price,reorder_level,quantity\n111,Milk,11,16,,6\n"
+
+        report = import_rows(read_rows(StringIO(sheet), 'csv'))
+
+        self.assertEqual(report.as_dict()['products_updated'], 1)
+        milk.refresh_from_db()
+        self.assertEqual(
+            (milk.cost_price, milk.reorder_level, milk.description, milk.supplier_info, milk.on_hand),
+            (Decimal('11.00'), 8, 'Whole milk', 'Dairy Co', 6),
+        )
+
+    def test_values_the_columns_cannot_hold_fail_their_own_row(self):
+        rows = [
+            {'barcode': '111', 'product_name': 'x' * 256, 'cost_price': 1, 'selling_price': 2},
+            {'barcode': '2' * 256, 'product_name': 'Bread', 'cost_price': 1, 'selling_price': 2},
+            {'barcode': '333', 'product_name': 'Eggs', 'cost_price': 1, 'selling_price': 2, 'supplier_info': 'y' * 256},
+            {'barcode': '444', 'product_name': 'Rice', 'cost_price': '100000000', 'selling_price': 2},
+            {'barcode': '555', 'product_name': 'Oil', 'cost_price': 1, 'selling_price': '99999999.999'},
+            {'barcode': '666', 'product_name': 'Salt', 'cost_price': '1e30', 'selling_price': 2},
+            {'barcode': '777', 'product_name': 'Tea', 'cost_price': 'NaN', 'selling_price': 2},
+            {'barcode': '888', 'product_name': 'Sugar', 'cost_price': '99999999.99', 'selling_price': 2},
+        ]
+
+        report = import_rows(rows)
+
+        self.assertEqual([error['row'] for error in report.errors], [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(report.errors[0]['message'], "'product_name' cannot be longer than 255 characters.")
+        self.assertEqual(report.errors[3]['message'], "'cost_price' must be less than 100000000.")
+        self.assertEqual(list(Product.objects.values_list('barcode', 'cost_price')), [('888', Decimal('99999999.99'))])
+
+    def test_import_drops_cached_advisor_pages(self):
+        get_advisor_cache().invalidate()
+        milk = make_product('Milk', barcode='111', reorder_level=10)
+        StockBatch.objects.create(product=milk, quantity=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_alerts(('reorder',))
+        self.assertEqual(get_advisor_cache().page('reorder')['items'][0]['reorder_level'], 10)
+
+        sheet = "barcode,product_name,cost_price,selling_price,reorder_level\n111,Milk,10,15,12\n"
+        with self.captureOnCommitCallbacks(execute=True):
+            import_rows(read_rows(StringIO(sheet), 'csv'))
+
+        self.assertEqual(get_advisor_cache().page('reorder')['items'][0]['reorder_level'], 12)
+
+    def test_malformed_csv_lines_are_reported(self):
+        sheet = (
+            "barcode,product_name,cost_price,selling_price\n"
+            f"111,{'x' * 200000},1,2\n"
+            "222,Bread,1,2\n"
+        )
+
+        report = import_rows(read_rows(StringIO(sheet), 'csv'))
+
+        self.assertEqual(report.products_created, 1)
+        self.assertEqual(report.errors[0]['row'], 1)
+        self.assertTrue(report.errors[0]['message'].startswith('Line is not valid CSV'))
+
+    def test_upload_endpoint_reports_bad_lines(self):
+        body = b'{"barcode": "111", "product_name": "Milk", "cost_price": 1, "selling_price": 2}\nnot json\n'
+        upload = SimpleUploadedFile('catalog.ndjson', body)
+        self.client.force_login(User.objects.create_user('manager', is_staff=True))
+
+        response = self.client.post(reverse('api-import'), {'file': upload})
+
+        data = response.json()
+        self.assertEqual(data['products_created'], 1)
+        self.assertEqual(data['errors'], [{'row': 2, 'message': 'Line is not valid JSON.'}])
+
+
+    def test_upload_endpoint_is_staff_only(self):
+        upload = SimpleUploadedFile('catalog.csv', self.CSV.encode())
+        self.client.force_login(User.objects.create_user('cashier'))
+
+        self.assertEqual(self.client.post(reverse('api-import'), {'file': upload}).status_code, 403)
+
+        client = self.client_class(enforce_csrf_checks=True)
+        client.force_login(User.objects.create_user('manager', is_staff=True))
+        self.assertEqual(client.post(reverse('api-import'), {'file': upload}).status_code, 403)
+        self.assertFalse(Product.objects.exists())
+
+
+class BenchmarkSuiteTests(TestCase):
+
+    def test_tiny_run_covers_every_endpoint(self):
+        scale = {'products': 20, 'batches_per_product': 2, 'sales': 50, 'days': 10}
+
+        results = run_benchmarks('tiny', scale, repeat=3)
+
+        self.assertEqual([row['endpoint'] for row in results], list(ENDPOINTS))
+        for row in results:
+            self.assertLessEqual(row['p50_ms'], row['p90_ms'])
+            self.assertLessEqual(row['p90_ms'], row['max_ms'])
+        # the generated history is spread over past days, not just today
+        self.assertTrue(Sale.objects.filter(sale_timestamp__date__lt=timezone.localdate()).exists())
+
+    def test_compare_flags_slowdowns_and_extra_queries(self):
+        baseline = [{'scale': 's', 'endpoint': 'a', 'p50_ms': 10, 'p90_ms': 10, 'queries': 3}]
+        current = [{'scale': 's', 'endpoint': 'a', 'p50_ms': 10.5, 'p90_ms': 11, 'queries': 4}]
+
+        comparison = compare_results(baseline, current)
+
+        self.assertEqual(comparison[0]['query_delta'], 1)
+        self.assertTrue(comparison[0]['regression'])
+
+
+@override_settings(DEBUG=True, REQUEST_METRICS={'ENABLED': True, 'SAMPLE_RATE': 1.0, 'N_PLUS_ONE_THRESHOLD': 3})
+class RequestMetricsTests(TestCase):
+
+    def setUp(self):
+        metrics.clear()
+
+    def test_records_wall_time_and_queries_per_view(self):
+        self.client.get(reverse('finance-tracker'))
+        self.client.get(reverse('finance-tracker'))
+
+        views = self.client.get(reverse('api-metrics')).json()['views']
+
+        finance = views['finance-tracker']
+        self.assertEqual(finance['samples'], 2)
+        self.assertEqual(finance['queries'], {'p50': 4, 'max': 4})
+        self.assertGreater(finance['wall_ms']['p50'], 0)
+        self.assertEqual(finance['n_plus_one'], [])
+
+    def test_flags_repeated_statements(self):
+        def view(request):
+            for product_id in range(5):
+                Product.objects.filter(pk=product_id).exists()
+            return HttpResponse()
+
+        RequestMetricsMiddleware(view)(RequestFactory().get('/per-item-queries/'))
+
+        summary = metrics.summary()['<unresolved>']
+        self.assertEqual(summary['queries']['max'], 5)
+        self.assertEqual(len(summary['n_plus_one']), 1)
+
+    def test_unresolved_paths_share_one_entry(self):
+        for path in ('/wp-login.php', '/.env', '/admin.php'):
+            self.client.get(path)
+
+        self.assertEqual(list(metrics.summary()), ['<unresolved>'])
+        self.assertEqual(metrics.summary()['<unresolved>']['samples'], 3)
+
+    async def test_async_views_are_measured_without_a_thread_hop(self):
+        await self.async_client.get(reverse('generate-ai-summary'))
+
+        self.assertEqual(metrics.summary()['generate-ai-summary']['samples'], 1)
+        self.assertTrue(RequestMetricsMiddleware(self.async_view).async_mode)
+
+    @staticmethod
+    async def async_view(request):
+        return HttpResponse()
+
+    async def test_async_views_count_queries_run_by_the_async_orm(self):
+        get_barcode_cache().clear()
+
+        await self.async_client.get(reverse('api-scan-product', args=['111']))
+
+        scan = metrics.summary()['api-scan-product']
+        self.assertEqual(scan['queries']['max'], 1)
+        self.assertGreater(scan['db_ms']['p50'], 0)
+
+    @override_settings(REQUEST_METRICS={'ENABLED': True, 'SAMPLE_RATE': 0.0})
+    def test_unsampled_requests_are_not_recorded(self):
+        self.client.get(reverse('finance-tracker'))
+        self.assertEqual(metrics.summary(), {})
+
+    @override_settings(DEBUG=False)
+    def test_metrics_endpoint_is_internal(self):
+        self.assertEqual(self.client.get(reverse('api-metrics')).status_code, 403)
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN output is checked in SQLite's format")
+class QueryPlanTests(TestCase):
+    """The hot queries behind the views must be answered from an index, not a table scan."""
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'INDEX {index}', plan)
+        for line in plan.splitlines():
+            if ' SCAN ' in f' {line} ':
+                self.assertIn('USING', line, f"Table scan in plan:\n{plan}")
+
+    def test_finance_range_queries(self):
+        today = timezone.localdate()
+        self.assertUsesIndex(sales_in_range(today, today), 'sale_timestamp_idx')
+        self.assertUsesIndex(daily_sales_in_range(today, today), 'sqlite_autoindex_APP_dailyproductsales_1')
+
+    def test_sellable_batch_lookup(self):
+        queryset = StockBatch.objects.filter(product_id__in=[1, 2], quantity__gt=0).order_by(
+            'product_id', F('expiry_date').asc(nulls_last=True), 'id'
+        )
+        self.assertUsesIndex(queryset, 'stockbatch_sellable_idx')
+        self.assertUsesIndex(
+            StockBatch.objects.filter(product_id=1, quantity__gt=0).order_by('expiry_date'),
+            'stockbatch_sellable_idx',
+        )
+
+    def test_waste_lookup(self):
+        self.assertUsesIndex(
+            StockBatch.objects.filter(expiry_date__lte=timezone.localdate(), quantity__gt=0),
+            'stockbatch_expiry_idx',
+        )
+
+    def test_sale_item_lookup(self):
+        self.assertUsesIndex(SaleItem.objects.filter(sale_id=1, product_id=1), 'saleitem_sale_product_idx')
+
+    def test_alert_and_reorder_lookups(self):
+        self.assertUsesIndex(
+            Alert.objects.filter(is_viewed=False).order_by('alert_type', 'created_at', 'id'),
+            'alert_unviewed_type_idx',
+        )
+        self.assertUsesIndex(
+            Alert.objects.filter(alert_type='trend', is_viewed=False).order_by('-created_at'),
+            'alert_unviewed_type_idx',
+        )
+        self.assertUsesIndex(products_below_reorder_level(), 'product_below_reorder_idx')
+
+
+@skipUnless(connection.vendor == 'sqlite', "SQLite connection tuning")
+class SQLiteProfileTests(TransactionTestCase):
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234, 'cache_size': -2000})
+    def test_new_connections_get_the_configured_pragmas(self):
+        fresh = connections.create_connection('default')
+        try:
+            with fresh.cursor() as cursor:
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertEqual(cursor.fetchone()[0], 1234)
+                cursor.execute('PRAGMA cache_size')
+                self.assertEqual(cursor.fetchone()[0], -2000)
+        finally:
+            fresh.close()
+
+    def test_sales_take_the_write_lock_up_front(self):
+        milk = make_product()
+        StockBatch.objects.create(product=milk, quantity=5)
+
+        with CaptureQueriesContext(connection) as captured:
+            record_sale([{'product_id': milk.id, 'quantity': 1}])
+
+        self.assertEqual(captured.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+        self.assertIsNone(connection.transaction_mode)
+
+    def test_nested_write_blocks_use_savepoints(self):
+        with CaptureQueriesContext(connection) as captured:
+            with write_atomic():
+                with write_atomic():
+                    Product.objects.exists()
+
+        statements = [query['sql'] for query in captured.captured_queries]
+        self.assertEqual(statements.count('BEGIN IMMEDIATE'), 1)
+        self.assertTrue(any(sql.startswith('SAVEPOINT') for sql in statements))
+
+
+def completion(method, path, body):
+    prompt = json.loads(body)['messages'][1]['content']
+    return 200, {'choices': [{'message': {'content': f'Advice for {len(prompt)} chars'}}]}
+
+
+class LLMProxyTests(TestCase):
+    payload = {'waste_data': [], 'reorder_data': [{'name': 'Milk', 'current_stock': 1}], 'trend_data': []}
+
+    def settings_for(self, stub, **options):
+        return override_settings(LLM_PROXY={
+            'API_URL': f'{stub.url}/openai/v1/chat/completions', 'API_KEY': 'test-key',
+            'READ_TIMEOUT': 2, **options,
+        })
+
+    def summarize(self, payload=None):
+        return self.client.post(reverse('generate-ai-summary'), payload or {}, content_type='application/json')
+
+    def test_identical_alerts_are_served_from_cache(self):
+        milk = make_product('Milk', reorder_level=5)
+        StockBatch.objects.create(product=milk, quantity=1)
+        refresh_alerts()
+
+        with StubServer(completion) as stub, self.settings_for(stub):
+            first = self.summarize().json()
+            second = self.summarize().json()
+            make_product('Bread', reorder_level=5)
+            refresh_alerts()
+            other = self.summarize().json()
+
+        self.assertEqual((first['source'], first['cached'], second['cached'], other['cached']), ('llm', False, True, False))
+        self.assertEqual(first['summary'], second['summary'])
+        self.assertEqual(len(stub.requests), 2)
+        request_body = json.loads(stub.requests[0][2])
+        self.assertIn('Milk (only 1 left)', request_body['messages'][1]['content'])
+
+    def test_client_payloads_are_ignored(self):
+        with StubServer(completion) as stub, self.settings_for(stub):
+            self.summarize(self.payload)
+            self.summarize({**self.payload, 'trend_data': [{'product_name': 'Bread'}]})
+
+        self.assertEqual(len(stub.requests), 1)
+        self.assertNotIn('Milk', json.loads(stub.requests[0][2])['messages'][1]['content'])
+
+    @override_settings(LLM_PROXY={'API_KEY': None})
+    def test_requires_the_csrf_token(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        self.assertEqual(client.post(reverse('generate-ai-summary'), {}, content_type='application/json').status_code, 403)
+
+    def test_concurrent_identical_requests_share_one_upstream_call(self):
+        with StubServer(completion, delay=0.3) as stub, self.settings_for(stub):
+            service = get_summary_service()
+            payload = {key: self.payload.get(key, []) for key in ('waste_data', 'reorder_data', 'trend_data')}
+            with ThreadPoolExecutor(max_workers=5) as pool:
+                results = list(pool.map(lambda _: service.summarize(payload), range(5)))
+
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(len({summary for summary, _ in results}), 1)
+        self.assertEqual(sorted(cached for _, cached in results), [False, True, True, True, True])
+
+    def test_upstream_errors_and_timeouts_are_not_cached(self):
+        with StubServer(lambda *args: (429, {'error': {'message': 'Rate limited'}})) as stub, self.settings_for(stub):
+            response = self.summarize()
+            self.assertEqual(response.status_code, 502)
+            self.assertIn('Rate limited', response.json()['message'])
+            self.assertEqual(self.summarize().status_code, 502)
+        self.assertEqual(len(stub.requests), 2)
+
+        with StubServer(completion, delay=1) as stub, self.settings_for(stub, READ_TIMEOUT=0.2):
+            self.assertEqual(self.summarize().status_code, 504)
+
+    def test_pool_reuses_connections(self):
+        with StubServer(completion) as stub:
+            pool = ConnectionPool(max_idle=2, connect_timeout=1, read_timeout=1)
+            body = json.dumps({'messages': [{}, {'content': 'hi'}]}).encode()
+            for _ in range(3):
+                status, _ = pool.request('POST', f'{stub.url}/v1', body, {'Content-Type': 'application/json'})
+                self.assertEqual(status, 200)
+            idle = list(pool._idle.values())[0]
+            self.assertEqual(idle.qsize(), 1)
+            pool.close()
+
+    @override_settings(LLM_PROXY={'API_KEY': None})
+    def test_without_a_key_the_rule_based_summary_is_used(self):
+        make_product('Milk', reorder_level=5)
+        refresh_alerts()
+
+        response = self.client.post(reverse('generate-ai-summary'), {}, content_type='application/json')
+
+        self.assertEqual(response.json()['source'], 'rules')
+        self.assertIn("restocking 'Milk'", response.json()['summary'])
+
+    @override_settings(GROQ_API_KEY='secret-test-key', LLM_PROXY={'API_KEY': 'secret-test-key'})
+    def test_advisor_page_does_not_expose_the_key(self):
+        response = self.client.get(reverse('ai-advisor'))
+        self.assertNotContains(response, 'secret-test-key')
+        self.assertContains(response, reverse('generate-ai-summary'))
+
+
+def product_database(known):
+    """A stub OpenFoodFacts-style source that knows the barcodes in `known` ({barcode: product name})."""
+    def respond(method, path, body):
+        barcode = path.rsplit('/', 1)[-1].removesuffix('.json')
+        if barcode in known:
+            return 200, {'status': 1, 'product': {'product_name': known[barcode], 'brands': 'Acme', 'quantity': '500 g'}}
+        return 200, {'status': 0, 'status_verbose': 'product not found'}
+    return respond
+
+
+class ProductLookupTests(TestCase):
+
+    def settings_for(self, food, pet, **options):
+        return override_settings(PRODUCT_LOOKUP={
+            'SOURCES': {'openfoodfacts': food.url, 'openpetfoodfacts': pet.url}, 'READ_TIMEOUT': 2, **options,
+        })
+
+    def lookup(self, barcode):
+        return self.client.get(reverse('api-product-info', args=[barcode]))
+
+    def test_sources_are_queried_in_parallel_and_hits_cached(self):
+        with StubServer(product_database({}), delay=0.3) as food, \
+                StubServer(product_database({'111': 'Dog Biscuits'}), delay=0.3) as pet, \
+                self.settings_for(food, pet):
+            started = time.perf_counter()
+            first = self.lookup('111')
+            elapsed = time.perf_counter() - started
+            with self.assertNumQueries(1):
+                second = self.lookup('111')
+
+        self.assertLess(elapsed, 0.55)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first.json()['status'], 'found')
+        self.assertEqual(first.json()['source'], 'openpetfoodfacts')
+        self.assertEqual(first.json()['product']['type'], 'pet-food')
+        self.assertEqual(first.json()['product']['name'], 'Dog Biscuits')
+        self.assertEqual((len(food.requests), len(pet.requests)), (1, 1))
+        self.assertEqual(food.requests[0][1], '/api/v0/product/111.json')
+
+    def test_misses_are_cached_until_they_expire(self):
+        with StubServer(product_database({})) as food, StubServer(product_database({})) as pet, \
+                self.settings_for(food, pet):
+            self.assertEqual(self.lookup('222').json()['status'], 'not_found')
+            self.assertEqual(self.lookup('222').json()['status'], 'not_found')
+            self.assertEqual(len(food.requests), 1)
+
+            ProductLookup.objects.update(fetched_at=timezone.now() - datetime.timedelta(days=2))
+            self.lookup('222')
+            self.assertEqual(len(food.requests), 2)
+
+    def test_failures_are_not_cached(self):
+        with StubServer(lambda *args: (503, {})) as food, StubServer(product_database({})) as pet, \
+                self.settings_for(food, pet):
+            response = self.lookup('333')
+            self.assertEqual(response.status_code, 502)
+            self.assertIn('openfoodfacts returned HTTP 503', response.json()['message'])
+            self.lookup('333')
+
+        self.assertEqual(len(food.requests), 2)
+        self.assertFalse(ProductLookup.objects.exists())
+
+    def test_bulk_lookup_reads_the_table_once_and_fetches_the_rest(self):
+        ProductLookup.objects.create(barcode='444', found=False, fetched_at=timezone.now())
+        with StubServer(product_database({'555': 'Oats', '666': 'Rice'})) as food, \
+                StubServer(product_database({})) as pet, self.settings_for(food, pet):
+            response = self.client.post(
+                reverse('api-product-info-bulk'), {'barcodes': ['555', '444', '666']}, content_type='application/json'
+            )
+
+        results = response.json()['results']
+        self.assertEqual([result['barcode'] for result in results], ['555', '444', '666'])
+        self.assertEqual([result['status'] for result in results], ['found', 'not_found', 'found'])
+        self.assertEqual(len(food.requests), 2)
+        self.assertEqual(ProductLookup.objects.filter(found=True).count(), 2)
+
+    @override_settings(PRODUCT_LOOKUP={'MAX_BATCH': 2})
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.lookup('12$34').status_code, 400)
+        for barcodes in (['1', '2', '3'], '123', [123]):
+            response = self.client.post(
+                reverse('api-product-info-bulk'), {'barcodes': barcodes}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
@@ -0,0 +1,281 @@
+# APP/till_sync.py
+"""
+Uploading sales that tills recorded while offline.
+
+A till that loses its connection keeps selling and queues every sale
+with a client-generated idempotency key. Once it is back online it
+uploads the whole queue in one request (or a few), and `sync_sales`
+applies it in chunks of CHUNK_SIZE sales. Each chunk is one transaction
+with a fixed number of statements, however many sales it holds: the
+keys are checked in one query, products and batches are read once, the
+stock comes out in one conditional UPDATE, and the sales, their items,
+the daily rollup and the ledger are each written in bulk. A failed
+chunk leaves the chunks before it in place, and uploading it again is
+safe.
+
+Every sale gets a result, in upload order:
+
+- 'created' with the new sale id;
+- 'duplicate' with the original sale id, when the key was uploaded
+  before (a retried request never books a sale twice);
+- 'rejected' with errors, e.g. a line short of stock. The other sales
+  of the chunk still go through.
+
+Sales are allocated stock in upload order, first-expiry-first-out, and
+keep their `sold_at` time so they are reported on the day they happened
+(a time in the future is booked as now). The response also lists, for
+each product in the upload, the change this upload made to its stock
+and the resulting on-hand count, so the till can correct its local copy.
+
+Configured with settings.TILL_SYNC:
+
+    TILL_SYNC = {
+        'MAX_SALES': 5000,    # per request
+        'CHUNK_SIZE': 200,    # sales per transaction
+    }
+"""
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .db import write_atomic
+from .models import DailyProductSales, Product, Sale, SaleItem, StockMovement
+from .sales import (
+    SaleError, StockConflict, allocate, allocation_cost, available_batches, merge_lines, take_stock,
+)
+
+
+DEFAULTS = {
+    'MAX_SALES': 5000,
+    'CHUNK_SIZE': 200,
+}
+ATTEMPTS = 5
+BATCH_SIZE = 1000
+KEY_LENGTH = 64
+
+UploadedSale = namedtuple('UploadedSale', 'index client_key quantities sold_at')
+
+
+def sync_options():
+    return {**DEFAULTS, **getattr(settings, 'TILL_SYNC', {})}
+
+
+def parse_sale(index, sale, now):
+    """
+    Validates one uploaded sale ({'client_key', 'items', 'sold_at'}) into an
+    UploadedSale. Raises SaleError for a malformed sale.
+    """
+    if not isinstance(sale, dict):
+        raise SaleError("Each sale must be an object.")
+    client_key = sale.get('client_key')
+    if not isinstance(client_key, str) or not 0 < len(client_key) <= KEY_LENGTH:
+        raise SaleError(f"Each sale needs a client_key of 1 to {KEY_LENGTH} characters.")
+    if not isinstance(sale.get('items'), list):
+        raise SaleError("Expected a list of items.")
+    quantities = merge_lines(sale['items'])
+
+    sold_at = now
+    if sale.get('sold_at') is not None:
+        try:
+            sold_at = parse_datetime(str(sale['sold_at']))
+        except ValueError:
+            sold_at = None
+        if sold_at is None:
+            raise SaleError("'sold_at' must be an ISO 8601 date and time.")
+        if timezone.is_naive(sold_at):
+            sold_at = timezone.make_aware(sold_at)
+    return UploadedSale(index, client_key, quantities, min(sold_at, now))
+
+
+def _rejected(client_key, error):
+    return {'client_key': client_key, 'status': 'rejected', 'message': str(error), 'errors': error.errors}
+
+
+def _sync_chunk(chunk, user):
+    """
+    Books one chunk of UploadedSales in a single transaction. Returns
+    ({index: result}, {product_id: stock delta}). Raises StockConflict if
+    another transaction took the same batches first.
+    """
+    results = {}
+    with write_atomic():
+        existing = dict(
+            Sale.objects.filter(client_key__in=[sale.client_key for sale in chunk]).values_list('client_key', 'id')
+        )
+        pending = []
+        for sale in chunk:
+            if sale.client_key in existing:
+                results[sale.index] = {
+                    'client_key': sale.client_key, 'status': 'duplicate', 'sale_id': existing[sale.client_key],
+                }
+            else:
+                pending.append(sale)
+
+        product_ids = sorted({product_id for sale in pending for product_id in sale.quantities})
+        products = Product.objects.in_bulk(product_ids)
+        batches = available_batches([product_id for product_id in product_ids if product_id in products], lock=True)
+
+        # Stock is handed out in upload order, in memory; the sales that get
+        # all their lines are then applied together
+        accepted = []
+        for sale in pending:
+            errors = []
+            allocations = {}
+            for product_id, quantity in sale.quantities.items():
+                if product_id not in products:
+                    errors.append({'product_id': product_id, 'message': "Product not found."})
+                    continue
+                allocation = allocate(batches[product_id], quantity)
+                if allocation is None:
+                    available = sum(batch.quantity for batch in batches[product_id])
+                    errors.append({
+                        'product_id': product_id,
+                        'message': f"Not enough stock. Available: {available}",
+                        'available': available,
+                    })
+                    continue
+                allocations[product_id] = [(batch, taken) for batch, taken in allocation if taken]
+            if errors:
+                results[sale.index] = _rejected(sale.client_key, SaleError("The sale could not be booked.", errors))
+                continue
+            for allocation in allocations.values():
+                for batch, taken in allocation:
+                    batch.quantity -= taken
+            accepted.append((sale, allocations))
+
+        deltas = defaultdict(int)
+        if not accepted:
+            return results, deltas
+
+        # the batches' in-memory quantities are not used after this
+        take_stock([pair for _, allocations in accepted for allocation in allocations.values() for pair in allocation])
+        for sale, _ in accepted:
+            for product_id, quantity in sale.quantities.items():
+                deltas[product_id] -= quantity
+        Product.adjust_on_hand(deltas)
+
+        # each line is costed at the batches it was taken from
+        costs = [
+            {
+                product_id: allocation_cost(allocation, products[product_id].cost_price)
+                for product_id, allocation in allocations.items()
+            }
+            for _, allocations in accepted
+        ]
+        rows = []
+        for (sale, _), sale_costs in zip(accepted, costs):
+            total_amount = Decimal('0')
+            total_profit = Decimal('0')
+            for product_id, quantity in sale.quantities.items():
+                product = products[product_id]
+                total_amount += product.selling_price * quantity
+                total_profit += (product.selling_price - sale_costs[product_id]) * quantity
+            rows.append(Sale(
+                user=user, client_key=sale.client_key, sale_timestamp=sale.sold_at,
+                total_amount=total_amount, total_profit=total_profit,
+            ))
+        rows = Sale.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+        items = [
+            SaleItem(
+                sale=row,
+                product=products[product_id],
+                quantity=quantity,
+                price_at_sale=products[product_id].selling_price,
+                cost_at_sale=sale_costs[product_id],
+            )
+            for row, (sale, _), sale_costs in zip(rows, accepted, costs)
+            for product_id, quantity in sale.quantities.items()
+        ]
+        SaleItem.objects.bulk_create(items, batch_size=BATCH_SIZE)
+
+        # bulk_create skips SaleItem.save() and StockBatch.save(), so keep the rollup and ledger in step here
+        DailyProductSales.record_lines([
+            (
+                item.product_id, timezone.localdate(item.sale.sale_timestamp), item.quantity,
+                item.price_at_sale * item.quantity, item.cost_at_sale * item.quantity,
+            )
+            for item in items
+        ])
+        StockMovement.objects.bulk_create(
+            [
+                StockMovement(product_id=product_id, batch_id=batch.pk, kind='sale', quantity=-taken, sale=row)
+                for row, (_, allocations) in zip(rows, accepted)
+                for product_id, allocation in allocations.items()
+                for batch, taken in allocation
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+    for row, (sale, _) in zip(rows, accepted):
+        results[sale.index] = {'client_key': sale.client_key, 'status': 'created', 'sale_id': row.pk}
+    return results, deltas
+
+
+def sync_sales(sales, user=None):
+    """
+    Books a till's queue of offline `sales` (see the module docstring).
+    Returns {'results': [per-sale result, ...], 'stock': {product_id:
+    {'delta': n, 'on_hand': n}}}. Raises ValueError if the upload is too big.
+    """
+    options = sync_options()
+    if len(sales) > options['MAX_SALES']:
+        raise ValueError(f"At most {options['MAX_SALES']} sales can be uploaded at once.")
+
+    now = timezone.now()
+    results = [None] * len(sales)
+    uploaded = []
+    first_index = {}
+    repeats = {}
+    for index, sale in enumerate(sales):
+        try:
+            parsed = parse_sale(index, sale, now)
+        except SaleError as e:
+            results[index] = _rejected(sale.get('client_key') if isinstance(sale, dict) else None, e)
+            continue
+        if parsed.client_key in first_index:
+            repeats[index] = first_index[parsed.client_key]  # the same sale queued twice
+            continue
+        first_index[parsed.client_key] = index
+        uploaded.append(parsed)
+
+    deltas = defaultdict(int)
+    chunk_size = options['CHUNK_SIZE']
+    for start in range(0, len(uploaded), chunk_size):
+        chunk = uploaded[start:start + chunk_size]
+        for attempt in range(ATTEMPTS):
+            try:
+                chunk_results, chunk_deltas = _sync_chunk(chunk, user)
+                break
+            except (StockConflict, IntegrityError):
+                # batches taken by another till, or the same keys uploaded
+                # concurrently: the retry sees what they committed
+                continue
+        else:
+            error = SaleError("Stock changed while booking; please upload this sale again.")
+            chunk_results = {sale.index: _rejected(sale.client_key, error) for sale in chunk}
+            chunk_deltas = {}
+        for index, result in chunk_results.items():
+            results[index] = result
+        for product_id, delta in chunk_deltas.items():
+            deltas[product_id] += delta
+
+    for index, original in repeats.items():
+        result = results[original]
+        results[index] = {**result, 'status': 'duplicate'} if result['status'] == 'created' else dict(result)
+
+    product_ids = sorted({product_id for sale in uploaded for product_id in sale.quantities})
+    on_hand = {}
+    for start in range(0, len(product_ids), BATCH_SIZE):
+        on_hand.update(
+            Product.objects.filter(pk__in=product_ids[start:start + BATCH_SIZE]).values_list('id', 'on_hand')
+        )
+    stock = {
+        product_id: {'delta': deltas.get(product_id, 0), 'on_hand': units}
+        for product_id, units in on_hand.items()
+    }
+    return {'results': results, 'stock': stock}
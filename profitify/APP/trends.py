@@ -0,0 +1,64 @@
+# APP/trends.py
+"""
+Sales trend detection.
+
+Velocity for every product is computed in one grouped query over the
+DailyProductSales rollup, so the cost scales with the number of products
+that sold in the long window, not with the number of line items.
+"""
+import datetime
+
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import DailyProductSales
+
+
+def compute_trends(as_of=None, short_days=7, long_days=28, threshold=1.5, min_units=5):
+    """
+    Compares each product's average daily sales over the last `short_days`
+    with its average over the last `long_days` (both ending on `as_of`).
+
+    Returns a list of dicts for products whose short-window velocity is at
+    least `threshold` times faster (or that many times slower) than the long
+    window, fastest movers first. Products with fewer than `min_units` sold
+    in the long window are ignored as noise.
+    """
+    as_of = as_of or timezone.localdate()
+    short_start = as_of - datetime.timedelta(days=short_days - 1)
+    long_start = as_of - datetime.timedelta(days=long_days - 1)
+
+    rows = (
+        DailyProductSales.objects.filter(date__gte=long_start, date__lte=as_of)
+        .values('product_id', 'product__product_name')
+        .annotate(
+            short_units=Sum('units', filter=Q(date__gte=short_start), default=0),
+            long_units=Sum('units'),
+        )
+        .filter(long_units__gte=min_units)
+        .order_by()
+    )
+
+    trends = []
+    for row in rows:
+        short_rate = row['short_units'] / short_days
+        long_rate = row['long_units'] / long_days
+        ratio = short_rate / long_rate if long_rate else 0
+        if ratio >= threshold or ratio <= 1 / threshold:
+            trends.append({
+                'product_id': row['product_id'],
+                'product_name': row['product__product_name'],
+                'short_rate': round(short_rate, 2),
+                'long_rate': round(long_rate, 2),
+                'ratio': round(ratio, 2),
+            })
+
+    trends.sort(key=lambda trend: trend['ratio'], reverse=True)
+    return trends
+
+
+def trend_message(trend):
+    change = round((trend['ratio'] - 1) * 100)
+    if change >= 0:
+        return f"Selling {change}% faster than average."
+    return f"Selling {-change}% slower than average."
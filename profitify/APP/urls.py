@@ -16,6 +16,8 @@ urlpatterns = [
 
     path('api/scan-check/', views.scan_barcode_api, name='scan-barcode-api'),
 
+    path('api/scan-bulk/', views.scan_bulk_api, name='api-scan-bulk'),
+
     # In APP/urls.py replace the sell_product-related lines with:
     path('sell_product/', views.sell_product_list, name='sell-product-list'),
     
@@ -29,5 +31,23 @@ urlpatterns = [
     # This is the API endpoint for your barcode scanner
     path('api/scan/<str:barcode>/', views.scan_product_api, name='api-scan-product'),
 
+    path('api/product-info/', views.product_info_bulk_api, name='api-product-info-bulk'),
+
+    path('api/product-info/<str:barcode>/', views.product_info_api, name='api-product-info'),
+
+    path('api/advisor-data/', views.advisor_data_api, name='api-advisor'),
+
     path('api/generate-summary/', views.generate_ai_summary, name='generate-ai-summary'),
+
+    path('api/checkout/', views.checkout_api, name='api-checkout'),
+
+    path('api/till-sync/', views.till_sync_api, name='api-till-sync'),
+
+    path('api/purchase-orders/receive/', views.receive_purchase_orders_api, name='api-receive-purchase-orders'),
+
+    path('api/export/<str:dataset>/', views.export_data, name='api-export'),
+
+    path('api/import/', views.import_catalog_api, name='api-import'),
+
+    path('api/metrics/', views.metrics_api, name='api-metrics'),
 ]
\ No newline at end of file
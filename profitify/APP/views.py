@@ -1,22 +1,34 @@
 from django.shortcuts import render, redirect 
-from django.http import JsonResponse 
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.urls import reverse
-from .models import Product, Sale, SaleItem, StockBatch, Alert
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import Sum, F
+from django.db.models import F
+import datetime
+import io
 import json
-import urllib.request
-import urllib.parse
 from django.conf import settings
+from asgiref.sync import sync_to_async
+
+from .finance import finance_summary, parse_date_range, revenue_series
+from .sales import SaleError, record_sale
+from .advisor import get_advisor_cache
+from .alerts import ALERT_TYPES, unviewed_alert_payloads
+from .barcode_cache import get_barcode_cache
+from .llm import (
+    UpstreamError, UpstreamTimeout, clean_payload, get_summary_service, rule_based_summary,
+)
+from .exports import DATASETS, FORMATS, export_lines
+from .imports import FORMATS as IMPORT_FORMATS, import_rows, read_rows
+from .middleware import metrics
+from .product_lookup import get_product_lookup, is_valid_barcode
+from .receiving import ReceivingError, receive_purchase_orders
+from .till_sync import sync_sales
 
 from .models import (
     Product,
     StockBatch,
-    Sale,
-    SaleItem,
-    Alert,
 )
 
 # -------------------------------------------------------
@@ -35,38 +47,40 @@ def dashboard(request):
 def finance_tracker(request):
     """
     This page shows 'Today's Profit', 'Revenue vs COGS', and 'Profit Makers'.
+    An optional ?start=YYYY-MM-DD&end=YYYY-MM-DD range replaces 'today'.
     """
-    today = timezone.now().date()
-    
-    sales_today = Sale.objects.filter(sale_timestamp__date=today)
-    
-    total_revenue_today = sales_today.aggregate(total=Sum('total_amount'))['total'] or 0
-    total_cogs_today = 0
-    
-    for sale in sales_today:
-        # NOTE: Assumes a reverse relationship 'items' exists from Sale to SaleItem
-        for item in sale.items.all(): 
-            total_cogs_today += item.cost_at_sale * item.quantity 
-            
-    todays_profit = total_revenue_today - total_cogs_today
+    try:
+        start_date, end_date = parse_date_range(request.GET.get('start'), request.GET.get('end'))
+    except ValueError:
+        start_date, end_date = parse_date_range()
+
+    summary = finance_summary(start_date, end_date)
+
+    # the chart always covers at least the week leading up to the end of the range
+    chart_start = min(start_date, end_date - datetime.timedelta(days=6))
+    series = revenue_series(chart_start, end_date)
+    label_format = '%b %d' if (end_date - chart_start).days <= 366 else '%b %Y'
+    revenue_chart = {
+        'labels': [row['period'].strftime(label_format) for row in series],
+        'revenue': [float(row['revenue']) for row in series],
+        'cogs': [float(row['cogs']) for row in series],
+    }
 
     revenue_vs_cogs = {
-        'revenue': total_revenue_today,
-        'cogs': total_cogs_today,
-        'profit': todays_profit
+        'revenue': summary['revenue'],
+        'cogs': summary['cogs'],
+        'profit': summary['profit']
     }
 
-    # Query to find top 5 profit makers
-    profit_makers_query = SaleItem.objects.filter(sale__sale_timestamp__date=today).annotate(
-        profit_per_item=(F('price_at_sale') - F('cost_at_sale')) * F('quantity')
-    ).values('product__product_name').annotate(total_profit=Sum('profit_per_item')).order_by('-total_profit')[:5]
-
-    profit_makers = list(profit_makers_query)
-    
     context = {
-        'todays_profit': todays_profit,
+        'todays_profit': summary['profit'],
         'revenue_vs_cogs': revenue_vs_cogs,
-        'profit_makers': profit_makers,
+        'profit_makers': summary['profit_makers'],
+        'sale_count': summary['sale_count'],
+        'revenue_chart': revenue_chart,
+        'start_date': start_date,
+        'end_date': end_date,
+        'is_today': start_date == end_date == timezone.localdate(),
     }
     
     return render(request, 'APP/finance_tracker.html', context)
@@ -74,156 +88,97 @@ def finance_tracker(request):
 def ai_advisor(request):
     """
     This page shows 'Reorder Suggestions', 'Waste Alerts', and 'Trend Alerts'.
-    It prepares JSON data for the Gemini AI.
+    The lists are loaded page by page from advisor_data_api, so the page
+    itself renders without touching the database; the AI summary is
+    fetched from generate_ai_summary (the API key stays on the server).
+    The alerts themselves are computed by the `generate_alerts` command.
     """
-    from .models import Product, StockBatch
-    from django.db.models import Sum
-    
-    # 1. Get Waste Alerts (expiring within 7 days)
-    seven_days_from_now = timezone.now() + timezone.timedelta(days=7)
-    waste_alerts_query = StockBatch.objects.filter(
-        expiry_date__lte=seven_days_from_now,
-        quantity__gt=0 
-    ).order_by('expiry_date')
-
-    waste_list = []
-    for item in waste_alerts_query:
-        waste_list.append({
-            'product': item.product.product_name,
-            'stock': item.quantity,
-            'expiry_date': item.expiry_date.strftime('%Y-%m-%d')
-        })
-
-    # 2. Get Reorder Suggestions (low stock)
-    products = Product.objects.all()
-    reorder_list = []
-    for product in products:
-        # Accessing the related StockBatch objects via the 'stock_batches' related_name
-        total_stock = product.stock_batches.aggregate(total=Sum('quantity'))['total'] or 0
-        if total_stock < product.reorder_level: 
-            reorder_list.append({
-                'name': product.product_name,
-                'current_stock': total_stock,
-                'reorder_level': product.reorder_level
-            })
+    return render(request, 'APP/ai_advisor.html')
 
-    # 3. Trend Alerts (Placeholder)
-    trend_alerts = [
-        {'product_name': 'Sample Product', 'message': 'Selling 50% faster than average.'}
-    ]
 
-    context = {
-        'waste_alerts': waste_alerts_query,
-        'reorder_suggestions': reorder_list,
-        'trend_alerts': trend_alerts,
-        
-        # FINAL AI DATA FOR JAVASCRIPT
-        'waste_alerts_json': json.dumps(waste_list),
-        'reorder_suggestions_json': json.dumps(reorder_list),
-        'trend_alerts_json': json.dumps(trend_alerts),
-        'GROQ_API_KEY': settings.GROQ_API_KEY,
-    }
-    
-    return render(request, 'APP/ai_advisor.html', context)
-
-@csrf_exempt
-def generate_ai_summary(request):
+def advisor_data_api(request):
     """
-    Receives JSON data from the frontend (including Trend Alerts), and 
-    returns a dynamic mock response based on the real inventory data.
+    Paginated advisor data (see APP/advisor.py), cached until stock or alerts change.
+    GET ?type=reorder|waste|trend&page=1&page_size=20 returns one list;
+    without `type`, the first page of every list.
     """
-    if request.method == 'POST':
-        try:
-            # 1. Get the data prepared by the frontend
-            data = json.loads(request.body.decode('utf-8'))
-            waste_data = data.get('waste_data', [])
-            reorder_data = data.get('reorder_data', [])
-            trend_data = data.get('trend_data', []) # GETTING TREND DATA
-            
-            # --- Determine the focus for the summary ---
-            
-            # Reorder Priority (Highest): Find the first product needing reorder
-            low_stock_summary = next((item['name'] for item in reorder_data), None)
+    alert_type = request.GET.get('type')
+    try:
+        page = int(request.GET.get('page', 1))
+        page_size = int(request.GET['page_size']) if 'page_size' in request.GET else None
+        if page < 1:
+            raise ValueError("page must be 1 or more.")
+        alert_types = [alert_type] if alert_type else ALERT_TYPES
+        alerts = get_advisor_cache().pages(alert_types, page, page_size)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': f'Invalid request: {e}'}, status=400)
+
+    return JsonResponse({'status': 'success', 'alerts': alerts})
+
+async def generate_ai_summary(request):
+    """
+    Server-side AI summary of the current unviewed alerts for the advisor
+    page (see APP/llm.py). The request body is ignored: the payload is
+    always built from the alerts on the server, so a client can neither
+    put its own text into the prompt nor run up paid completions with
+    made-up payloads. POSTs need the page's CSRF token.
+    Summaries are cached per payload, so the API key never reaches the browser
+    and unchanged inventory data does not trigger a new paid completion.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
 
-            # Waste Priority (High): Is anything expiring?
-            is_expiring = bool(waste_data)
-            
-            # Trend Priority (Moderate): Find the fastest moving product
-            fastest_moving_summary = next((item['product_name'] for item in trend_data), None)
-            
-            # --- Build the prompt (optional for mock, but good practice) ---
-            # ... (Prompt building logic here is unchanged, using all data) ...
-            
-            # 2. --- START DYNAMIC MOCK RESPONSE LOGIC ---
+    alerts = await sync_to_async(unviewed_alert_payloads)()
+    payload = clean_payload({'waste_data': alerts['waste'], 'reorder_data': alerts['reorder'], 'trend_data': alerts['trend']})
 
-            ai_summary = ""
-            
-            if low_stock_summary:
-                # SCENARIO 1: Immediate Restock Required
-                ai_summary = f"SUCCESS: Your inventory has been analyzed. Recommendation: Immediate focus should be restocking '{low_stock_summary}'. Additionally, check {len(waste_data)} item(s) approaching expiry."
-            
-            elif fastest_moving_summary:
-                 # SCENARIO 2: Trend Alert is the Main Concern (No low stock)
-                 ai_summary = f"SUCCESS: Inventory is stable. Recommendation: A strong trend is emerging for '{fastest_moving_summary}'. Proactively increase your next order to capitalize on this demand."
-            
-            elif is_expiring:
-                # SCENARIO 3: Only Waste is a concern (No low stock or trend)
-                ai_summary = f"SUCCESS: Inventory is stable. Recommendation: {len(waste_data)} item(s) are approaching expiry. Run a flash sale or promotion to clear this stock immediately."
-            
-            else:
-                # SCENARIO 4: Everything is Perfect
-                ai_summary = "SUCCESS: All inventory levels are optimal, and no critical alerts are present. Recommendation: Continue monitoring sales and consider diversifying product offerings."
-            
-            return JsonResponse({'status': 'success', 'summary': ai_summary})
-            
-            # --- END DYNAMIC MOCK RESPONSE ---
+    service = get_summary_service()
+    if not service.enabled:
+        return JsonResponse({'status': 'success', 'summary': rule_based_summary(payload), 'source': 'rules'})
 
-        except Exception as e:
-            # Catch general Python errors during data processing
-            print(f"Internal Processing Error: {e}")
-            return JsonResponse({'status': 'error', 'message': f'Internal Python Error: {str(e)}'}, status=500)
+    try:
+        # the upstream call blocks, so it runs on a worker thread instead of the event loop
+        summary, cached = await sync_to_async(service.summarize, thread_sensitive=False)(payload)
+    except UpstreamTimeout as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=504)
+    except UpstreamError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=502)
+
+    return JsonResponse({'status': 'success', 'summary': summary, 'source': 'llm', 'cached': cached})
 
-    return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+
+def _scan_payload(summary):
+    """The scanner response for a cached product summary (None means unknown barcode)."""
+    if summary is None:
+        return {
+            'status': 'not_found',
+            'message': 'Barcode not found in database.'
+        }
+    if summary['batch_id'] is None:
+        return {
+            'status': 'not_in_stock',
+            'name': summary['name'],
+            'message': 'This product is out of stock.'
+        }
+    return {
+        'status': 'found',
+        'product_id': summary['product_id'],
+        'name': summary['name'],
+        'description': summary['description'],
+        'selling_price': summary['selling_price'],
+        'stock_batch_id': summary['batch_id'],
+        'available_stock_in_batch': summary['batch_quantity']
+    }
 
 
 @csrf_exempt
-def scan_product_api(request, barcode):
+async def scan_product_api(request, barcode):
     """
     This is an API endpoint for your phone scanner.
+    Lookups are served from the barcode cache (see APP/barcode_cache.py);
+    the view is async so one ASGI worker can hold many scanner connections.
     """
-    data = {}
     try:
-        product = Product.objects.get(barcode=barcode)
-        
-        # FIXED: current_stock to quantity
-        available_stock = StockBatch.objects.filter(
-            product=product, 
-            quantity__gt=0
-        ).order_by('expiry_date').first() 
-
-        if available_stock:
-            data = {
-                'status': 'found',
-                'product_id': product.id,
-                'name': product.product_name,
-                'description': product.description,
-                'selling_price': product.selling_price,
-                'stock_batch_id': available_stock.id,
-                # FIXED: current_stock to quantity
-                'available_stock_in_batch': available_stock.quantity 
-            }
-        else:
-            data = {
-                'status': 'not_in_stock',
-                'name': product.product_name,
-                'message': 'This product is out of stock.'
-            }
-            
-    except Product.DoesNotExist:
-        data = {
-            'status': 'not_found',
-            'message': 'Barcode not found in database.'
-        }
+        data = _scan_payload(await get_barcode_cache().aget(barcode))
     except Exception as e:
         data = {
             'status': 'error',
@@ -233,11 +188,149 @@ def scan_product_api(request, barcode):
     return JsonResponse(data)
 
 
+@csrf_exempt
+def scan_bulk_api(request):
+    """
+    Resolves many barcodes at once, e.g. while receiving a delivery.
+    Expects JSON: {"barcodes": ["123", "456", ...]} and returns one
+    scan_product_api payload per barcode, in the order given.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        barcodes = data.get('barcodes')
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
+
+    if not isinstance(barcodes, list) or not all(isinstance(barcode, str) for barcode in barcodes):
+        return JsonResponse({'status': 'error', 'message': 'Expected a list of barcode strings'}, status=400)
+
+    summaries = get_barcode_cache().get_many(dict.fromkeys(barcodes))
+    results = [
+        {'barcode': barcode, **_scan_payload(summaries[barcode])}
+        for barcode in barcodes
+    ]
+    return JsonResponse({'status': 'success', 'results': results})
+
+
+def product_info_api(request, barcode):
+    """
+    Product details for a barcode from the open product databases, for the
+    add-product form. Answers are cached in the ProductLookup table
+    (see APP/product_lookup.py). Add ?refresh=1 to ask the sources again.
+    """
+    if not is_valid_barcode(barcode):
+        return JsonResponse({'status': 'error', 'message': 'Invalid barcode'}, status=400)
+
+    result = get_product_lookup().lookup(barcode, refresh=request.GET.get('refresh') == '1')
+    return JsonResponse({'barcode': barcode, **result}, status=502 if result['status'] == 'error' else 200)
+
+
+@csrf_exempt
+def product_info_bulk_api(request):
+    """
+    Looks up many barcodes at once, e.g. while onboarding a catalog.
+    Expects JSON: {"barcodes": ["123", "456", ...]} and returns one
+    product_info_api payload per barcode, in the order given.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        barcodes = data.get('barcodes')
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
+
+    if not isinstance(barcodes, list) or not all(is_valid_barcode(barcode) for barcode in barcodes):
+        return JsonResponse({'status': 'error', 'message': 'Expected a list of barcode strings'}, status=400)
+
+    service = get_product_lookup()
+    if len(barcodes) > service.options['MAX_BATCH']:
+        return JsonResponse(
+            {'status': 'error', 'message': f"At most {service.options['MAX_BATCH']} barcodes per request"}, status=400
+        )
+
+    found = service.lookup_many(barcodes)
+    results = [{'barcode': barcode, **found[barcode]} for barcode in barcodes]
+    return JsonResponse({'status': 'success', 'results': results})
+
+
+def export_data(request, dataset):
+    """
+    Streams a dataset ('sales', 'sale-items' or 'stock-batches') as CSV or NDJSON.
+    Optional query parameters: start, end (YYYY-MM-DD) and format (csv | ndjson).
+    Staff only (or DEBUG).
+    """
+    if not (settings.DEBUG or request.user.is_staff):
+        return JsonResponse({'status': 'error', 'message': 'Forbidden'}, status=403)
+
+    if dataset not in DATASETS:
+        return JsonResponse({'status': 'error', 'message': 'Unknown dataset'}, status=404)
+
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return JsonResponse({'status': 'error', 'message': 'Unknown format'}, status=400)
+
+    try:
+        start_date = datetime.date.fromisoformat(request.GET['start']) if request.GET.get('start') else None
+        end_date = datetime.date.fromisoformat(request.GET['end']) if request.GET.get('end') else None
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid date'}, status=400)
+
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(export_lines(dataset, start_date, end_date, fmt), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
+
+
+def import_catalog_api(request):
+    """
+    Bulk product/stock upload. Expects a multipart 'file' field (CSV, NDJSON
+    or JSON) and an optional 'format'; returns the import report.
+    Staff only; needs the CSRF token.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+
+    if not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': 'Forbidden'}, status=403)
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'status': 'error', 'message': 'No file uploaded'}, status=400)
+
+    fmt = request.POST.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+    if fmt not in IMPORT_FORMATS:
+        return JsonResponse({'status': 'error', 'message': 'Unknown format'}, status=400)
+
+    try:
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        report = import_rows(read_rows(stream, fmt), user=request.user)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': f'Could not read file: {e}'}, status=400)
+
+    return JsonResponse({'status': 'success', **report.as_dict(max_errors=1000)})
+
+
+def metrics_api(request):
+    """
+    Internal endpoint with rolling per-view latency, DB time and query-count
+    percentiles recorded by RequestMetricsMiddleware. Staff only (or DEBUG).
+    """
+    if not (settings.DEBUG or request.user.is_staff):
+        return JsonResponse({'status': 'error', 'message': 'Forbidden'}, status=403)
+
+    return JsonResponse({'status': 'success', 'views': metrics.summary()})
+
+
 def settings_page(request):
     return render(request, 'APP/settings.html')
 
 @csrf_exempt
-def scan_barcode_api(request):
+async def scan_barcode_api(request):
     """
     Receives a barcode via AJAX/Fetch, checks the database, 
     and returns a JSON response with the correct redirect URL.
@@ -251,26 +344,25 @@ def scan_barcode_api(request):
             if not barcode:
                 return JsonResponse({'status': 'error', 'message': 'No barcode provided'}, status=400)
             
-            # 1. Try to find the product
-            # FIXED: using correct 'quantity' field
-            product = Product.objects.get(barcode=barcode)
+            # 1. Try to find the product (through the barcode cache)
+            summary = await get_barcode_cache().aget(barcode)
+            
+            if summary is None:
+                # 3. NOT FOUND! Return the Add Product URL
+                add_url = reverse('add_product-page')
+                return JsonResponse({
+                    'status': 'not_found',
+                    'redirect_url': add_url
+                })
             
             # 2. FOUND! Return the Sell Product URL
             # We use 'reverse' to dynamically get the URL based on the name
-            sell_url = reverse('sell-product-page', kwargs={'product_id': product.id})
+            sell_url = reverse('sell-product-page', kwargs={'product_id': summary['product_id']})
             
             return JsonResponse({
                 'status': 'found',
                 'redirect_url': sell_url
             })
-            
-        except Product.DoesNotExist:
-            # 3. NOT FOUND! Return the Add Product URL
-            add_url = reverse('add-product-page')
-            return JsonResponse({
-                'status': 'not_found',
-                'redirect_url': add_url
-            })
         
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
@@ -294,6 +386,7 @@ def add_product(request):
                     selling_price=float(request.POST.get('selling_price')),
                     cost_price=float(request.POST.get('cost_price')),
                     reorder_level=int(request.POST.get('reorder_level')),
+                    supplier_info=request.POST.get('supplier_info') or None,
                     # Add any other Product fields here
                 )
                 
@@ -304,9 +397,8 @@ def add_product(request):
                     StockBatch.objects.create(
                         product=new_product,
                         quantity=initial_quantity,
-                        cost_price=new_product.cost_price, # Use the product's cost price
-                        expiry_date=request.POST.get('expiry_date'), # Assuming this field is in the form
-                        date_added=timezone.now().date(),
+                        expiry_date=request.POST.get('expiry_date') or None, # Assuming this field is in the form
+                        received_date=timezone.now().date(),
                     )
                 
                 # Success! Redirect to the dashboard after adding
@@ -328,10 +420,8 @@ def add_product(request):
 def sell_product(request, product_id):
     """
     Handles showing the 'sell product' page (pre-filled) and saving the sale.
+    The quantity is taken from as many batches as needed, nearest expiry first.
     """
-    from .models import Product, Sale, SaleItem, StockBatch
-    from django.db import transaction
-
     # Try to find the product, otherwise redirect to dashboard
     try:
         product = Product.objects.get(id=product_id)
@@ -342,7 +432,7 @@ def sell_product(request, product_id):
     available_batch = StockBatch.objects.filter(
         product=product,
         quantity__gt=0
-    ).order_by('expiry_date').first()
+    ).order_by(F('expiry_date').asc(nulls_last=True), 'id').first()
 
     # Use the template that actually exists in your project
     template_name = 'APP/sell_product.html'   # <-- corrected underscore
@@ -364,41 +454,117 @@ def sell_product(request, product_id):
             context['error_message'] = "Quantity must be greater than zero."
             return render(request, template_name, context)
 
-        if not available_batch or available_batch.quantity < quantity_sold:
-            context['error_message'] = f"Not enough stock. Available: {available_batch.quantity if available_batch else 0}"
+        try:
+            record_sale(
+                [{'product_id': product.id, 'quantity': quantity_sold}],
+                user=request.user if request.user.is_authenticated else None,
+            )
+        except SaleError as e:
+            context['error_message'] = e.errors[0]['message'] if e.errors else str(e)
+            return render(request, template_name, context)
+        except Exception as e:
+            context['error_message'] = f"Transaction failed: {str(e)}"
             return render(request, template_name, context)
 
-        try:
-            with transaction.atomic():
-                cost = available_batch.cost_price
-                revenue = product.selling_price
+        return redirect('dashboard-page')
 
-                total_amount = revenue * quantity_sold
-                total_profit = (revenue - cost) * quantity_sold
+    return render(request, template_name, context)
 
-                sale = Sale.objects.create(
-                    total_amount=total_amount,
-                    total_profit=total_profit,
-                    user_id="scanner_user"
-                )
+def checkout_api(request):
+    """
+    Sells a whole basket in one transaction.
+    Expects JSON: {"items": [{"product_id": 1, "quantity": 2}, ...]}
+    Needs a logged-in user and the CSRF token (X-CSRFToken header).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
 
-                SaleItem.objects.create(
-                    sale=sale,
-                    product=product,
-                    quantity=quantity_sold,
-                    price_at_sale=revenue,
-                    cost_at_sale=cost
-                )
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Login required'}, status=403)
 
-                available_batch.quantity -= quantity_sold
-                available_batch.save()
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        items = data.get('items')
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
 
-            return redirect('dashboard-page')
-        except Exception as e:
-            context['error_message'] = f"Transaction failed: {str(e)}"
-            return render(request, template_name, context)
+    if not isinstance(items, list):
+        return JsonResponse({'status': 'error', 'message': 'Expected a list of items'}, status=400)
 
-    return render(request, template_name, context)
+    try:
+        sale = record_sale(items, user=request.user)
+    except SaleError as e:
+        return JsonResponse({'status': 'error', 'message': str(e), 'errors': e.errors}, status=400)
+
+    return JsonResponse({
+        'status': 'success',
+        'sale_id': sale.id,
+        'total_amount': sale.total_amount,
+        'total_profit': sale.total_profit,
+    })
+
+def till_sync_api(request):
+    """
+    Books sales that a till recorded while offline (see APP/till_sync.py).
+    Expects JSON: {"sales": [{"client_key": "till-3-000123", "sold_at": "2026-10-17T09:30:00",
+                              "items": [{"product_id": 1, "quantity": 2}, ...]}, ...]}
+    Returns a result per sale and the stock change per product; sales that
+    were uploaded before are reported as duplicates, never booked twice.
+    Like checkout_api, needs a logged-in user and the CSRF token.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Login required'}, status=403)
+
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        sales = data.get('sales')
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
+
+    if not isinstance(sales, list):
+        return JsonResponse({'status': 'error', 'message': 'Expected a list of sales'}, status=400)
+
+    try:
+        result = sync_sales(sales, user=request.user)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return JsonResponse({'status': 'success', **result})
+
+def receive_purchase_orders_api(request):
+    """
+    Receives a delivery into stock in one transaction (see APP/receiving.py).
+    Expects JSON: {"purchase_orders": [1, 2], "lines": [{"item_id": 5, "quantity": 3,
+    "expiry_date": "2025-09-01"}, ...], "expiry_date": "...", "received_date": "..."}.
+    Listed orders are received in full; lines receive part of one item each.
+    Staff only; needs the CSRF token.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+
+    if not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': 'Forbidden'}, status=403)
+
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        order_ids = [int(order_id) for order_id in data.get('purchase_orders') or []]
+        lines = data.get('lines') or []
+        if not isinstance(lines, list):
+            raise ValueError("'lines' must be a list.")
+        expiry_date = datetime.date.fromisoformat(data['expiry_date']) if data.get('expiry_date') else None
+        received_date = datetime.date.fromisoformat(data['received_date']) if data.get('received_date') else None
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
+
+    try:
+        result = receive_purchase_orders(order_ids, lines, expiry_date, received_date)
+    except ReceivingError as e:
+        return JsonResponse({'status': 'error', 'message': str(e), 'errors': e.errors}, status=400)
+
+    return JsonResponse({'status': 'success', **result})
 
 # Replace or add this function in APP/views.py
 def sell_product_list(request):
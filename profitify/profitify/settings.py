@@ -5,6 +5,8 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from django.core.exceptions import ImproperlyConfigured
+
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -56,6 +58,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+
+    # Per-view timing and query counts (see REQUEST_METRICS below)
+    'APP.middleware.RequestMetricsMiddleware',
 ]
 
 
@@ -89,13 +94,56 @@ WSGI_APPLICATION = 'profitify.wsgi.application'
 # DATABASE
 # -------------------------------------------------------
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite by default; DATABASE_ENGINE=postgresql (needs psycopg) reads the POSTGRES_* variables.
+DATABASE_ENGINE = os.getenv('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'profitify'),
+            'USER': os.getenv('POSTGRES_USER', 'profitify'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        }
+    }
+elif DATABASE_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
     }
+else:
+    raise ImproperlyConfigured(f"DATABASE_ENGINE must be 'sqlite' or 'postgresql', not {DATABASE_ENGINE!r}")
+
+# Connection reuse and SQLite pragmas (applied to each new connection, see APP/db.py).
+# Pick one with DATABASE_PROFILE=production; development keeps SQLite's defaults.
+DATABASE_PROFILES = {
+    'development': {
+        'CONN_MAX_AGE': 0,
+        'PRAGMAS': {},
+    },
+    'production': {
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', '600')),
+        'PRAGMAS': {
+            'journal_mode': 'WAL',        # readers no longer block the writer (or each other)
+            'synchronous': 'NORMAL',      # fsync at checkpoints only; safe with WAL
+            'cache_size': -64000,         # negative = KiB, so a 64 MB page cache
+            'mmap_size': 268435456,       # read through a 256 MB memory map
+            'busy_timeout': 5000,         # ms to wait for the write lock before "database is locked"
+            'temp_store': 'MEMORY',
+        },
+    },
 }
 
+DATABASE_PROFILE = os.getenv('DATABASE_PROFILE', 'development')
+
+DATABASES['default']['CONN_MAX_AGE'] = DATABASE_PROFILES[DATABASE_PROFILE]['CONN_MAX_AGE']
+DATABASES['default']['CONN_HEALTH_CHECKS'] = DATABASE_PROFILES[DATABASE_PROFILE]['CONN_MAX_AGE'] > 0
+SQLITE_PRAGMAS = DATABASE_PROFILES[DATABASE_PROFILE]['PRAGMAS']
+
 
 # -------------------------------------------------------
 # PASSWORD VALIDATION
@@ -158,3 +206,84 @@ CSRF_TRUSTED_ORIGINS = [
 ]
 
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+
+
+# -------------------------------------------------------
+# AI SUMMARY PROXY (see APP/llm.py; the key is only used server-side)
+# -------------------------------------------------------
+
+LLM_PROXY = {
+    'API_URL': os.getenv('LLM_API_URL', 'https://api.groq.com/openai/v1/chat/completions'),
+    'API_KEY': GROQ_API_KEY,
+    'MODEL': os.getenv('LLM_MODEL', 'openai/gpt-oss-20b'),
+    'CONNECT_TIMEOUT': 5,
+    'READ_TIMEOUT': 30,
+    'MAX_IDLE_CONNECTIONS': 10,
+    'CACHE_BACKEND': 'local',
+    'CACHE_TTL': int(os.getenv('LLM_CACHE_TTL', '600')),
+}
+
+
+# -------------------------------------------------------
+# AI ADVISOR DATA (paginated and cached, see APP/advisor.py)
+# -------------------------------------------------------
+
+ADVISOR = {
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 100,
+    'CACHE_BACKEND': 'local',
+    'CACHE_TTL': 300,
+}
+
+
+# -------------------------------------------------------
+# OFFLINE TILL SYNC (see APP/till_sync.py)
+# -------------------------------------------------------
+
+TILL_SYNC = {
+    'MAX_SALES': 5000,    # per upload
+    'CHUNK_SIZE': 200,    # sales booked per transaction
+}
+
+
+# -------------------------------------------------------
+# BARCODE CACHE (scanner APIs, see APP/barcode_cache.py)
+# -------------------------------------------------------
+
+BARCODE_CACHE = {
+    'BACKEND': os.getenv('BARCODE_CACHE_BACKEND', 'local'),  # 'local' LRU or 'django' cache framework
+    'MAX_SIZE': 5000,
+    'TTL': 300,
+    'ALIAS': 'default',
+}
+
+
+# -------------------------------------------------------
+# PRODUCT LOOKUP (OpenFoodFacts proxy, see APP/product_lookup.py)
+# -------------------------------------------------------
+
+PRODUCT_LOOKUP = {
+    'SOURCES': {
+        'openfoodfacts': 'https://world.openfoodfacts.org',
+        'openpetfoodfacts': 'https://world.openpetfoodfacts.org',
+    },
+    'USER_AGENT': 'Profitify/1.0',
+    'CONNECT_TIMEOUT': 3,
+    'READ_TIMEOUT': 5,
+    'FOUND_TTL': 30 * 86400,
+    'MISSING_TTL': 86400,
+    'MAX_WORKERS': 8,
+    'MAX_BATCH': 100,
+}
+
+
+# -------------------------------------------------------
+# REQUEST METRICS (see APP/middleware.py, served at api/metrics/)
+# -------------------------------------------------------
+
+REQUEST_METRICS = {
+    'ENABLED': os.getenv('REQUEST_METRICS_ENABLED', 'false').lower() == 'true',
+    'SAMPLE_RATE': float(os.getenv('REQUEST_METRICS_SAMPLE_RATE', '0.1')),
+    'WINDOW': 1000,
+    'N_PLUS_ONE_THRESHOLD': 10,
+}